@@ -20,6 +20,9 @@ else:
 sys.path.insert(0, project_root)
 # Ensure this path is correct relative to your project root
 from langchain_arch.chains.router import Router
+from langchain_arch.utils.neo4j_pool import init_async_driver, close_async_driver
+from langchain_arch.utils.schema_service import get_schema_service
+from langchain_arch.utils.llm_pool import close_llm_clients
 
 dotenv_path = os.path.join(project_root, '.env')
 load_dotenv(dotenv_path=dotenv_path)
@@ -38,6 +41,19 @@ if missing_vars:
     sys.exit(f"FATAL ERROR: Missing env vars: {', '.join(missing_vars)}")
 # --- End Setup ---
 
+@cl.on_app_startup
+async def startup():
+    # Open the shared Neo4j driver pool once; every message borrows sessions from it
+    await init_async_driver()
+    # Introspect the live schema in the background; the schema file is served until then
+    await get_schema_service().start()
+
+@cl.on_app_shutdown
+async def shutdown():
+    await get_schema_service().stop()
+    await close_async_driver()
+    await close_llm_clients()
+
 @cl.on_chat_start
 async def start_chat():
     cl.user_session.set("schema_filename", SCHEMA_FILE_DEFAULT)
@@ -49,7 +65,8 @@ async def main(message: cl.Message):
     schema_path = schema_path_abs
 
     try:
-        router = Router(schema_file=schema_path)
+        # One LLM scheduling session per chat, so concurrent chats share LLM capacity fairly
+        router = Router(schema_file=schema_path, session_id=cl.context.session.id)
     except Exception as e:
         await cl.Message(content=f"Error initializing the Router: {e}").send()
         return
@@ -65,6 +82,7 @@ async def main(message: cl.Message):
     collected_final_text = ""
     collected_queries = []
     collected_reasoning = []
+    insight_streaming = False
     workflow_failed = False
     step_where_failed = ""
     error_details = ""
@@ -98,6 +116,15 @@ async def main(message: cl.Message):
                     reasoning_text = chunk.get("reasoning")
                     if reasoning_text and not any(r[0] == step for r in collected_reasoning): collected_reasoning.append((step, reasoning_text))
 
+                # Stream the insight text into the answer as it is generated;
+                # the final update below replaces it with the parsed insight
+                elif msg_type == "insight_delta":
+                    if not insight_streaming:
+                        insight_streaming = True
+                        final_answer_msg.content = ""
+                        await final_answer_msg.update()
+                    await final_answer_msg.stream_token(chunk.get("delta", ""))
+
                 # Capture Final Insight/Recommendations (Store text, add reasoning)
                 elif msg_type == "final_insight":
                     insight = chunk.get("insight", "No insight generated.")
@@ -154,9 +181,13 @@ async def main(message: cl.Message):
             formatted_queries_content = []
             for i, q_item in enumerate(collected_queries):
                 query_text = q_item if isinstance(q_item, str) else q_item.get("query", "N/A")
-                title = f"Query {i+1}" if isinstance(q_item, str) else q_item.get("objective", f"Objective {i+1}")
+                title = f"Query {i+1}" if isinstance(q_item, str) else q_item.get("objective", f"Query {i+1}")
                 # Ensure clean formatting for each query block
-                formatted_queries_content.append(f"**{title}:**\n```cypher\n{query_text.strip()}\n```") # Use strip() on query_text
+                query_block = f"**{title}:**\n```cypher\n{query_text.strip()}\n```" # Use strip() on query_text
+                params = None if isinstance(q_item, str) else q_item.get("params")
+                if params:
+                    query_block += f"\nParameters:\n```json\n{json.dumps(params, ensure_ascii=False, default=str)}\n```"
+                formatted_queries_content.append(query_block)
             if formatted_queries_content:
                 # Join query blocks with double newlines for spacing
                 queries_markdown = "\n\n".join(formatted_queries_content)
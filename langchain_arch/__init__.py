@@ -1,5 +1,5 @@
 # Make components accessible from the top level package
 from .chains.router import Router
-from .utils.neo4j_utils import Neo4jDatabase
+from .utils.neo4j_utils import Neo4jDatabase, AsyncNeo4jDatabase
 
-__all__ = ["Router", "Neo4jDatabase"]
+__all__ = ["Router", "Neo4jDatabase", "AsyncNeo4jDatabase"]
@@ -1,13 +1,20 @@
+from .base import BaseAgent
 from .classifier import ClassifierAgent
+from .lexical_classifier import LexicalClassifier, get_lexical_classifier
 from .insight_query_generator import InsightQueryGeneratorAgent
 from .insight_generator import InsightGeneratorAgent
 from .optimization_query_generator import OptimizationQueryGeneratorAgent
 from .optimization_generator import OptimizationRecommendationGeneratorAgent
+from .routing_query_generator import RoutingQueryGeneratorAgent
 
 __all__ = [
+    "BaseAgent",
     "ClassifierAgent",
+    "LexicalClassifier",
+    "get_lexical_classifier",
     "InsightQueryGeneratorAgent",
     "InsightGeneratorAgent",
     "OptimizationQueryGeneratorAgent",
     "OptimizationRecommendationGeneratorAgent",
+    "RoutingQueryGeneratorAgent",
 ]
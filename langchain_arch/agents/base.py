@@ -0,0 +1,137 @@
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from ..utils.llm_pool import get_llm, get_fallback_llm, get_response_format
+from ..utils.llm_usage import get_llm_usage
+from ..utils.llm_hedging import HedgedRunnable, get_hedge_policy
+from ..utils.json_repair import OutputValidationError, RepairingJsonOutputParser, schema_errors
+
+
+class BaseAgent:
+    """
+    Common setup for the LLM agents: the role's ChatOpenAI from the shared
+    client registry (utils/llm_pool.py), the prompt and the compiled chain.
+
+    Subclasses set `role`, `temperature` and `output_schema` (the JSON schema
+    of their answer) and implement create_prompt(); build_text_chain() and
+    create_output_parser() can be overridden. The LLM is bound to the role's
+    structured-output response_format, so malformed JSON is rare. Agents keep
+    no per-request state, so shared() returns one instance per class that
+    every Router and workflow reuses.
+
+    `chain` parses the answer. When the role has a fallback model
+    (LLM_<ROLE>_FALLBACK_MODEL), output that cannot be parsed or does not
+    match output_schema is regenerated by `fallback_chain` with the larger
+    model. Workflows that stream `text_chain` themselves call
+    validate_output() and fallback_chain directly.
+
+    Agents on the critical path set `hedged`: with LLM_HEDGING on, their
+    model is wrapped in a HedgedRunnable (utils/llm_hedging.py), so a call
+    slow to start streaming is raced against a duplicate. The fallback model
+    is not hedged.
+    """
+    role: str = ""
+    temperature: float = 0.0
+    output_schema: Optional[Dict[str, Any]] = None
+    hedged: bool = False
+
+    _instances: Dict[type, "BaseAgent"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self):
+        self.llm = self._bind_response_format(get_llm(self.role, self.temperature))
+        hedge_policy = get_hedge_policy(self.role) if self.hedged else None
+        if hedge_policy is not None:
+            self.llm = HedgedRunnable(self.llm, hedge_policy)
+        fallback_llm = get_fallback_llm(self.role, self.temperature)
+        self.fallback_llm = self._bind_response_format(fallback_llm) if fallback_llm is not None else None
+        self.prompt: ChatPromptTemplate = self.create_prompt()
+        self.output_parser = self.create_output_parser()
+        # Agent input -> AIMessage, streamed by the workflows that consume the text as it arrives
+        self.text_chain: Runnable = self.build_text_chain(self.llm)
+        self.fallback_chain: Optional[Runnable] = None
+        if self.fallback_llm is not None:
+            self.fallback_chain = (
+                self.build_text_chain(self.fallback_llm)
+                | self.output_parser
+                | RunnableLambda(self.validate_output)
+            )
+        self.chain: Runnable = self.build_chain()
+
+    def _bind_response_format(self, llm: Runnable) -> Runnable:
+        response_format = get_response_format(self.role, self.output_schema)
+        return llm.bind(response_format=response_format) if response_format else llm
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        raise NotImplementedError
+
+    def create_output_parser(self) -> RepairingJsonOutputParser:
+        # Direct parse, then local repair; no fixing LLM
+        return RepairingJsonOutputParser(role=self.role)
+
+    def build_text_chain(self, llm: Runnable) -> Runnable:
+        """Prompt and model, built once for the role's model and once for its fallback model."""
+        return self.prompt | llm
+
+    def build_chain(self) -> Runnable:
+        chain = self.text_chain | self.output_parser
+        if self.fallback_chain is None:
+            return chain
+        return (chain | RunnableLambda(self.validate_output)).with_fallbacks(
+            [RunnableLambda(self._enter_fallback) | self.fallback_chain],
+            exceptions_to_handle=(OutputParserException,),
+            # Passed to the fallback branch, which reports it and drops it from the input
+            exception_key="error",
+        )
+
+    def validate_output(self, output: Any, force: bool = False) -> Any:
+        """
+        Returns the parsed output if it matches output_schema; raises
+        OutputValidationError otherwise. Without a fallback model there is
+        nothing better to retry with, so the output is passed on unchecked
+        and the workflows' own shape checks apply, unless `force` is set by
+        a caller that has another way to retry.
+        """
+        if (self.fallback_chain is None and not force) or not self.output_schema:
+            return output
+        errors = schema_errors(output, self.output_schema)
+        if errors:
+            raise OutputValidationError(f"{self.role} output does not match its schema: {'; '.join(errors)}")
+        return output
+
+    def _enter_fallback(self, agent_input: Dict[str, Any]) -> Dict[str, Any]:
+        """First step of the fallback branch of `chain`: records why and passes the original input on."""
+        agent_input = dict(agent_input)
+        self.record_fallback(agent_input.pop("error"))
+        return agent_input
+
+    async def regenerate(self, agent_input: Dict[str, Any], error: Exception) -> Any:
+        """
+        Answers again with the fallback model after the streamed text_chain
+        output failed to parse or validate (`error`). Only valid when
+        fallback_chain is set; raises like `chain` if this output fails too.
+        """
+        self.record_fallback(error)
+        return await self.fallback_chain.ainvoke(agent_input)
+
+    def record_fallback(self, error: Exception) -> None:
+        """Counts a fallback, as "schema" (parsed but invalid) or "unparseable"."""
+        reason = "schema" if isinstance(error, OutputValidationError) else "unparseable"
+        print(f"{self.role}: output failed validation ({error}); retrying with the fallback model.")
+        get_llm_usage().record_fallback(self.role, reason)
+
+    @classmethod
+    def shared(cls) -> "BaseAgent":
+        """Returns the process-wide instance of this agent, building it on first use."""
+        agent = cls._instances.get(cls)
+        if agent is None:
+            with cls._instances_lock:
+                agent = cls._instances.get(cls)
+                if agent is None:
+                    agent = cls()
+                    cls._instances[cls] = agent
+        return agent
@@ -2,34 +2,36 @@ import os
 import json
 from typing import Dict, Any, AsyncIterator
 
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables import RunnableConfig
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tracers.log_stream import LogEntry
 
+from .base import BaseAgent
 from ..prompts.classifier import create_classifier_prompt
 
 # Ensure OPENAI_API_KEY is set (handled by load_dotenv in utils/neo4j_utils.py or main.py)
-# Consider adding load_dotenv() here if this module might be run independently
+# Model settings come from utils/llm_pool.py (LLM_MODEL, LLM_CLASSIFIER_*, LLM_ROUTING_FILE)
+# The chain is BaseAgent's: prompt -> llm -> json_parser (local repair, no fixing LLM) -> schema check
 
-# Configuration
-LLM_MODEL_NAME = "gpt-4o" # Or your preferred GPT-4 model
-
-class ClassifierAgent:
+class ClassifierAgent(BaseAgent):
     """
     Agent responsible for classifying user queries into 'insight' or 'optimization' workflows.
     Uses LangChain's built-in streaming (.astream_log).
     """
-    def __init__(self):
-        self.prompt: ChatPromptTemplate = create_classifier_prompt()
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL_NAME,
-            temperature=0,
-            streaming=True, # Still needed for token streaming within log
-        )
-        # Define the chain: prompt -> llm -> json_parser
-        self.chain = self.prompt | self.llm | JsonOutputParser()
+    role = "classifier"
+    temperature = 0
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "workflow": {"type": "string", "enum": ["insight", "optimization"]},
+            "reasoning": {"type": "string"},
+        },
+        "required": ["workflow", "reasoning"],
+        "additionalProperties": False,
+    }
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        return create_classifier_prompt()
 
     async def run(self, query: str) -> AsyncIterator[LogEntry]:
         """
@@ -45,7 +47,7 @@ class ClassifierAgent:
         # No need for external callback handlers or queues
         async for chunk in self.chain.astream_log(
             {"query": query},
-            include_names=["ChatOpenAI", "JsonOutputParser"], # Specify components to include
+            include_names=["ChatOpenAI", "RepairingJsonOutputParser"], # Specify components to include
             include_types=["llm", "parser"] # Specify event types
         ):
             # The chunk IS the LogEntry object
@@ -78,14 +80,14 @@ if __name__ == '__main__':
         print("\n--- Example: Extracting Final Output ---")
         final_output_insight = None
         for entry in reversed(log_entries_insight):
-            if entry.name == "JsonOutputParser" and entry.state == "end":
+            if entry.name == "RepairingJsonOutputParser" and entry.state == "end":
                 final_output_insight = entry.data.get('output')
                 break
         print(f"Insight Final Output: {final_output_insight}")
 
         final_output_opt = None
         for entry in reversed(log_entries_opt):
-            if entry.name == "JsonOutputParser" and entry.state == "end":
+            if entry.name == "RepairingJsonOutputParser" and entry.state == "end":
                  final_output_opt = entry.data.get('output')
                  break
         print(f"Optimization Final Output: {final_output_opt}")
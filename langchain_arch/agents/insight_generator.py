@@ -2,43 +2,55 @@ import os
 import json
 from typing import Dict, Any, AsyncIterator, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables import RunnableConfig, RunnablePassthrough
-from langchain_core.output_parsers import JsonOutputParser
-from langchain.output_parsers import OutputFixingParser
 from langchain_core.prompts import ChatPromptTemplate
 
+from .base import BaseAgent
 from ..prompts.insight_generator import create_insight_generator_prompt
+from ..utils.result_encoding import get_result_encoder
+from ..utils.json_repair import RepairingJsonOutputParser
+from ..utils.result_reduction import get_result_reducer
 
-# Configuration
-LLM_MODEL_NAME = "gpt-4o"
-
-class InsightGeneratorAgent:
+class InsightGeneratorAgent(BaseAgent):
     """
     Agent that synthesizes natural language insights from query results.
-    Now uses OutputFixingParser.
+    Malformed output is repaired locally; OutputFixingParser is the last resort.
     """
+    role = "insight_generator"
+    temperature = 0.1
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "insight": {"type": "string"},
+            "reasoning": {"type": "string"},
+        },
+        "required": ["insight", "reasoning"],
+        "additionalProperties": False,
+    }
+
     def __init__(self):
-        self.prompt: ChatPromptTemplate = create_insight_generator_prompt()
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL_NAME,
-            temperature=0.1,
-            streaming=True,
-        )
-        
-        # Create the base parser
-        base_parser = JsonOutputParser()
-        
-        # Create the OutputFixingParser, wrapping the base parser and the LLM
-        self.output_parser = OutputFixingParser.from_llm(parser=base_parser, llm=self.llm)
-        
-        # Update the chain to use the fixing parser
-        self.chain = (
+        super().__init__()
+        # Query results are rendered by the role's encoder (RESULT_ENCODING_INSIGHT_GENERATOR)
+        self.result_encoder = get_result_encoder(self.role)
+        # and kept within the role's token budget by the workflow (RESULT_TOKEN_BUDGET_INSIGHT_GENERATOR)
+        self.result_reducer = get_result_reducer(self.role, self.result_encoder, self.llm.model_name)
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        return create_insight_generator_prompt()
+
+    def create_output_parser(self) -> RepairingJsonOutputParser:
+        # Direct parse, then local repair, then a second LLM call through OutputFixingParser
+        return RepairingJsonOutputParser(role=self.role, fixing_llm=self.llm)
+
+    def build_text_chain(self, llm):
+        # The workflow streams this and parses the message with output_parser
+        return (
             RunnablePassthrough.assign(
-                data=lambda x: json.dumps(x['data'], indent=2)
+                data=lambda x: self.result_encoder.encode(x['data'], x.get('data_notes')),
+                data_format=lambda x: self.result_encoder.label,
             )
             | self.prompt
-            | self.llm
+            | llm
         )
 
 # Example usage (for testing - requires .env)
@@ -63,7 +75,7 @@ if __name__ == '__main__':
         print(f"Input Data: {json.dumps(test_data, indent=2)}")
 
         final_result = None
-        async for entry in agent.chain.astream_log(
+        async for entry in agent.text_chain.astream_log(
             {"query": test_query, "data": test_data},
             include_names=["ChatOpenAI"],
             include_types=["llm"]
@@ -87,7 +99,7 @@ if __name__ == '__main__':
         print(f"Input Data: {json.dumps(test_data_empty, indent=2)}")
 
         final_result_empty = None
-        async for entry in agent.chain.astream_log(
+        async for entry in agent.text_chain.astream_log(
             {"query": test_query_empty, "data": test_data_empty},
             include_names=["ChatOpenAI"],
             include_types=["llm"]
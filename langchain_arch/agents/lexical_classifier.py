@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+WORKFLOWS = ("insight", "optimization")
+_WORD = re.compile(r"[a-z0-9$%]+")
+
+# Hand-tuned starting weights; positive leans "optimization", negative "insight".
+# Features are lowercase unigrams and "w1 w2" bigrams.
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    # Asking for advice or actions
+    "how can": 2.5, "how do": 1.5, "how to": 2.0, "should": 2.5, "suggest": 3.0, "suggestion": 3.0,
+    "recommend": 3.0, "recommendation": 3.0, "advice": 3.0, "improve": 2.5, "optimize": 3.0,
+    "optimise": 3.0, "optimization": 2.5, "increase": 1.5, "reduce": 1.5, "lower": 1.0,
+    "boost": 2.0, "maximize": 2.0, "minimize": 2.0, "pause": 2.0, "allocate": 2.0,
+    "reallocate": 2.5, "shift": 1.0, "scale": 1.0, "action": 1.5, "strategy": 2.0, "fix": 1.5,
+    "better": 1.0, "what can": 1.5, "what should": 2.5, "need to": 1.0, "tip": 2.0, "cut": 1.0,
+    "waste": 1.5, "wasting": 1.5, "stop": 1.0, "adjust": 1.5, "change": 0.5,
+    # Asking for data
+    "show": -2.0, "list": -2.0, "what were": -2.0, "what was": -2.0, "what is": -1.0,
+    "what are": -1.0, "which": -0.5, "top": -1.0, "summarize": -2.5, "summary": -2.5,
+    "trend": -2.0, "trends": -2.0, "compare": -1.5, "comparison": -1.5, "how many": -2.5,
+    "how much": -2.0, "report": -1.5, "breakdown": -2.0, "over time": -2.0, "last week": -1.0,
+    "last month": -1.0, "correlation": -2.0, "find": -1.0, "give me": -0.5, "total": -1.0,
+    "average": -1.0, "performance of": -1.5, "performing": -0.5, "did": -1.0, "was": -0.5,
+    "were": -0.5, "count": -1.5, "get": -0.5, "display": -2.0,
+}
+DEFAULT_BIAS = -0.5 # Insight is the more common intent
+# Confidence needed to skip the LLM classifier with a trained model. The hand-tuned
+# weights have no measured agreement with the LLM, so by default they never skip it.
+TRAINED_THRESHOLD = 0.85
+UNTRAINED_THRESHOLD = 1.01
+
+
+def features(query: str) -> List[str]:
+    """Lowercase unigrams and adjacent-word bigrams."""
+    words = _WORD.findall(query.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class LexicalClassifier:
+    """
+    Logistic-regression intent classifier over lexical features.
+
+    Starts from hand-tuned cue weights and can be fine-tuned on logged
+    (query, workflow) pairs, e.g. the LLM classifier's decisions recorded in
+    CLASSIFIER_LOG. Classification is a dictionary lookup per feature, so it
+    runs in microseconds and needs no network call. `trained` is set once
+    the weights were fitted to labelled queries (train() or load()).
+    """
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = DEFAULT_BIAS):
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.bias = bias
+        self.trained = False
+
+    def probability(self, query: str) -> float:
+        """P(optimization | query)."""
+        score = self.bias + sum(self.weights.get(f, 0.0) for f in features(query))
+        return _sigmoid(score)
+
+    def classify(self, query: str) -> Dict[str, Any]:
+        """Returns {"workflow", "confidence"} where confidence is the winning class probability."""
+        p = self.probability(query)
+        workflow = "optimization" if p >= 0.5 else "insight"
+        return {"workflow": workflow, "confidence": round(max(p, 1.0 - p), 4)}
+
+    def train(self, examples: List[Tuple[str, str]], epochs: int = 20, learning_rate: float = 0.3, l2: float = 0.001, seed: int = 0) -> None:
+        """Fine-tunes the weights with SGD on (query, workflow) pairs."""
+        rng = random.Random(seed)
+        data = [(features(q), 1.0 if w == "optimization" else 0.0) for q, w in examples if w in WORKFLOWS]
+        self.trained = self.trained or bool(data)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for feats, target in data:
+                p = _sigmoid(self.bias + sum(self.weights.get(f, 0.0) for f in feats))
+                gradient = p - target
+                self.bias -= learning_rate * gradient
+                for f in feats:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - learning_rate * (gradient + l2 * w)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"bias": self.bias, "weights": self.weights}, f, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        classifier = cls(weights=data.get("weights", {}), bias=float(data.get("bias", DEFAULT_BIAS)))
+        classifier.trained = True
+        return classifier
+
+
+_classifier: Optional[LexicalClassifier] = None
+_log_lock = threading.Lock()
+
+
+def get_lexical_classifier() -> LexicalClassifier:
+    """
+    Returns the process-wide classifier: the trained model at LOCAL_CLASSIFIER_MODEL
+    if set and readable, otherwise the hand-tuned default weights.
+    """
+    global _classifier
+    if _classifier is None:
+        path = os.getenv("LOCAL_CLASSIFIER_MODEL")
+        if path and os.path.exists(path):
+            try:
+                _classifier = LexicalClassifier.load(path)
+            except (OSError, ValueError) as e:
+                print(f"Could not load local classifier model {path}: {e}")
+        if _classifier is None:
+            _classifier = LexicalClassifier()
+    return _classifier
+
+
+def get_confidence_threshold() -> float:
+    """
+    LOCAL_CLASSIFIER_THRESHOLD; above 1 always defers to the LLM classifier. Defaults to
+    0.85 with a trained model at LOCAL_CLASSIFIER_MODEL and to above 1 without one.
+    """
+    configured = os.getenv("LOCAL_CLASSIFIER_THRESHOLD")
+    if configured:
+        return float(configured)
+    return TRAINED_THRESHOLD if get_lexical_classifier().trained else UNTRAINED_THRESHOLD
+
+
+def log_classification(query: str, workflow: str, source: str) -> None:
+    """Appends a labelled query to CLASSIFIER_LOG (JSONL) to build the training corpus."""
+    path = os.getenv("CLASSIFIER_LOG")
+    if not path:
+        return
+    line = json.dumps({"ts": time.time(), "query": query, "workflow": workflow, "source": source}, ensure_ascii=False)
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Error writing classifier log {path}: {e}")
+
+
+def read_corpus(path: str) -> List[Dict[str, Any]]:
+    """Reads a JSONL corpus of {"query", "workflow"?, "source"?}; plain-text lines become unlabelled queries."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = {"query": line}
+            if isinstance(entry, dict) and isinstance(entry.get("query"), str):
+                items.append(entry)
+    return items
+
+
+async def _llm_labels(queries: List[str], concurrency: int = 5) -> List[Optional[str]]:
+    from .classifier import ClassifierAgent
+
+    agent = ClassifierAgent.shared()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def label(query: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                output = await agent.chain.ainvoke({"query": query})
+                return output.get("workflow") if isinstance(output, dict) else None
+            except Exception as e:
+                print(f"LLM classification failed for {query!r}: {e}")
+                return None
+
+    return await asyncio.gather(*[label(q) for q in queries])
+
+
+def evaluate(classifier: LexicalClassifier, queries: List[str], reference: List[Optional[str]], thresholds: Iterable[float]) -> Dict[str, Any]:
+    """Agreement of the local classifier with reference (LLM) labels, overall and per confidence threshold."""
+    started = time.perf_counter()
+    predictions = [classifier.classify(q) for q in queries]
+    elapsed_us = (time.perf_counter() - started) * 1e6 / max(len(queries), 1)
+
+    pairs = [(pred, ref) for pred, ref in zip(predictions, reference) if ref in WORKFLOWS]
+    confusion = {f"{ref}->{pred['workflow']}": 0 for ref in WORKFLOWS for pred in ({"workflow": w} for w in WORKFLOWS)}
+    for pred, ref in pairs:
+        confusion[f"{ref}->{pred['workflow']}"] += 1
+    by_threshold = []
+    for threshold in thresholds:
+        confident = [(pred, ref) for pred, ref in pairs if pred["confidence"] >= threshold]
+        agree = sum(1 for pred, ref in confident if pred["workflow"] == ref)
+        by_threshold.append({
+            "threshold": threshold,
+            "coverage": round(len(confident) / len(pairs), 3) if pairs else 0.0,
+            "agreement": round(agree / len(confident), 3) if confident else None,
+        })
+    return {
+        "labelled": len(pairs),
+        "agreement": round(sum(1 for pred, ref in pairs if pred["workflow"] == ref) / len(pairs), 3) if pairs else None,
+        "confusion": confusion,
+        "by_threshold": by_threshold,
+        "mean_latency_us": round(elapsed_us, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate or train the local lexical query classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    eval_parser = sub.add_parser("eval", help="Report agreement with the LLM classifier on a query corpus.")
+    eval_parser.add_argument("corpus", help="JSONL corpus ({\"query\", \"workflow\"}) or one query per line.")
+    eval_parser.add_argument("--live", action="store_true", help="Label the corpus with the LLM classifier now instead of using stored labels.")
+    eval_parser.add_argument("--model", help="Trained model JSON (defaults to LOCAL_CLASSIFIER_MODEL or built-in weights).")
+    train_parser = sub.add_parser("train", help="Fine-tune the weights on a labelled corpus (e.g. CLASSIFIER_LOG).")
+    train_parser.add_argument("corpus", help="JSONL corpus with \"query\" and \"workflow\".")
+    train_parser.add_argument("--out", required=True, help="Where to write the model JSON.")
+    train_parser.add_argument("--epochs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    corpus = read_corpus(args.corpus)
+    if not corpus:
+        print(f"No queries found in {args.corpus}.")
+        return 1
+    queries = [item["query"] for item in corpus]
+
+    if args.command == "train":
+        examples = [(item["query"], item.get("workflow")) for item in corpus if item.get("workflow") in WORKFLOWS]
+        classifier = LexicalClassifier()
+        classifier.train(examples, epochs=args.epochs)
+        classifier.save(args.out)
+        print(f"Trained on {len(examples)} labelled queries; model written to {args.out}.")
+        return 0
+
+    classifier = LexicalClassifier.load(args.model) if args.model else get_lexical_classifier()
+    if args.live:
+        reference = asyncio.run(_llm_labels(queries))
+    else:
+        # Only LLM-made labels count as reference; local decisions would grade themselves
+        reference = [item.get("workflow") if item.get("source", "llm") == "llm" else None for item in corpus]
+    report = evaluate(classifier, queries, reference, thresholds=[0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95])
+    if not report["labelled"]:
+        print("No LLM labels available; use --live or a corpus logged via CLASSIFIER_LOG.")
+        return 1
+
+    print(f"Queries with LLM labels: {report['labelled']}")
+    print(f"Overall agreement: {report['agreement']:.1%}")
+    print(f"Mean local latency: {report['mean_latency_us']} us/query")
+    print("Confusion (llm->local): " + ", ".join(f"{k}: {v}" for k, v in report["confusion"].items()))
+    print("\nthreshold  coverage  agreement")
+    for row in report["by_threshold"]:
+        agreement = f"{row['agreement']:.1%}" if row["agreement"] is not None else "n/a"
+        print(f"  {row['threshold']:.2f}      {row['coverage']:.1%}    {agreement}")
+    print(f"\nCurrent LOCAL_CLASSIFIER_THRESHOLD: {get_confidence_threshold()}")
+    return 0
+
+
+# Usage:
+#   python -m langchain_arch.agents.lexical_classifier eval queries.jsonl [--live]
+#   python -m langchain_arch.agents.lexical_classifier train classifier_log.jsonl --out classifier.json
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,38 +3,50 @@ import json
 import asyncio
 from typing import Dict, Any, AsyncIterator, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables import RunnableConfig, RunnablePassthrough
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tracers.log_stream import LogEntry
 
+from .base import BaseAgent
 from ..prompts.optimization_generator import create_optimization_generator_prompt
+from ..utils.result_encoding import get_result_encoder
+from ..utils.result_reduction import get_result_reducer
 
-# Configuration
-LLM_MODEL_NAME = "gpt-4o"
-
-class OptimizationRecommendationGeneratorAgent:
+class OptimizationRecommendationGeneratorAgent(BaseAgent):
     """
     Agent that synthesizes optimization recommendations from multiple data sources.
     Uses LangChain's built-in streaming (.astream_log).
     """
+    role = "optimization_generator"
+    temperature = 0.1
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "optimization_report": {"type": "string"},
+            "reasoning": {"type": "string"},
+        },
+        "required": ["optimization_report", "reasoning"],
+        "additionalProperties": False,
+    }
+
     def __init__(self):
-        print(">>> Using UPDATED OptimizationRecommendationGeneratorAgent! <<<") # Add verification print
-        self.prompt: ChatPromptTemplate = create_optimization_generator_prompt()
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL_NAME,
-            temperature=0.1,
-            streaming=True,
-        )
-        self.chain = (
+        super().__init__()
+        # Query results are rendered by the role's encoder (RESULT_ENCODING_OPTIMIZATION_GENERATOR)
+        self.result_encoder = get_result_encoder(self.role)
+        # and kept within the role's token budget by the workflow (RESULT_TOKEN_BUDGET_OPTIMIZATION_GENERATOR)
+        self.result_reducer = get_result_reducer(self.role, self.result_encoder, self.llm.model_name)
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        return create_optimization_generator_prompt()
+
+    def build_text_chain(self, llm):
+        return (
             RunnablePassthrough.assign(
-                data=lambda x: json.dumps(x['data'], indent=2)
+                data=lambda x: self.result_encoder.encode(x['data'], x.get('data_notes')),
+                data_format=lambda x: self.result_encoder.label,
             )
             | self.prompt
-            | self.llm
-        
-            | JsonOutputParser()
+            | llm
         )
 
     async def run(self, query: str, data: Dict[str, List[Dict[str, Any]]]) -> AsyncIterator[LogEntry]:
@@ -53,7 +65,7 @@ class OptimizationRecommendationGeneratorAgent:
         # Use astream_log
         async for chunk in self.chain.astream_log(
             input_data,
-            include_names=["ChatOpenAI", "JsonOutputParser"],
+            include_names=["ChatOpenAI", "RepairingJsonOutputParser"],
             include_types=["llm", "parser"]
         ):
             yield chunk
@@ -93,7 +105,7 @@ if __name__ == '__main__':
         async for entry in agent.run(query=test_query, data=test_data):
             print(f"Stream Chunk: {entry}")
             log_entries.append(entry)
-            if entry.name == "JsonOutputParser" and entry.state == "end":
+            if entry.name == "RepairingJsonOutputParser" and entry.state == "end":
                  final_result = entry.data.get('output')
 
         print("\n--- Streaming Complete ---")
@@ -3,34 +3,53 @@ import json
 import asyncio
 from typing import Dict, Any, AsyncIterator
 
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables import RunnableConfig, RunnablePassthrough
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tracers.log_stream import LogEntry
 
+from .base import BaseAgent
 from ..prompts.optimization_query_generator import create_optimization_query_generator_prompt
 
-# Configuration
-LLM_MODEL_NAME = "gpt-4o"
-
-class OptimizationQueryGeneratorAgent:
+class OptimizationQueryGeneratorAgent(BaseAgent):
     """
     Agent that decomposes optimization request and generates multiple Cypher queries.
     Uses LangChain's built-in streaming (.astream_log).
     """
-    def __init__(self):
-        self.prompt: ChatPromptTemplate = create_optimization_query_generator_prompt()
-        self.llm = ChatOpenAI(
-            model=LLM_MODEL_NAME,
-            temperature=0,
-            streaming=True,
-        )
-        self.chain = (
+    role = "optimization_query_generator"
+    temperature = 0
+    # Every query waits on this call, so slow starts are hedged (LLM_HEDGING)
+    hedged = True
+    # Not strict-compatible: "params" is a free-form object
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "queries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "objective": {"type": "string"},
+                        "query": {"type": "string"},
+                        "params": {"type": "object"},
+                    },
+                    "required": ["objective", "query", "params"],
+                },
+            },
+            "reasoning": {"type": "string"},
+        },
+        "required": ["queries", "reasoning"],
+    }
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        return create_optimization_query_generator_prompt()
+
+    def build_text_chain(self, llm):
+        # The message text before parsing, streamed by the workflows to start
+        # executing each query as soon as it is complete
+        return (
             RunnablePassthrough.assign(schema=lambda x: x['schema'])
             | self.prompt
-            | self.llm
-            | JsonOutputParser()
+            | llm
         )
 
     async def run(self, query: str, schema: str) -> AsyncIterator[LogEntry]:
@@ -48,7 +67,7 @@ class OptimizationQueryGeneratorAgent:
         # Use astream_log
         async for chunk in self.chain.astream_log(
             input_data,
-            include_names=["ChatOpenAI", "JsonOutputParser"],
+            include_names=["ChatOpenAI", "RepairingJsonOutputParser"],
             include_types=["llm", "parser"]
         ):
             yield chunk
@@ -98,7 +117,7 @@ if __name__ == '__main__':
         async for entry in agent.run(query=test_query, schema=schema_content):
             print(f"Stream Chunk: {entry}")
             log_entries.append(entry)
-            if entry.name == "JsonOutputParser" and entry.state == "end":
+            if entry.name == "RepairingJsonOutputParser" and entry.state == "end":
                 final_result = entry.data.get('output')
 
         print("\n--- Streaming Complete ---")
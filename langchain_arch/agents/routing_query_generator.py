@@ -0,0 +1,58 @@
+import os
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnablePassthrough
+
+from .base import BaseAgent
+from ..prompts.routing_query_generator import create_routing_query_generator_prompt
+
+
+class RoutingQueryGeneratorAgent(BaseAgent):
+    """
+    Combined classify-and-generate agent: one call returns the workflow label
+    and that workflow's Cypher queries with their reasoning, in place of the
+    classifier call followed by a query generator call.
+
+    "workflow" is the first key of the answer, so the Router can pick the
+    workflow from the first streamed tokens and hand it the rest of the
+    stream, executing queries while they are generated as usual.
+    """
+    role = "routing_query_generator"
+    temperature = 0
+    # On the critical path like the query generators it replaces
+    hedged = True
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "workflow": {"type": "string", "enum": ["insight", "optimization"]},
+            "queries": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "objective": {"type": "string"},
+                        "query": {"type": "string"},
+                        "params": {"type": "object"},
+                    },
+                    "required": ["query", "params"],
+                },
+            },
+            "reasoning": {"type": "string"},
+        },
+        "required": ["workflow", "queries", "reasoning"],
+    }
+
+    def create_prompt(self) -> ChatPromptTemplate:
+        return create_routing_query_generator_prompt()
+
+    def build_text_chain(self, llm):
+        return (
+            RunnablePassthrough.assign(schema=lambda x: x['schema'])
+            | self.prompt
+            | llm
+        )
+
+
+def is_combined_routing_enabled() -> bool:
+    """COMBINED_ROUTING (default false) classifies and generates the queries in one LLM call."""
+    return os.getenv("COMBINED_ROUTING", "false").lower() in ("1", "true", "yes")
@@ -1,16 +1,28 @@
 import asyncio
 import json
-from typing import Dict, Any, AsyncIterator, List, Union
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
 from langchain_core.exceptions import OutputParserException
-# Import neo4j time types and standard datetime
-from neo4j.time import Date, DateTime, Time 
-from datetime import date, datetime, time
 
 from langchain_core.tracers.log_stream import RunLogPatch
+from langchain_core.messages import BaseMessageChunk
 
 from ..agents.insight_query_generator import InsightQueryGeneratorAgent
 from ..agents.insight_generator import InsightGeneratorAgent
-from ..utils.neo4j_utils import Neo4jDatabase
+from ..utils.neo4j_utils import AsyncNeo4jDatabase
+from ..utils.result_set import ResultSet
+from ..utils.query_cache import get_query_cache
+from ..utils.cost_guard import get_cost_guard
+from ..utils.schema_service import get_schema_service
+from ..utils.schema_pruner import prune_schema
+from ..utils.generation_cache import get_generation_cache
+from ..utils.json_stream import JsonFieldStreamer
+from ..utils.query_pipeline import StreamedQueryDispatcher
+from ..utils.query_execution import run_generated_query
+from ..utils.result_reduction import describe_reduction
+from ..utils.result_encoding import DEFAULT_MEASURE_SPECS, is_measurement_enabled, measure_encodings, summarize_measurements
+from ..utils.schema_parser import parse_schema_cached
+from ..utils.cypher_validator import CypherValidator, is_validation_enabled
+from ..utils.cypher_params import get_plan_cache_stats
 
 class InsightWorkflow:
     """
@@ -18,38 +30,67 @@ class InsightWorkflow:
     Yields RunLogPatch chunks from agents and custom status/error dicts.
     Gets final agent results via separate ainvoke calls after streaming.
     """
-    def __init__(self, neo4j_db: Neo4jDatabase, schema_file: str = "neo4j_schema.md"):
-        self.query_generator = InsightQueryGeneratorAgent()
-        self.insight_generator = InsightGeneratorAgent()
+    def __init__(self, neo4j_db: AsyncNeo4jDatabase, schema_file: str = "neo4j_schema.md"):
+        # Shared agent instances; only the DB handle and schema state are per workflow
+        self.query_generator = InsightQueryGeneratorAgent.shared()
+        self.insight_generator = InsightGeneratorAgent.shared()
         self.neo4j_db = neo4j_db # Passed from Router
+        self.query_cache = get_query_cache()
+        self.cost_guard = get_cost_guard()
+        self.plan_cache_stats = get_plan_cache_stats()
+        self.schema_service = get_schema_service()
+        self.generation_cache = get_generation_cache()
+        self.generation_cache_match = None
         self.schema_file = schema_file
         self._schema_content = None
+        self.schema_version = None
+        self._schema_source = None
 
     def _load_schema(self) -> str:
         if self._schema_content is None:
-            content = self.neo4j_db.get_schema_markdown(self.schema_file)
-            if content is None:
+            # Live snapshot from the schema service, or the schema file until one exists
+            snapshot = self.schema_service.get_snapshot(self.schema_file)
+            if snapshot is None:
                 raise FileNotFoundError(f"Schema file '{self.schema_file}' not found.")
-            self._schema_content = content
+            self._schema_content = snapshot.markdown
+            self.schema_version = snapshot.version
+            self._schema_source = snapshot.source
         return self._schema_content
 
-    def _convert_temporal_types(self, data: List[Dict]) -> List[Dict]:
-        """Converts Neo4j temporal types in query results to ISO strings."""
-        processed_data = []
-        for record in data:
-            processed_record = {}
-            for key, value in record.items():
-                if isinstance(value, (Date, DateTime, Time, date, datetime, time)):
-                    processed_record[key] = value.isoformat()
-                # Handle nested lists (e.g., from collect())
-                elif isinstance(value, list):
-                    processed_record[key] = [item.isoformat() if isinstance(item, (Date, DateTime, Time, date, datetime, time)) else item for item in value]
-                else:
-                    processed_record[key] = value
-            processed_data.append(processed_record)
-        return processed_data
+    async def generate_queries(self, user_query: str, schema_markdown: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the query generator output for the question: from the generation
+        cache when an equivalent question was answered on this schema version,
+        otherwise from the LLM with the (pruned) schema. The Router starts this
+        before classification resolves (speculative routing) and hands the task to run().
+        """
+        schema = self._load_schema()
+        cached = self._cached_generation(user_query)
+        if cached is not None:
+            return cached
+        if schema_markdown is None:
+            schema_markdown = prune_schema(schema, self.schema_version, user_query).markdown
+        return await self.query_generator.chain.ainvoke({"query": user_query, "schema": schema_markdown})
+
+    def _cached_generation(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """Generator output from the generation cache, or None. Records the match for the status event."""
+        cached = self.generation_cache.lookup("insight", self.schema_version, user_query)
+        if cached is None:
+            return None
+        self.generation_cache_match = cached
+        return cached["result"]
 
-    async def run(self, user_query: str) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
+    async def _run_generated_query(self, item: Dict[str, Any], index: int, validator: Optional[CypherValidator]) -> Dict[str, Any]:
+        """Checks and executes one generated query; see run_generated_query() for the outcome."""
+        return await run_generated_query(self, item, index, validator, step="execute_cypher", label=f"Cypher query {index+1}")
+
+    async def run(self, user_query: str, query_generation: Optional[asyncio.Task] = None,
+                  generation_stream: Optional[AsyncIterator[BaseMessageChunk]] = None) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
+        """
+        `query_generation` is an already started generate_queries() task to await instead of invoking the generator.
+        `generation_stream` is the streamed answer of the Router's combined classify-and-generate call, read like
+        the generator's own stream; if its queries fail to parse or validate, the generator is asked instead.
+        """
         yield {"type": "status", "step": "insight_workflow_start", "status": "in_progress"}
         generated_queries = []
         query_gen_final_data = None
@@ -60,117 +101,165 @@ class InsightWorkflow:
             yield {"type": "status", "step": "load_schema", "status": "in_progress", "details": "Loading schema..."}
             try:
                 schema = self._load_schema()
-                yield {"type": "status", "step": "load_schema", "status": "completed", "details": f"Schema loaded."}
+                yield {"type": "status", "step": "load_schema", "status": "completed", "details": f"Schema loaded ({self._schema_source} snapshot {self.schema_version}).", "schema_version": self.schema_version}
             except Exception as e:
                  yield {"type": "error", "step": "load_schema", "message": f"Failed to load schema: {e}"}
                  return
 
-            # --- Step 2: Generate Cypher using ainvoke --- 
+            # --- Step 1.5: Prune schema to the question --- 
+            # Only the labels, properties and paths the question needs go into the generator prompt
+            pruned_schema = prune_schema(schema, self.schema_version, user_query)
+            if pruned_schema.pruned:
+                yield {"type": "status", "step": "prune_schema", "status": "completed", "details": f"Schema pruned: {pruned_schema.reason} ({len(pruned_schema.markdown)} of {len(schema)} chars).", "labels": pruned_schema.labels}
+            else:
+                yield {"type": "status", "step": "prune_schema", "status": "completed", "details": f"Using full schema: {pruned_schema.reason}."}
+
+            # --- Step 2: Generate Cypher, executing each query as soon as it is complete --- 
             yield {"type": "status", "step": "generate_cypher", "status": "in_progress", "details": "Generating Cypher query(s)..."}
-            
+
+            # Static check against the full schema, before anything reaches Neo4j or the insight LLM
+            validator = CypherValidator(parse_schema_cached(schema, self.schema_version)) if is_validation_enabled() else None
+            dispatcher = StreamedQueryDispatcher(
+                lambda item, index: self._run_generated_query(item, index, validator),
+                self.query_generator.output_parser,
+            )
+            outcomes: Dict[int, Dict[str, Any]] = {}
+            execution_announced = False
+
+            def record(outcome: Any) -> List[Dict[str, Any]]:
+                """Stores a finished query's outcome and returns its events; a rejection stops the workflow."""
+                if isinstance(outcome, Exception):
+                    return [{"type": "error", "step": "execute_cypher", "message": f"Error during concurrent query execution: {outcome}"}]
+                outcomes[outcome["index"]] = outcome
+                if outcome["rejected"]:
+                    dispatcher.cancel()
+                return outcome["events"]
+
+            generator_stream = None
+            generator_input = {"query": user_query, "schema": pruned_schema.markdown}
+            invalid_generation = None
             try:
-                # Invoke directly to get final result
-                query_gen_final_data = await self.query_generator.chain.ainvoke({"query": user_query, "schema": schema})
+                if query_generation is not None:
+                    # Started speculatively while the query was being classified
+                    query_gen_final_data = await query_generation
+                elif generation_stream is None:
+                    query_gen_final_data = self._cached_generation(user_query)
+                if query_gen_final_data is not None:
+                    if isinstance(query_gen_final_data, dict):
+                        dispatcher.offer(query_gen_final_data.get("queries"), final=True)
+                else:
+                    generator_stream = generation_stream or self.query_generator.text_chain.astream(generator_input)
+                    async for message_chunk in generator_stream:
+                        if dispatcher.feed(message_chunk.content if isinstance(message_chunk.content, str) else "") and not execution_announced:
+                            execution_announced = True
+                            yield {"type": "status", "step": "execute_cypher", "status": "in_progress", "details": "Executing queries while the rest are generated..."}
+                        for outcome in dispatcher.finished():
+                            for event in record(outcome):
+                                yield event
+                            if isinstance(outcome, Exception) or outcome["rejected"]:
+                                return
+                    query_gen_final_data = self.query_generator.validate_output(dispatcher.finish(), force=generation_stream is not None)
             except OutputParserException as ope:
-                 yield {"type": "error", "step": "generate_cypher", "status": "failed", "message": f"Failed to parse query generator output: {ope}"}
-                 return
+                 dispatcher.cancel()
+                 if self.query_generator.fallback_chain is None and generation_stream is None:
+                     yield {"type": "error", "step": "generate_cypher", "status": "failed", "message": f"Failed to parse query generator output: {ope}"}
+                     return
+                 invalid_generation = ope
             except Exception as qg_err:
+                 dispatcher.cancel()
                  yield {"type": "error", "step": "generate_cypher", "status": "failed", "message": f"Failed to get query generator result: {qg_err}"}
                  return
+            finally:
+                if generator_stream is not None:
+                    await generator_stream.aclose()
+
+            if invalid_generation is not None:
+                if generation_stream is not None:
+                    # The combined classify-and-generate output failed validation: generate as the two-step path does
+                    model = self.query_generator.llm.model_name
+                    details = f"Combined routing output failed validation; generating queries with {model}..."
+                else:
+                    # The fast model's output failed validation: start over with the fallback model
+                    model = self.query_generator.fallback_llm.model_name
+                    details = f"Query generator output failed validation; regenerating with {model}..."
+                yield {"type": "status", "step": "generate_cypher", "status": "in_progress", "details": details, "fallback": {"model": model, "error": str(invalid_generation)}}
+                outcomes.clear()
+                dispatcher = StreamedQueryDispatcher(
+                    lambda item, index: self._run_generated_query(item, index, validator),
+                    self.query_generator.output_parser,
+                )
+                try:
+                    if generation_stream is not None:
+                        query_gen_final_data = await self.query_generator.chain.ainvoke(generator_input)
+                    else:
+                        query_gen_final_data = await self.query_generator.regenerate(generator_input, invalid_generation)
+                except Exception as qg_err:
+                    yield {"type": "error", "step": "generate_cypher", "status": "failed", "message": f"Failed to get query generator result from {model}: {qg_err}"}
+                    return
+                dispatcher.offer(query_gen_final_data.get("queries"), final=True)
 
             if not isinstance(query_gen_final_data, dict) or "queries" not in query_gen_final_data:
+                 dispatcher.cancel()
                  yield {"type": "error", "step": "generate_cypher", "status": "failed", "message": f"Query generator returned invalid final output format: {query_gen_final_data}"}
                  return
 
-            generated_queries = query_gen_final_data["queries"]
+            # Each item is {"query", "params"}; literals are bound as parameters so
+            # Neo4j can reuse the cached plan across questions that differ only in values
+            generated_queries = dispatcher.items
             # Extract query generation reasoning
             query_generation_reasoning = query_gen_final_data.get("reasoning", "N/A") # Get reasoning, provide default
             
-            yield {"type": "status", "step": "generate_cypher", "status": "completed", "details": f"Generated {len(generated_queries)} Cypher query(s).", "generated_queries": generated_queries}
+            generation_status = {"type": "status", "step": "generate_cypher", "status": "completed", "details": f"Generated {len(generated_queries)} Cypher query(s).", "generated_queries": generated_queries, "pipelining": dispatcher.overlap_stats()}
+            if self.generation_cache_match is not None:
+                match = self.generation_cache_match
+                generation_status["details"] += f" Reused from the generation cache ({match['match']} match, similarity {match['similarity']:.2f})."
+                generation_status["generation_cache"] = {k: v for k, v in match.items() if k != "result"}
+            yield generation_status
             # Yield reasoning directly from the ainvoke result
             if query_generation_reasoning != "N/A": # Yield only if reasoning exists
                  yield {"type": "reasoning_summary", "step": "generate_cypher", "reasoning": query_generation_reasoning}
 
-            # --- Step 3: Execute Cypher Queries Concurrently --- 
-            yield {"type": "status", "step": "execute_cypher", "status": "in_progress", "details": f"Preparing to execute {len(generated_queries)} Cypher query(s) concurrently..."}
-            all_results_combined = []
-            has_error = False
-            error_message = ""
+            # --- Step 3: Wait for the queries still being checked or executed --- 
+            if not execution_announced:
+                yield {"type": "status", "step": "execute_cypher", "status": "in_progress", "details": f"Executing {len(generated_queries)} queries concurrently..."}
+            async for outcome in dispatcher.drain():
+                for event in record(outcome):
+                    yield event
+                if isinstance(outcome, Exception) or outcome["rejected"]:
+                    return
 
-            async def execute_single_query(query: str, index: int) -> Union[List[Dict], Exception]:
-                """Helper coroutine to run a single query and return result or exception."""
-                # This function no longer yields status. Status is handled after gather.
-                loop = asyncio.get_running_loop()
-                try:
-                    # Run Neo4j query in a thread pool executor
-                    results = await loop.run_in_executor(None, self.neo4j_db.query, query, None)
-                    return results
-                except Exception as e:
-                    # Return the exception object itself to be handled by gather
-                    print(f"Error in execute_single_query {index}: {e}") # Add logging
-                    return e
-
-            # Yield status *before* creating tasks
-            yield {"type": "status", "step": "execute_cypher", "status": "in_progress", "details": f"Executing {len(generated_queries)} queries concurrently..."}
-
-            # Create tasks for all queries
-            tasks = [execute_single_query(query, i) for i, query in enumerate(generated_queries)]
-            
-            # Use an inner async generator to yield status updates AFTER gathering results
-            async def gather_and_yield(tasks_to_run):
-                nonlocal all_results_combined, has_error, error_message
-                try:
-                    # Gather results or exceptions
-                    results_list = await asyncio.gather(*tasks_to_run)
-                    
-                    # Process results and yield status/errors
-                    for i, result in enumerate(results_list):
-                        if isinstance(result, Exception):
-                            has_error = True
-                            error_message = f"Error executing Cypher query {i+1}: {result}"
-                            yield {"type": "error", "step": "execute_cypher", "message": error_message, "query": generated_queries[i], "query_index": i}
-                            # Decide whether to break or continue gathering results from other queries
-                            # break # Uncomment to stop on first error
-                        elif isinstance(result, list):
-                            # Successfully got results list
-                            all_results_combined.extend(result)
-                            yield {"type": "status", "step": "execute_cypher", "status": "partial_complete", "details": f"Query {i+1} finished, {len(result)} results.", "query_index": i}
-                        else:
-                            # Handle unexpected return type
-                            has_error = True
-                            error_message = f"Unexpected result type for query {i+1}: {type(result)}"
-                            yield {"type": "error", "step": "execute_cypher", "message": error_message, "query": generated_queries[i], "query_index": i}
-
-                except Exception as gather_err:
-                    # Catch potential errors during gather itself 
-                    has_error = True
-                    error_message = f"Error during concurrent query execution: {gather_err}"
-                    yield {"type": "error", "step": "execute_cypher", "message": error_message}
-
-            # Run the gather_and_yield generator
-            async for status_update in gather_and_yield(tasks):
-                 yield status_update # Propagate status/error updates from within gather
-
-            # Check if any error occurred during execution
-            if has_error:
+            if validator is not None:
+                yield {"type": "status", "step": "validate_cypher", "status": "completed", "details": f"{len(generated_queries)} query(s) match the schema."}
+            if self.cost_guard is not None:
+                yield {"type": "status", "step": "check_cypher_cost", "status": "completed", "details": "Query plans within cost limits."}
+
+            failed = [outcomes[i] for i in sorted(outcomes) if outcomes[i]["result_set"] is None]
+            if failed:
+                 error_message = failed[-1]["events"][-1]["message"]
                  yield {"type": "status", "step": "execute_cypher", "status": "failed", "details": f"Concurrent execution failed. {error_message}"}
                  return
-                 
-            yield {"type": "status", "step": "execute_cypher", "status": "completed", "details": f"All {len(generated_queries)} queries executed concurrently.", "result_count": len(all_results_combined)}
+            all_results_combined: List[ResultSet] = [outcomes[i]["result_set"] for i in sorted(outcomes)]
 
-            # --- Step 3.5: Pre-process results for JSON serialization --- 
-            yield {"type": "status", "step": "process_results", "status": "in_progress", "details": "Converting temporal types in results..."}
-            try:
-                processed_data = self._convert_temporal_types(all_results_combined)
-                yield {"type": "status", "step": "process_results", "status": "completed", "details": "Temporal types converted."}
-            except Exception as proc_err:
-                yield {"type": "error", "step": "process_results", "message": f"Failed to process query results: {proc_err}"}
-                return
+            # Memoise the generation only once its queries ran cleanly
+            if self.generation_cache_match is None:
+                self.generation_cache.store("insight", self.schema_version, user_query, query_gen_final_data)
+            yield {"type": "status", "step": "execute_cypher", "status": "completed", "details": f"All {len(generated_queries)} queries executed concurrently.", "result_count": sum(len(rs) for rs in all_results_combined), "cache": self.query_cache.stats(), "plan_cache": self.plan_cache_stats.stats(), "generation_cache": self.generation_cache.stats()}
+
+            # Result sets are rendered by the insight agent's result encoder (compact JSON by default),
+            # summarised first if they are over the agent's token budget
+            processed_data, reduction = self.insight_generator.result_reducer.reduce(all_results_combined, user_query)
+            if self.insight_generator.result_reducer.enabled:
+                yield {"type": "status", "step": "reduce_results", "status": "warning" if reduction["tokens_before"] > reduction["budget_tokens"] else "completed", "details": describe_reduction(reduction), "reduction": reduction}
+
+            if is_measurement_enabled():
+                encoder = self.insight_generator.result_encoder
+                measurements = measure_encodings(processed_data, [encoder.spec, *DEFAULT_MEASURE_SPECS], self.insight_generator.llm.model_name)
+                yield {"type": "status", "step": "encode_results", "status": "completed", "details": summarize_measurements(encoder, measurements), "encoding": encoder.spec, "measurements": measurements}
 
             # --- Step 4: Generate Insight using ainvoke --- 
             yield {"type": "status", "step": "generate_insight", "status": "in_progress", "details": "Generating insight..."}
             insight_gen_final_data = None # Initialize
-            raw_llm_output = None # To store the AIMessage
+            raw_llm_output = None # Full message text, assembled from the stream
             
             try:
             
@@ -178,26 +267,45 @@ class InsightWorkflow:
                 insight_input = {
                     "query": user_query, 
                     "data": processed_data, 
+                    "data_notes": reduction["notes"],
                     "query_generation_reasoning": query_generation_reasoning
                 } 
                 
-                # Invoke the chain, this returns the AIMessage object
-                raw_llm_output = await self.insight_generator.chain.ainvoke(insight_input)
+                # Stream the message and forward the "insight" value as it arrives,
+                # so the UI shows text long before the full JSON is complete
+                insight_streamer = JsonFieldStreamer("insight")
+                raw_chunks = []
+                async for message_chunk in self.insight_generator.text_chain.astream(insight_input):
+                    text = message_chunk.content if isinstance(message_chunk.content, str) else ""
+                    raw_chunks.append(text)
+                    delta = insight_streamer.feed(text)
+                    if delta:
+                        yield {"type": "insight_delta", "step": "generate_insight", "delta": delta}
+                raw_llm_output = "".join(raw_chunks)
                 
                 # Explicitly parse the content of the message using the agent's parser
                 yield {"type": "status", "step": "generate_insight", "status": "in_progress", "details": "Parsing insight generator output..."}
-                # Ensure the agent has the 'output_parser' attribute defined in its __init__
-                if hasattr(self.insight_generator, 'output_parser') and callable(getattr(self.insight_generator.output_parser, 'parse', None)):
-                    insight_gen_final_data = self.insight_generator.output_parser.parse(raw_llm_output.content)
+                # Ensure the agent has the 'output_parser' attribute defined in its __init__.
+                # Parsed as is, else repaired locally, else fixed by a second LLM call.
+                if hasattr(self.insight_generator, 'output_parser') and callable(getattr(self.insight_generator.output_parser, 'aparse', None)):
+                    insight_gen_final_data = self.insight_generator.validate_output(await self.insight_generator.output_parser.aparse(raw_llm_output))
                 else:
                     # Fallback or raise error if parser is missing
                     yield {"type": "error", "step": "generate_insight", "status": "failed", "message": "InsightGeneratorAgent is missing the output_parser attribute."}
                     return 
 
             except OutputParserException as ope:
-                # Handle parsing errors
-                yield {"type": "error", "step": "generate_insight", "status": "failed", "message": f"Failed to parse insight generator output: {ope}"}
-                return
+                # Handle parsing errors: answer again with the fallback model if the role has one
+                if self.insight_generator.fallback_chain is None:
+                    yield {"type": "error", "step": "generate_insight", "status": "failed", "message": f"Failed to parse insight generator output: {ope}"}
+                    return
+                model = self.insight_generator.fallback_llm.model_name
+                yield {"type": "status", "step": "generate_insight", "status": "in_progress", "details": f"Insight generator output failed validation; regenerating with {model}...", "fallback": {"model": model, "error": str(ope)}}
+                try:
+                    insight_gen_final_data = await self.insight_generator.regenerate(insight_input, ope)
+                except Exception as ig_err:
+                    yield {"type": "error", "step": "generate_insight", "status": "failed", "message": f"Failed to get insight generator result from the fallback model: {ig_err}"}
+                    return
             except Exception as ig_err:
                 # Catch other errors during ainvoke or parsing
                 yield {"type": "error", "step": "generate_insight", "status": "failed", "message": f"Failed during insight generation or parsing: {ig_err}"}
@@ -223,6 +331,7 @@ class InsightWorkflow:
 if __name__ == '__main__':
     import os
     from dotenv import load_dotenv
+    from ..utils.neo4j_pool import close_async_driver
 
     load_dotenv()
 
@@ -233,7 +342,7 @@ if __name__ == '__main__':
         print(f"Test Query: {test_query}")
 
         try:
-            with Neo4jDatabase() as db:
+            async with AsyncNeo4jDatabase() as db:
                 workflow = InsightWorkflow(neo4j_db=db, schema_file=schema_f)
                 print("\n--- Running Insight Workflow (RunLogPatch) ---")
                 async for result_chunk in workflow.run(user_query=test_query):
@@ -251,5 +360,7 @@ if __name__ == '__main__':
             print(f"Workflow failed: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            await close_async_driver()
 
     asyncio.run(main())
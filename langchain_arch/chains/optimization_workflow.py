@@ -1,15 +1,28 @@
 import asyncio
 import json
-from typing import Dict, Any, AsyncIterator, List, Union
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
 
 # Import RunLogPatch instead of LogEntry
 from langchain_core.tracers.log_stream import RunLogPatch
+from langchain_core.messages import BaseMessageChunk
 # Import the missing exception
 from langchain_core.exceptions import OutputParserException
 
 from ..agents.optimization_query_generator import OptimizationQueryGeneratorAgent
 from ..agents.optimization_generator import OptimizationRecommendationGeneratorAgent
-from ..utils.neo4j_utils import Neo4jDatabase
+from ..utils.neo4j_utils import AsyncNeo4jDatabase
+from ..utils.query_cache import get_query_cache
+from ..utils.cost_guard import get_cost_guard
+from ..utils.schema_service import get_schema_service
+from ..utils.schema_pruner import prune_schema
+from ..utils.generation_cache import get_generation_cache
+from ..utils.query_pipeline import StreamedQueryDispatcher
+from ..utils.query_execution import run_generated_query
+from ..utils.result_reduction import describe_reduction
+from ..utils.result_encoding import DEFAULT_MEASURE_SPECS, is_measurement_enabled, measure_encodings, summarize_measurements
+from ..utils.schema_parser import parse_schema_cached
+from ..utils.cypher_validator import CypherValidator, is_validation_enabled
+from ..utils.cypher_params import get_plan_cache_stats
 
 class OptimizationWorkflow:
     """
@@ -17,31 +30,68 @@ class OptimizationWorkflow:
     Yields RunLogPatch chunks from agents and custom status/error dicts.
     Gets final agent results via separate ainvoke calls after streaming.
     """
-    def __init__(self, neo4j_db: Neo4jDatabase, schema_file: str = "neo4j_schema.md"):
-        self.query_generator = OptimizationQueryGeneratorAgent()
-        self.recommendation_generator = OptimizationRecommendationGeneratorAgent()
+    def __init__(self, neo4j_db: AsyncNeo4jDatabase, schema_file: str = "neo4j_schema.md"):
+        # Shared agent instances; only the DB handle and schema state are per workflow
+        self.query_generator = OptimizationQueryGeneratorAgent.shared()
+        self.recommendation_generator = OptimizationRecommendationGeneratorAgent.shared()
         self.neo4j_db = neo4j_db
+        self.query_cache = get_query_cache()
+        self.cost_guard = get_cost_guard()
+        self.plan_cache_stats = get_plan_cache_stats()
+        self.schema_service = get_schema_service()
+        self.generation_cache = get_generation_cache()
+        self.generation_cache_match = None
         self.schema_file = schema_file
         self._schema_content = None
+        self.schema_version = None
+        self._schema_source = None
 
     def _load_schema(self) -> str:
         if self._schema_content is None:
-            content = self.neo4j_db.get_schema_markdown(self.schema_file)
-            if content is None:
+            # Live snapshot from the schema service, or the schema file until one exists
+            snapshot = self.schema_service.get_snapshot(self.schema_file)
+            if snapshot is None:
                 raise FileNotFoundError(f"Schema file '{self.schema_file}' not found.")
-            self._schema_content = content
+            self._schema_content = snapshot.markdown
+            self.schema_version = snapshot.version
+            self._schema_source = snapshot.source
         return self._schema_content
 
-    async def _execute_query_async(self, objective: str, cypher_query: str) -> Dict[str, Any]:
-        try:
-            loop = asyncio.get_running_loop()
-            results = await loop.run_in_executor(None, self.neo4j_db.query, cypher_query, None)
-            return {"objective": objective, "query": cypher_query, "results": results, "status": "success"}
-        except Exception as e:
-            print(f"Error executing query for objective '{objective}': {e}\nQuery: {cypher_query}")
-            return {"objective": objective, "query": cypher_query, "error": str(e), "status": "error"}
+    async def generate_queries(self, user_query: str, schema_markdown: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the query generator output for the question: from the generation
+        cache when an equivalent question was answered on this schema version,
+        otherwise from the LLM with the (pruned) schema. The Router starts this
+        before classification resolves (speculative routing) and hands the task to run().
+        """
+        schema = self._load_schema()
+        cached = self._cached_generation(user_query)
+        if cached is not None:
+            return cached
+        if schema_markdown is None:
+            schema_markdown = prune_schema(schema, self.schema_version, user_query).markdown
+        return await self.query_generator.chain.ainvoke({"query": user_query, "schema": schema_markdown})
+
+    def _cached_generation(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """Generator output from the generation cache, or None. Records the match for the status event."""
+        cached = self.generation_cache.lookup("optimization", self.schema_version, user_query)
+        if cached is None:
+            return None
+        self.generation_cache_match = cached
+        return cached["result"]
 
-    async def run(self, user_query: str) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
+    async def _run_generated_query(self, item: Dict[str, Any], index: int, validator: Optional[CypherValidator]) -> Dict[str, Any]:
+        """Checks and executes one generated optimization query; see run_generated_query() for the outcome."""
+        objective = item.get("objective", f"Unknown Objective {index+1}")
+        return await run_generated_query(self, item, index, validator, step="execute_opt_queries", label=f"Query '{objective}'", fields={"objective": objective})
+
+    async def run(self, user_query: str, query_generation: Optional[asyncio.Task] = None,
+                  generation_stream: Optional[AsyncIterator[BaseMessageChunk]] = None) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
+        """
+        `query_generation` is an already started generate_queries() task to await instead of invoking the generator.
+        `generation_stream` is the streamed answer of the Router's combined classify-and-generate call, read like
+        the generator's own stream; if its queries fail to parse or validate, the generator is asked instead.
+        """
         yield {"type": "status", "step": "opt_workflow_start", "status": "in_progress"}
         objectives_with_queries = []
         query_gen_final_data = None
@@ -52,143 +102,177 @@ class OptimizationWorkflow:
             yield {"type": "status", "step": "load_schema", "status": "in_progress", "details": "Loading schema..."}
             try:
                 schema = self._load_schema()
-                yield {"type": "status", "step": "load_schema", "status": "completed", "details": f"Schema loaded."}
+                yield {"type": "status", "step": "load_schema", "status": "completed", "details": f"Schema loaded ({self._schema_source} snapshot {self.schema_version}).", "schema_version": self.schema_version}
             except Exception as e:
                  yield {"type": "error", "step": "load_schema", "message": f"Failed to load schema: {e}"}; return
 
-            # --- Step 2: Generate Opt Queries using ainvoke --- 
+            # --- Step 1.5: Prune schema to the question --- 
+            # Only the labels, properties and paths the question needs go into the generator prompt
+            pruned_schema = prune_schema(schema, self.schema_version, user_query)
+            if pruned_schema.pruned:
+                yield {"type": "status", "step": "prune_schema", "status": "completed", "details": f"Schema pruned: {pruned_schema.reason} ({len(pruned_schema.markdown)} of {len(schema)} chars).", "labels": pruned_schema.labels}
+            else:
+                yield {"type": "status", "step": "prune_schema", "status": "completed", "details": f"Using full schema: {pruned_schema.reason}."}
+
+            # --- Step 2: Generate Opt Queries, executing each query as soon as it is complete --- 
             yield {"type": "status", "step": "generate_opt_queries", "status": "in_progress", "details": "Generating optimization queries..."}
-            
+
+            # Static check against the full schema, before anything reaches Neo4j or the recommendation LLM
+            validator = CypherValidator(parse_schema_cached(schema, self.schema_version)) if is_validation_enabled() else None
+            dispatcher = StreamedQueryDispatcher(
+                lambda item, index: self._run_generated_query(item, index, validator),
+                self.query_generator.output_parser,
+            )
+            outcomes: Dict[int, Dict[str, Any]] = {}
+            execution_announced = False
+
+            def record(outcome: Any) -> List[Dict[str, Any]]:
+                """Stores a finished query's outcome and returns its events; a rejection stops the workflow."""
+                if isinstance(outcome, Exception):
+                    return [{"type": "error", "step": "execute_opt_queries", "message": f"Error during concurrent query execution: {outcome}"}]
+                outcomes[outcome["index"]] = outcome
+                if outcome["rejected"]:
+                    dispatcher.cancel()
+                return outcome["events"]
+
+            generator_stream = None
+            generator_input = {"query": user_query, "schema": pruned_schema.markdown}
+            invalid_generation = None
             try:
-                # Invoke directly to get final result
-                query_gen_final_data = await self.query_generator.chain.ainvoke({"query": user_query, "schema": schema})
+                if query_generation is not None:
+                    # Started speculatively while the query was being classified
+                    query_gen_final_data = await query_generation
+                elif generation_stream is None:
+                    query_gen_final_data = self._cached_generation(user_query)
+                if query_gen_final_data is not None:
+                    if isinstance(query_gen_final_data, dict):
+                        dispatcher.offer(query_gen_final_data.get("queries"), final=True)
+                else:
+                    generator_stream = generation_stream or self.query_generator.text_chain.astream(generator_input)
+                    async for message_chunk in generator_stream:
+                        if dispatcher.feed(message_chunk.content if isinstance(message_chunk.content, str) else "") and not execution_announced:
+                            execution_announced = True
+                            yield {"type": "status", "step": "execute_opt_queries", "status": "in_progress", "details": "Executing optimization queries while the rest are generated..."}
+                        for outcome in dispatcher.finished():
+                            for event in record(outcome):
+                                yield event
+                            if isinstance(outcome, Exception) or outcome["rejected"]:
+                                return
+                    query_gen_final_data = self.query_generator.validate_output(dispatcher.finish(), force=generation_stream is not None)
+            except OutputParserException as ope:
+                 dispatcher.cancel()
+                 if self.query_generator.fallback_chain is None and generation_stream is None:
+                     yield {"type": "error", "step": "generate_opt_queries", "status": "failed", "message": f"Failed to get opt query generator result: {ope}"}; return
+                 invalid_generation = ope
             except Exception as qg_err:
+                 dispatcher.cancel()
                  yield {"type": "error", "step": "generate_opt_queries", "status": "failed", "message": f"Failed to get opt query generator result: {qg_err}"}; return
+            finally:
+                if generator_stream is not None:
+                    await generator_stream.aclose()
+
+            if invalid_generation is not None:
+                if generation_stream is not None:
+                    # The combined classify-and-generate output failed validation: generate as the two-step path does
+                    model = self.query_generator.llm.model_name
+                    details = f"Combined routing output failed validation; generating queries with {model}..."
+                else:
+                    # The fast model's output failed validation: start over with the fallback model
+                    model = self.query_generator.fallback_llm.model_name
+                    details = f"Opt query generator output failed validation; regenerating with {model}..."
+                yield {"type": "status", "step": "generate_opt_queries", "status": "in_progress", "details": details, "fallback": {"model": model, "error": str(invalid_generation)}}
+                outcomes.clear()
+                dispatcher = StreamedQueryDispatcher(
+                    lambda item, index: self._run_generated_query(item, index, validator),
+                    self.query_generator.output_parser,
+                )
+                try:
+                    if generation_stream is not None:
+                        query_gen_final_data = await self.query_generator.chain.ainvoke(generator_input)
+                    else:
+                        query_gen_final_data = await self.query_generator.regenerate(generator_input, invalid_generation)
+                except Exception as qg_err:
+                    yield {"type": "error", "step": "generate_opt_queries", "status": "failed", "message": f"Failed to get opt query generator result from {model}: {qg_err}"}; return
+                dispatcher.offer(query_gen_final_data.get("queries"), final=True)
 
             if not isinstance(query_gen_final_data, dict) or "queries" not in query_gen_final_data:
+                 dispatcher.cancel()
                  yield {"type": "error", "step": "generate_opt_queries", "status": "failed", "message": f"Opt query generator returned invalid final output: {query_gen_final_data}"}; return
 
-            objectives_with_queries = query_gen_final_data["queries"]
-            yield {"type": "status", "step": "generate_opt_queries", "status": "completed", "details": f"Generated {len(objectives_with_queries)} optimization queries.", "generated_queries": objectives_with_queries}
+            # Items are {"objective", "query", "params"}; values are bound as parameters
+            # instead of inlined so Neo4j can reuse cached plans
+            objectives_with_queries = dispatcher.items
+            generation_status = {"type": "status", "step": "generate_opt_queries", "status": "completed", "details": f"Generated {len(objectives_with_queries)} optimization queries.", "generated_queries": objectives_with_queries, "pipelining": dispatcher.overlap_stats()}
+            if self.generation_cache_match is not None:
+                match = self.generation_cache_match
+                generation_status["details"] += f" Reused from the generation cache ({match['match']} match, similarity {match['similarity']:.2f})."
+                generation_status["generation_cache"] = {k: v for k, v in match.items() if k != "result"}
+            yield generation_status
             if query_gen_final_data.get("reasoning"):
                  yield {"type": "reasoning_summary", "step": "generate_opt_queries", "reasoning": query_gen_final_data["reasoning"]}
 
-            # --- Step 3: Execute Optimization Queries Concurrently using asyncio.gather --- 
+            if dispatcher.skipped:
+                 yield {"type": "status", "step": "generate_opt_queries", "status": "warning", "details": f"Filtered out {dispatcher.skipped} invalid items from generated queries list."}
             num_queries = len(objectives_with_queries)
-            yield {"type": "status", "step": "execute_opt_queries", "status": "in_progress", "details": f"Preparing to execute {num_queries} optimization queries concurrently..."}
-            
+            if num_queries == 0 and dispatcher.skipped:
+                 yield {"type": "error", "step": "execute_opt_queries", "message": "No valid queries found to execute after filtering."}; return
+
+            # --- Step 3: Wait for the optimization queries still being checked or executed --- 
+            if not execution_announced:
+                yield {"type": "status", "step": "execute_opt_queries", "status": "in_progress", "details": f"Executing {num_queries} optimization queries concurrently..."}
+            async for outcome in dispatcher.drain():
+                for event in record(outcome):
+                    yield event
+                if isinstance(outcome, Exception) or outcome["rejected"]:
+                    return
+
+            if validator is not None:
+                yield {"type": "status", "step": "validate_cypher", "status": "completed", "details": f"{num_queries} optimization queries match the schema."}
+            if self.cost_guard is not None:
+                yield {"type": "status", "step": "check_cypher_cost", "status": "completed", "details": "Query plans within cost limits."}
+
             combined_query_results = {} # Store results keyed by objective
-            has_error = False
             error_message = ""
-
-            async def execute_single_opt_query(query_item: dict, index: int) -> Union[Dict, Exception]:
-                """Helper coroutine to run a single opt query and return result dict or exception."""
-                objective = query_item.get("objective", f"Unknown Objective {index+1}")
-                query = query_item.get("query", "")
-                if not query:
-                    # Return an error-like dict immediately for missing query
-                    return {"objective": objective, "error": "Missing query text", "status": "error"} 
-                
-                # No yield here
-                loop = asyncio.get_running_loop()
-                try:
-                    # Run Neo4j query in a thread pool executor
-                    results = await loop.run_in_executor(None, self.neo4j_db.query, query, None)
-                    # Return success dict
-                    return {"objective": objective, "results": results, "status": "success"}
-                except Exception as e:
-                    # Return the exception object itself
-                    print(f"Error in execute_single_opt_query {index} ('{objective}'): {e}") # Add logging
-                    return e
-
-            # Yield status *before* creating tasks
-            yield {"type": "status", "step": "execute_opt_queries", "status": "in_progress", "details": f"Executing {num_queries} optimization queries concurrently..."}
-
-            # Create tasks, ensuring items are valid dicts with 'query'
-            tasks = [
-                execute_single_opt_query(item, i) 
-                for i, item in enumerate(objectives_with_queries) 
-                if isinstance(item, dict) and "query" in item
-            ]
-            
-            if len(tasks) != num_queries:
-                 yield {"type": "status", "step": "execute_opt_queries", "status": "warning", "details": f"Filtered out {num_queries - len(tasks)} invalid items from generated queries list."}
-                 num_queries = len(tasks)
-                 if num_queries == 0:
-                      yield {"type": "error", "step": "execute_opt_queries", "message": "No valid queries found to execute after filtering."}; return
-
-            # Use an inner async generator to yield status updates AFTER gathering results
-            async def gather_and_yield(tasks_to_run):
-                nonlocal combined_query_results, has_error, error_message
-                try:
-                    results_list = await asyncio.gather(*tasks_to_run)
-                    
-                    for i, result_or_exc in enumerate(results_list):
-                        # Determine original query item index if filtering occurred (tricky, assume order for now)
-                        original_item_index = i # Placeholder - refine if filtering is complex
-                        query_item = objectives_with_queries[original_item_index] # Get corresponding query info
-                        objective = query_item.get("objective", f"Unknown Objective {original_item_index+1}")
-                        query_text = query_item.get("query", "N/A")
-
-                        if isinstance(result_or_exc, Exception):
-                            # Exception from execute_single_opt_query
-                            has_error = True
-                            error_message = f"Query '{objective}' FAILED: {result_or_exc}"
-                            yield {"type": "error", "step": "execute_opt_queries", "objective": objective, "message": error_message, "query": query_text, "query_index": original_item_index}
-                            combined_query_results[objective] = [] # Store empty for failed objective
-                        elif isinstance(result_or_exc, dict):
-                            # Dict returned by execute_single_opt_query
-                            status = result_or_exc.get("status")
-                            if status == "error":
-                                has_error = True
-                                err_detail = result_or_exc.get("error", "Unknown execution error")
-                                error_message = f"Query '{objective}' failed: {err_detail}" 
-                                yield {"type": "error", "step": "execute_opt_queries", "objective": objective, "message": error_message, "query": query_text, "query_index": original_item_index}
-                                combined_query_results[objective] = [] # Store empty for failed objective
-                            elif status == "success":
-                                results = result_or_exc.get("results", [])
-                                combined_query_results[objective] = results
-                                yield {"type": "status", "step": "execute_opt_queries", "status": "partial_complete", "objective": objective, "details": f"Query '{objective}' finished, {len(results)} results.", "query_index": original_item_index}
-                            else:
-                                # Handle unexpected dict status
-                                has_error = True;
-                                error_message = f"Unexpected status '{status}' for query '{objective}'"
-                                yield {"type": "error", "step": "execute_opt_queries", "objective": objective, "message": error_message, "query": query_text, "query_index": original_item_index}
-                                combined_query_results[objective] = []
-                        else:
-                            # Handle unexpected return type from gather
-                            has_error = True;
-                            error_message = f"Unexpected result type for query task {original_item_index+1}: {type(result_or_exc)}"
-                            yield {"type": "error", "step": "execute_opt_queries", "objective": objective, "message": error_message, "query": query_text, "query_index": original_item_index}
-                            combined_query_results[objective] = []
-
-                except Exception as gather_err:
-                    has_error = True
-                    error_message = f"Error during concurrent query execution: {gather_err}"
-                    yield {"type": "error", "step": "execute_opt_queries", "message": error_message}
-
-            # Run the gather_and_yield generator
-            async for status_update in gather_and_yield(tasks):
-                 yield status_update # Propagate status/error updates
+            for i in sorted(outcomes):
+                outcome = outcomes[i]
+                if outcome["result_set"] is None:
+                    error_message = outcome["events"][-1]["message"]
+                    combined_query_results[outcome["objective"]] = [] # Store empty for failed objective
+                else:
+                    combined_query_results[outcome["objective"]] = outcome["result_set"]
 
             # Check if any error occurred during execution
-            if has_error:
+            if error_message:
                  final_detail = f"Concurrent execution finished. {error_message}"
                  yield {"type": "status", "step": "execute_opt_queries", "status": "failed", "details": final_detail}
                  # Depending on requirements, you might want to return here or continue to recommendations with partial data
                  # return # Uncomment to stop workflow on query error
             else:     
                 final_detail = f"All {num_queries} optimization queries executed concurrently."
-                yield {"type": "status", "step": "execute_opt_queries", "status": "completed", "details": final_detail, "result_summary": {k: len(v) for k, v in combined_query_results.items()}}
+                # Memoise the generation only once its queries ran cleanly
+                if self.generation_cache_match is None:
+                    self.generation_cache.store("optimization", self.schema_version, user_query, query_gen_final_data)
+                yield {"type": "status", "step": "execute_opt_queries", "status": "completed", "details": final_detail, "result_summary": {k: len(v) for k, v in combined_query_results.items()}, "cache": self.query_cache.stats(), "plan_cache": self.plan_cache_stats.stats(), "generation_cache": self.generation_cache.stats()}
+
+            # Summarise results that would push the prompt over the agent's token budget
+            reco_data, reduction = self.recommendation_generator.result_reducer.reduce(combined_query_results, user_query)
+            if self.recommendation_generator.result_reducer.enabled:
+                yield {"type": "status", "step": "reduce_results", "status": "warning" if reduction["tokens_before"] > reduction["budget_tokens"] else "completed", "details": describe_reduction(reduction), "reduction": reduction}
+
+            if is_measurement_enabled():
+                encoder = self.recommendation_generator.result_encoder
+                measurements = measure_encodings(reco_data, [encoder.spec, *DEFAULT_MEASURE_SPECS], self.recommendation_generator.llm.model_name)
+                yield {"type": "status", "step": "encode_results", "status": "completed", "details": summarize_measurements(encoder, measurements), "encoding": encoder.spec, "measurements": measurements}
 
             # --- Step 4: Generate Recommendations using ainvoke --- 
             yield {"type": "status", "step": "generate_recommendations", "status": "in_progress", "details": "Generating recommendations..."}
             reco_gen_final_data = None # Initialize
             
             try:
-                reco_input = {"query": user_query, "data": combined_query_results}
-                # Invoke the chain directly. Since JsonOutputParser is the last step
-                # in the agent's chain, this returns the already parsed dictionary.
+                reco_input = {"query": user_query, "data": reco_data, "data_notes": reduction["notes"]}
+                # Invoke the chain directly. It ends with the JSON parser and the schema
+                # check, so this returns the parsed dictionary, regenerated by the
+                # fallback model (LLM_OPTIMIZATION_GENERATOR_FALLBACK_MODEL) if it was invalid.
                 reco_gen_final_data = await self.recommendation_generator.chain.ainvoke(reco_input)
 
             except Exception as rg_err:
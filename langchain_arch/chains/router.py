@@ -1,13 +1,45 @@
 import asyncio
 import json
-from typing import Dict, Any, AsyncIterator, Union
+import uuid
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Union
 
+from langchain_core.messages import BaseMessageChunk
 from langchain_core.tracers.log_stream import RunLogPatch
 
 from .insight_workflow import InsightWorkflow
 from .optimization_workflow import OptimizationWorkflow
 from ..agents.classifier import ClassifierAgent
-from ..utils.neo4j_utils import Neo4jDatabase
+from ..agents.routing_query_generator import RoutingQueryGeneratorAgent, is_combined_routing_enabled
+from ..agents.lexical_classifier import get_lexical_classifier, get_confidence_threshold, log_classification
+from ..utils.neo4j_utils import AsyncNeo4jDatabase
+from ..utils.query_telemetry import RequestTimer
+from ..utils.speculation import get_speculative_routing
+from ..utils.schema_service import get_schema_service
+from ..utils.schema_pruner import prune_schema
+from ..utils.json_stream import JsonFieldStreamer
+from ..utils.json_repair import get_parse_stats
+from ..utils.llm_usage import get_llm_usage
+from ..utils.llm_hedging import hedging_stats
+from ..utils.llm_scheduler import LLMCallContext, get_llm_scheduler, set_call_context, reset_call_context
+
+class _ReplayedStream:
+    """The chunks already read from a message stream, then the rest of it. aclose() closes the stream even if unread."""
+
+    def __init__(self, head: List[BaseMessageChunk], stream: AsyncIterator[BaseMessageChunk]):
+        self._head = list(head)
+        self._stream = stream
+
+    def __aiter__(self) -> "_ReplayedStream":
+        return self
+
+    async def __anext__(self) -> BaseMessageChunk:
+        if self._head:
+            return self._head.pop(0)
+        return await self._stream.__anext__()
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
 
 class Router:
     """
@@ -16,26 +48,45 @@ class Router:
     streaming RunLogPatch objects and custom status dicts.
     Gets final agent results via separate ainvoke calls after streaming.
     """
-    def __init__(self, schema_file: str = "neo4j_schema.md"):
-        # Initialize DB connection per Router instance.
-        # Ensures connection is managed if Router is long-lived.
+    def __init__(self, schema_file: str = "neo4j_schema.md", session_id: str = None, priority: str = "interactive"):
+        # DB handle per Router instance. Sessions are borrowed from the
+        # process-wide driver pool, so creating a Router is cheap.
         self._db_connection = None
         self.schema_file = schema_file
-        self.classifier = ClassifierAgent()
+        # Who the LLM calls are queued for when LLM budgets are configured (utils/llm_scheduler.py):
+        # sessions share capacity fairly, interactive requests go before batch ones
+        self.session_id = session_id or uuid.uuid4().hex
+        self.priority = priority
+        # Agents and their chains are built once per process and shared across messages
+        self.classifier = ClassifierAgent.shared()
+        # Local lexical pre-classifier; the LLM classifier is only asked when it is unsure
+        self.lexical_classifier = get_lexical_classifier()
+        self.local_confidence_threshold = get_confidence_threshold()
+        # Starts query generation alongside the LLM classifier when configured
+        self.speculation = get_speculative_routing()
+        # One LLM call for the label and the queries (COMBINED_ROUTING); the classifier is its fallback
+        self.routing_generator = RoutingQueryGeneratorAgent.shared() if is_combined_routing_enabled() else None
         # Workflow instantiation moved to run() to ensure they get the active DB connection
 
     def _get_db(self):
-        """Creates or returns the active DB connection for this router instance."""
+        """Creates or returns the DB handle for this router instance, backed by the shared pool."""
         if self._db_connection is None:
-            # Add error handling for DB connection failure if needed
-            self._db_connection = Neo4jDatabase()
+            self._db_connection = AsyncNeo4jDatabase()
         return self._db_connection
 
-    def _close_db(self):
-        """Closes the DB connection if it exists."""
+    def _new_workflow(self, workflow_type: str):
+        db = self._get_db()
+        if workflow_type == "insight":
+            return InsightWorkflow(db, self.schema_file)
+        if workflow_type == "optimization":
+            return OptimizationWorkflow(db, self.schema_file)
+        return None
+
+    async def _close_db(self):
+        """Releases the DB handle if it exists. The pooled driver stays open."""
         if self._db_connection:
             try:
-                self._db_connection.close()
+                await self._db_connection.close()
                 # print("Router: DB connection closed.")
             except Exception as e:
                 print(f"Router: Error closing DB: {e}")
@@ -45,28 +96,138 @@ class Router:
     async def run(self, user_query: str) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
         """
         Runs classification and the selected workflow, streaming RunLogPatch and status dicts.
-        Manages Neo4j connection lifecycle for the run.
+        Borrows a DB handle from the shared pool for the duration of the run.
+        Ends with a {"type": "timing_report"} dict splitting the request time between
+        LLM and database steps, with per-query execution telemetry, how often
+        LLM output needed local repair or a fixing LLM call ("parsing"), and
+        latency, token counts and fallbacks per agent role ("llm_usage"), and
+        the hedged requests of the roles that hedge ("llm_hedging").
+        When LLM calls had to wait for capacity, an "llm_queue" status event
+        follows with the wait, which the report lists as its own stage.
         """
+        timer = RequestTimer()
+        completed = False
+        call_context = LLMCallContext(self.session_id, self.priority)
+        context_token = set_call_context(call_context)
+        scheduler = get_llm_scheduler()
+        try:
+            async for chunk in self._route(user_query):
+                timer.observe(chunk)
+                yield chunk
+                queue_wait = call_context.take_queue_wait()
+                if queue_wait:
+                    event = {"type": "status", "step": "llm_queue", "status": "completed", "details": f"Waited {queue_wait['wait_ms']:,.0f} ms for LLM capacity ({queue_wait['queued_calls']} call(s) queued).", **queue_wait}
+                    timer.observe(event)
+                    yield event
+            completed = True
+        finally:
+            reset_call_context(context_token)
+            report = timer.report()
+            report["parsing"] = get_parse_stats().stats()
+            report["llm_usage"] = get_llm_usage().stats()
+            if scheduler.enabled:
+                report["llm_scheduler"] = scheduler.stats()
+            hedging = hedging_stats()
+            if hedging:
+                report["llm_hedging"] = hedging
+            slowest = report["slowest_query"]
+            print(
+                f"Request timing: total {report['total_ms']:.0f} ms, llm {report['llm_ms']:.0f} ms, "
+                f"db {report['db_ms']:.0f} ms ({report['query_count']} queries, {report['cached_queries']} cached"
+                + (f", slowest {slowest['wall_ms']:.0f} ms" if slowest else "") + ")"
+            )
+        if completed:
+            yield {"type": "timing_report", "step": "router", "report": report}
+
+    async def _classify_and_generate(self, user_query: str) -> Tuple[Optional[Dict[str, Any]], Optional[AsyncIterator[BaseMessageChunk]]]:
+        """
+        Starts the combined classify-and-generate call and reads its stream up
+        to the end of the "workflow" value.
+
+        Returns:
+            The classification and the whole answer as a stream (the chunks
+            already read, then the rest) for the workflow to execute from, or
+            (None, None) if the call failed or gave no valid label before
+            ending; the caller then classifies the two-step way.
+        """
+        snapshot = get_schema_service().get_snapshot(self.schema_file)
+        if snapshot is None:
+            return None, None
+        generator_input = {"query": user_query, "schema": prune_schema(snapshot.markdown, snapshot.version, user_query).markdown}
+        stream = self.routing_generator.text_chain.astream(generator_input)
+        label = JsonFieldStreamer("workflow")
+        head: List[BaseMessageChunk] = []
+        try:
+            async for message_chunk in stream:
+                head.append(message_chunk)
+                label.feed(message_chunk.content if isinstance(message_chunk.content, str) else "")
+                if label.done:
+                    break
+        except Exception as e:
+            print(f"Router: combined classify-and-generate call failed ({e}); falling back to the classifier.")
+            await stream.aclose()
+            return None, None
+        if label.value not in ("insight", "optimization"):
+            print(f"Router: combined classify-and-generate call gave no valid workflow ({label.value!r}); falling back to the classifier.")
+            await stream.aclose()
+            return None, None
+
+        classification = {
+            "workflow": label.value,
+            "reasoning": "Classified together with query generation; the reasoning follows the generated queries.",
+            "classifier": "combined",
+        }
+        return classification, _ReplayedStream(head, stream)
+
+    async def _route(self, user_query: str) -> AsyncIterator[Union[RunLogPatch, Dict[str, Any]]]:
+        """Classification and workflow dispatch; run() wraps it with timing."""
         yield {"type": "status", "step": "start_router", "status": "in_progress", "details": "Initializing..."}
 
         classification_output = None
-        db = self._get_db()
+        speculation = {}
+        generation_stream = None
 
         try:
             # --- Step 1: Classify Query using ainvoke --- 
             yield {"type": "status", "step": "classify_query", "status": "in_progress", "details": "Classifying query..."}
-            
-            try:
-                # Invoke directly to get final result
-                classification_output = await self.classifier.chain.ainvoke({"query": user_query})
-            except Exception as class_err:
-                 yield {"type": "error", "step": "classify_query", "status": "failed", "message": f"Failed to get classification result: {class_err}"}
-                 self._close_db()
-                 return
+
+            local = self.lexical_classifier.classify(user_query)
+            if local["confidence"] >= self.local_confidence_threshold:
+                classification_output = {
+                    "workflow": local["workflow"],
+                    "reasoning": f"Classified locally from query wording (confidence {local['confidence']:.2f}).",
+                    "confidence": local["confidence"],
+                    "classifier": "local",
+                }
+            elif self.routing_generator is not None:
+                classification_output, generation_stream = await self._classify_and_generate(user_query)
+                if classification_output is not None:
+                    log_classification(user_query, classification_output["workflow"], source="llm")
+                    classification_output["local_prediction"] = local
+                else:
+                    yield {"type": "status", "step": "classify_query", "status": "in_progress", "details": "Combined classification failed; classifying separately..."}
+
+            if classification_output is None:
+                if self.speculation.enabled:
+                    # Query generation does not depend on the classification, so start it now
+                    # and keep only the branch the classifier picks
+                    speculation = self.speculation.start(user_query, self._new_workflow)
+                try:
+                    # Invoke directly to get final result
+                    classification_output = await self.classifier.chain.ainvoke({"query": user_query})
+                except Exception as class_err:
+                     yield {"type": "error", "step": "classify_query", "status": "failed", "message": f"Failed to get classification result: {class_err}"}
+                     await self._close_db()
+                     return
+                if isinstance(classification_output, dict) and classification_output.get("workflow"):
+                    classification_output["classifier"] = "llm"
+                    classification_output["local_prediction"] = local
+                    # Labelled examples for training/evaluating the local classifier
+                    log_classification(user_query, classification_output["workflow"], source="llm")
 
             if not isinstance(classification_output, dict) or "workflow" not in classification_output:
                  yield {"type": "error", "step": "classify_query", "status": "failed", "message": f"Classifier returned invalid final output: {classification_output}"}
-                 self._close_db()
+                 await self._close_db()
                  return
 
             # Yield final classification result as a status message
@@ -77,15 +238,19 @@ class Router:
             workflow_type = classification_output.get("workflow")
             yield {"type": "status", "step": "route_workflow", "status": "in_progress", "details": f"Routing to '{workflow_type}' workflow."}
 
-            if workflow_type == "insight":
-                insight_workflow = InsightWorkflow(db, self.schema_file)
+            speculative = self.speculation.resolve(speculation, workflow_type)
+            if speculation:
+                started = ", ".join(speculation)
+                details = f"Speculative generation ({started}) {'used' if speculative else 'cancelled'} for '{workflow_type}'."
+                yield {"type": "status", "step": "speculative_routing", "status": "completed", "details": details, "hit": speculative is not None, "speculation": self.speculation.stats()}
+            speculation = {}
+
+            # Reuse the workflow that started the speculative generation, so its schema snapshot matches
+            workflow = speculative.workflow if speculative else self._new_workflow(workflow_type)
+            if workflow is not None:
                 # The workflow's run method will now handle streaming its agents' logs
                 # and yielding its own status/final dicts
-                async for workflow_chunk in insight_workflow.run(user_query):
-                    yield workflow_chunk
-            elif workflow_type == "optimization":
-                optimization_workflow = OptimizationWorkflow(db, self.schema_file)
-                async for workflow_chunk in optimization_workflow.run(user_query):
+                async for workflow_chunk in workflow.run(user_query, query_generation=speculative.task if speculative else None, generation_stream=generation_stream):
                     yield workflow_chunk
             else:
                 yield {"type": "error", "step": "route_workflow", "message": f"Unknown workflow type: {workflow_type}"}
@@ -100,7 +265,12 @@ class Router:
              import traceback
              traceback.print_exc()
         finally:
-            self._close_db()
+            # Classification failed or the run was abandoned: drop any speculative generation
+            self.speculation.resolve(speculation, None)
+            if generation_stream is not None:
+                # Closes the combined call if the workflow did not read it to the end
+                await generation_stream.aclose()
+            await self._close_db()
             # Yield final status AFTER closing DB is safer if needed, but generally not required
             # yield {"type": "status", "step": "end_router", "status": "finished"}
 
@@ -109,9 +279,12 @@ if __name__ == '__main__':
     import os
     from dotenv import load_dotenv
 
+    from ..utils.neo4j_pool import init_async_driver, close_async_driver
+
     load_dotenv()
 
     async def main_test():
+        await init_async_driver()
         schema_f = os.path.join(os.path.dirname(__file__), '../../neo4j_schema.md')
         print(f"Schema path: {schema_f}")
 
@@ -149,5 +322,7 @@ if __name__ == '__main__':
             print(f"Optimization test failed: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            await close_async_driver()
 
     asyncio.run(main_test())
@@ -14,6 +14,7 @@ sys.path.insert(0, project_root)
 
 # Now import from the langchain_arch package
 from langchain_arch.chains.router import Router
+from langchain_arch.utils.neo4j_pool import init_async_driver, close_async_driver
 
 # Load environment variables from .env file at the project root
 dotenv_path = os.path.join(project_root, '.env')
@@ -28,6 +29,8 @@ async def main(query: str, schema_file: str):
     print(f"Using schema file: {schema_file}")
     print("--- Starting Workflow ---")
 
+    # Startup hook: open the shared Neo4j driver pool once for the process
+    await init_async_driver()
     router = Router(schema_file=schema_file)
 
     try:
@@ -47,6 +50,8 @@ async def main(query: str, schema_file: str):
         import traceback
         traceback.print_exc()
     finally:
+        # Shutdown hook: close the shared Neo4j driver pool
+        await close_async_driver()
         print("\n--- Workflow Complete ---")
 
 if __name__ == "__main__":
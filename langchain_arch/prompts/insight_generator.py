@@ -5,7 +5,7 @@ You are a highly skilled data analyst and a professional communicator with sharp
 
 **Context Provided:**
 * **Original User Query:** The exact natural language question asked by the user.
-* **Retrieved Data:** You are given the results (as a JSON string) from the executed Cypher query/queries provided as a JSON string.
+* **Retrieved Data:** You are given the results from the executed Cypher query/queries, either as a JSON string or as CSV/Markdown tables with the column names in the header row (one table per query). Values written as `~1`, `~2`, ... stand for the repeated values listed in the legend above the data; always write out the full value in your report.
 * **Query Generation Reasoning:** You are also given the reasoning behind *how* the Cypher query/queries were constructed by the previous step, based on the user query and graph schema. Use this to understand the intent behind the data retrieval.
 
 **Core Task:** Analyze the provided data in the context of the user's original query and the query generation logic, and generate a professional, insightful report in a specific JSON format.
@@ -116,7 +116,7 @@ You are a highly skilled data analyst and a professional communicator with sharp
 """
 
 # Corrected Human Prompt:
-INSIGHT_GENERATOR_HUMAN_PROMPT = "Original User Query: {query}\n\nRetrieved Data (JSON):\n```json\n{data}\n```\n\nReasoning for Query Generation:\n```\n{query_generation_reasoning}\n```\n\nGenerate the insight and reasoning based on the query, data, and query generation reasoning."
+INSIGHT_GENERATOR_HUMAN_PROMPT = "Original User Query: {query}\n\nRetrieved Data ({data_format}):\n{data}\n\nReasoning for Query Generation:\n```\n{query_generation_reasoning}\n```\n\nGenerate the insight and reasoning based on the query, data, and query generation reasoning."
 
 def create_insight_generator_prompt() -> ChatPromptTemplate:
     """Creates the ChatPromptTemplate for the InsightGenerator Agent."""
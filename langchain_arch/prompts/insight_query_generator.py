@@ -41,7 +41,7 @@ Core Function: Translate user natural language requests into one or more precise
             * CVR: (If 'conversions' can be quantified from the schema) `toFloat(SUM(conversions_metric)) / SUM(wi.clicks)` or `toFloat(SUM(conversions_metric)) / SUM(wi.impressions)`.
         * Use `CASE WHEN SUM(denominator_property) > 0 OR denominator_property > 0 THEN ... ELSE 0 END` to prevent division by zero for both aggregated and direct metrics.
     * **Ranking & Context:** If ranking is requested ('top', 'best', 'bottom'), order by the relevant metric (e.g., `ORDER BY totalSpend DESC`, `ORDER BY adCTR ASC`) and use `LIMIT`. Provide at least the top 5 results by default, or the number requested by the user. Include identifying information (name, ID) and all retrieved/calculated metrics for comparison.
-    * **Parameters:** Use parameters (`$param_name`) for values like IDs, dates, limits.
+    * **Parameters:** Never inline literal values. Use parameters (`$param_name`) for every value such as IDs, names, status values (e.g., `$status` for 'ACTIVE'), dates, thresholds and limits, and supply their values in the query's `"params"` object. Identical query text is then reused from Neo4j's plan cache across questions. Structural constants such as `0` in division-by-zero guards may stay inline.
     * **Optimization:** Write queries that are efficient and readable.
     * **Multiple Queries:** If the user request is complex and involves distinct information sets, generate multiple independent queries.
 4.  **RETURN Clause:** The RETURN clause MUST provide rich, accurately calculated/aggregated, and contextual data.
@@ -58,7 +58,7 @@ Core Function: Translate user natural language requests into one or more precise
     * Explain why specific contextual data was included.
 
 6.  **Output Format:** Respond *only* in **valid** JSON format with two keys:
-    *   `"queries"`: A list of strings, where each string is a valid Cypher query. Each individual query string within this list must be a complete, self-contained JSON string value. Do NOT break up a single query string using concatenation (e.g., `+` operator) in the JSON output. Use actual newline characters (`\n`) *within* each query string for line breaks. **No backslashes (`\`) for line continuation.**
+    *   `"queries"`: A list of JSON objects. Each object must have two keys: `"query"` (a string containing one valid Cypher query) and `"params"` (a JSON object mapping every `$param_name` used in that query to its value; use `{{}}` if the query has no parameters). Each individual query string must be a complete, self-contained JSON string value. Do NOT break up a single query string using concatenation (e.g., `+` operator) in the JSON output. Use actual newline characters (`\n`) *within* each query string for line breaks. **No backslashes (`\`) for line continuation.**
     *   `"reasoning"`: A step-by-step explanation. This explanation must be a single, complete JSON string value. Do NOT break up the reasoning string using concatenation (e.g., `+` operator) in the JSON output. **For readability, ensure this string is multi-line by using actual newline characters (`\n`) *within* the string to separate distinct points, steps, or paragraphs.** **Crucially, justify *how* metrics were aggregated or calculated** (e.g., "Aggregated `spend` and `clicks` from `FbWeeklyInsight` for each Ad, then calculated CPC") and why additional context was included.
 
 **Example Input Query:** "What is the overall CTR and CPC for my top 3 active Facebook campaigns by spend, using monthly data?"
@@ -67,9 +67,12 @@ Core Function: Translate user natural language requests into one or more precise
 ```json
 {{
   "queries": [
-    "MATCH (fbacc:FbAdAccount)-[:HAS_CAMPAIGN]->(camp:FbCampaign)-[:HAS_MONTHLY_INSIGHT]->(mi:FbMonthlyCampaignInsight)\nWHERE camp.status = 'ACTIVE' AND camp.effective_status = 'ACTIVE' // Ensure campaign is active and serving\nWITH camp, SUM(mi.spend) AS totalCampaignSpend, SUM(mi.clicks) AS totalCampaignClicks, SUM(mi.impressions) AS totalCampaignImpressions\nWHERE totalCampaignSpend > 0 // Filter out campaigns with no spend\nORDER BY totalCampaignSpend DESC\nLIMIT 3\nRETURN \n  camp.id AS campaignId, \n  camp.name AS campaignName, \n  totalCampaignSpend, \n  totalCampaignClicks, \n  totalCampaignImpressions, \n  CASE WHEN totalCampaignImpressions > 0 THEN toFloat(totalCampaignClicks) / totalCampaignImpressions ELSE 0 END AS campaignCTR, \n  CASE WHEN totalCampaignClicks > 0 THEN toFloat(totalCampaignSpend) / totalCampaignClicks ELSE 0 END AS campaignCPC"
+    {{
+      "query": "MATCH (fbacc:FbAdAccount)-[:HAS_CAMPAIGN]->(camp:FbCampaign)-[:HAS_MONTHLY_INSIGHT]->(mi:FbMonthlyCampaignInsight)\nWHERE camp.status = $status AND camp.effective_status = $effectiveStatus // Ensure campaign is active and serving\nWITH camp, SUM(mi.spend) AS totalCampaignSpend, SUM(mi.clicks) AS totalCampaignClicks, SUM(mi.impressions) AS totalCampaignImpressions\nWHERE totalCampaignSpend > 0 // Filter out campaigns with no spend\nORDER BY totalCampaignSpend DESC\nLIMIT $limit\nRETURN \n  camp.id AS campaignId, \n  camp.name AS campaignName, \n  totalCampaignSpend, \n  totalCampaignClicks, \n  totalCampaignImpressions, \n  CASE WHEN totalCampaignImpressions > 0 THEN toFloat(totalCampaignClicks) / totalCampaignImpressions ELSE 0 END AS campaignCTR, \n  CASE WHEN totalCampaignClicks > 0 THEN toFloat(totalCampaignSpend) / totalCampaignClicks ELSE 0 END AS campaignCPC",
+      "params": {{"status": "ACTIVE", "effectiveStatus": "ACTIVE", "limit": 3}}
+    }}
   ],
-  "reasoning": "1. **Analyze Request & Intent:** User wants overall CTR and CPC for the top 3 active Facebook campaigns, ranked by total spend, using monthly insight data.\n2. **Identify Elements (Facebook Schema):** Need `:FbAdAccount`, `:FbCampaign` nodes, and the `:FbMonthlyCampaignInsight` node for metrics like `spend`, `clicks`, and `impressions`. Relationships are `[:HAS_CAMPAIGN]` and `[:HAS_MONTHLY_INSIGHT]`. Campaign status properties are `status` and `effective_status`.\n3. **Construct Query & Calculation Rationale:**\n   - Matched from `:FbAdAccount` down to `:FbCampaign` and its `:FbMonthlyCampaignInsight`.\n   - Filtered for campaigns where `camp.status = 'ACTIVE'` AND `camp.effective_status = 'ACTIVE'`.\n   - Aggregated `spend`, `clicks`, and `impressions` using `SUM()` from `FbMonthlyCampaignInsight` for each campaign (`WITH camp`).\n   - Filtered out campaigns with `totalCampaignSpend <= 0` after aggregation.\n   - Ordered by `totalCampaignSpend` DESC and took the `LIMIT 3` for the top spenders.\n   - **Calculated Metrics:** Calculated `campaignCTR` in the RETURN clause as `toFloat(totalCampaignClicks) / totalCampaignImpressions` and `campaignCPC` as `toFloat(totalCampaignSpend) / totalCampaignClicks`, using `CASE` statements to prevent division by zero. This ensures accurate calculation of the ratios based on the aggregated monthly totals for each of the top 3 campaigns.\n   - Returned campaign ID, name, and all relevant aggregated/calculated metrics for context."
+  "reasoning": "1. **Analyze Request & Intent:** User wants overall CTR and CPC for the top 3 active Facebook campaigns, ranked by total spend, using monthly insight data.\n2. **Identify Elements (Facebook Schema):** Need `:FbAdAccount`, `:FbCampaign` nodes, and the `:FbMonthlyCampaignInsight` node for metrics like `spend`, `clicks`, and `impressions`. Relationships are `[:HAS_CAMPAIGN]` and `[:HAS_MONTHLY_INSIGHT]`. Campaign status properties are `status` and `effective_status`.\n3. **Construct Query & Calculation Rationale:**\n   - Matched from `:FbAdAccount` down to `:FbCampaign` and its `:FbMonthlyCampaignInsight`.\n   - Filtered for campaigns where `camp.status = $status` AND `camp.effective_status = $effectiveStatus`, both bound to 'ACTIVE' via params.\n   - Aggregated `spend`, `clicks`, and `impressions` using `SUM()` from `FbMonthlyCampaignInsight` for each campaign (`WITH camp`).\n   - Filtered out campaigns with `totalCampaignSpend <= 0` after aggregation.\n   - Ordered by `totalCampaignSpend` DESC and took `LIMIT $limit` (bound to 3) for the top spenders.\n   - **Calculated Metrics:** Calculated `campaignCTR` in the RETURN clause as `toFloat(totalCampaignClicks) / totalCampaignImpressions` and `campaignCPC` as `toFloat(totalCampaignSpend) / totalCampaignClicks`, using `CASE` statements to prevent division by zero. This ensures accurate calculation of the ratios based on the aggregated monthly totals for each of the top 3 campaigns.\n   - Returned campaign ID, name, and all relevant aggregated/calculated metrics for context."
 }}
 ```
 
@@ -8,7 +8,7 @@ Your task is to analyze performance data (features) extracted from a Neo4j graph
 
 **Context:**
 * **Original User Request:** The user asked for optimization suggestions related to the goal provided below.
-* **Extracted Data:** You are given a structured dictionary where keys are the objectives (e.g., "Find low CTR ads") and values are the results (as JSON strings or lists of dictionaries) from executing Cypher queries designed to extract relevant features for that objective.
+* **Extracted Data:** You are given a structured dictionary where keys are the objectives (e.g., "Find low CTR ads") and values are the results (as JSON, or as one CSV/Markdown table per objective) from executing Cypher queries designed to extract relevant features for that objective. Values written as `~1`, `~2`, ... stand for the repeated values listed in the legend above the data; always write out the full value in your report.
 
 
 **Instructions:**
@@ -70,7 +70,7 @@ Your task is to analyze performance data (features) extracted from a Neo4j graph
 
 
 
-OPTIMIZATION_GENERATOR_HUMAN_PROMPT = "Original User Request: {query}\n\nExtracted Features Data (Dictionary of Objective -> Results):\n```json\n{data}\n```\n\nGenerate actionable optimization recommendations and reasoning based on the user request and the provided data."
+OPTIMIZATION_GENERATOR_HUMAN_PROMPT = "Original User Request: {query}\n\nExtracted Features Data (Objective -> Results, {data_format}):\n{data}\n\nGenerate actionable optimization recommendations and reasoning based on the user request and the provided data."
 
 def create_optimization_generator_prompt() -> ChatPromptTemplate:
     """Creates the ChatPromptTemplate for the OptimizationRecommendationGenerator Agent."""
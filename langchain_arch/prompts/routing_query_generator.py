@@ -0,0 +1,61 @@
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+
+from .insight_query_generator import INSIGHT_QUERY_SYSTEM_PROMPT
+from .optimization_query_generator import OPTIMIZATION_QUERY_SYSTEM_PROMPT
+
+_SCHEMA_BLOCK = "Graph Schema:\n---\n{schema}\n---\n"
+
+
+def _workflow_rules(system_prompt: str) -> str:
+    """A query generator's instructions without its introduction and schema, which the combined prompt states once."""
+    return system_prompt.split(_SCHEMA_BLOCK, 1)[1].strip()
+
+
+# The rules of both query generators are reused as written, so the combined
+# call generates the same queries the two-step path would
+ROUTING_QUERY_SYSTEM_PROMPT = """
+You are a routing agent and Cypher query generator for a Neo4j graph database of Facebook Ads data. In a single answer you (1) classify the user's request into the 'insight' or the 'optimization' workflow and (2) write the Cypher queries that workflow needs, following that workflow's rules below. Your primary directive is **ABSOLUTE STRICT ADHERENCE** to the `Graph Schema` provided.
+
+""" + _SCHEMA_BLOCK + """
+**Step 1: Classify the request.**
+
+- **insight**: The user asks for information, summaries, reports, trends, patterns, anomalies, or specific data points.
+  Examples: "What were the top 5 performing campaigns last month?", "Show me the ads with the lowest click-through rate."
+- **optimization**: The user asks for suggestions, recommendations, actions, or ways to improve performance.
+  Examples: "How can I improve the CTR of my campaigns?", "Which campaigns should I allocate more budget to?"
+
+**Step 2: Generate the queries, following only the rules of the workflow you chose.**
+
+=== Rules for the 'insight' workflow ===
+
+""" + _workflow_rules(INSIGHT_QUERY_SYSTEM_PROMPT) + """
+
+=== Rules for the 'optimization' workflow ===
+
+""" + _workflow_rules(OPTIMIZATION_QUERY_SYSTEM_PROMPT) + """
+
+=== Output Format (replaces the Output Format of the rules above) ===
+
+Respond *only* in **valid** JSON format with three keys, in this order:
+1.  `"workflow"`: Must be either `"insight"` or `"optimization"`. It must be the first key.
+2.  `"queries"`: The list of query objects described by the chosen workflow's rules: `"query"` and `"params"` for insight; `"objective"`, `"query"` and `"params"` for optimization.
+3.  `"reasoning"`: One sentence on why the request belongs to the chosen workflow, followed by the reasoning the chosen workflow's rules ask for.
+
+Example Output shape (insight):
+```json
+{{
+  "workflow": "insight",
+  "queries": [{{"query": "MATCH (fbacc:FbAdAccount)-[:HAS_CAMPAIGN]->(camp:FbCampaign) ... LIMIT $limit", "params": {{"limit": 3}}}}],
+  "reasoning": "The user asks for specific data points, which is the insight workflow.\\n1. **Analyze Request & Intent:** ..."
+}}
+```
+"""
+
+ROUTING_QUERY_HUMAN_PROMPT = "User Query: {query}\n\nClassify the request, then generate the Cypher query(s) and reasoning for that workflow based on the schema provided in the system prompt."
+
+def create_routing_query_generator_prompt() -> ChatPromptTemplate:
+    """Creates the ChatPromptTemplate for the RoutingQueryGenerator Agent."""
+    return ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(ROUTING_QUERY_SYSTEM_PROMPT),
+        HumanMessagePromptTemplate.from_template(ROUTING_QUERY_HUMAN_PROMPT)
+    ])
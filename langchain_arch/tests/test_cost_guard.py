@@ -0,0 +1,37 @@
+import pytest
+
+from langchain_arch.utils.cost_guard import CypherCostGuard
+
+
+def _evaluate(query):
+    guard = CypherCostGuard(max_estimated_rows=1e9, max_output_rows=100, blocked_operators=[], blocked_operator_min_rows=1e9)
+    return guard.evaluate(query, {"operatorType": "ProduceResults@neo4j", "args": {"EstimatedRows": 5000}})
+
+
+@pytest.mark.parametrize("limit", ["10", "$limit", "toInteger($n)", "10 + $offset", "toInteger($n) // page size"])
+def test_trailing_limit_expression_is_kept(limit):
+    query = f"MATCH (c:FbCampaign) RETURN c.name ORDER BY c.name LIMIT {limit}"
+    verdict = _evaluate(query)
+
+    assert verdict["query"] == query
+    assert not verdict["rewritten"]
+
+
+def test_limit_in_subquery_or_string_is_not_trailing():
+    for query in (
+        "CALL { MATCH (c:FbCampaign) RETURN c LIMIT 5 } MATCH (c)-[:HAS_ADSET]->(s) RETURN s.name",
+        "MATCH (c:FbCampaign) WHERE c.name <> 'no LIMIT 5' RETURN c.limit",
+    ):
+        verdict = _evaluate(query)
+        assert verdict["rewritten"]
+        assert verdict["query"].endswith("\nLIMIT 100")
+
+
+def test_union_is_wrapped_instead_of_capping_its_last_branch():
+    query = "MATCH (c:FbCampaign) RETURN c.name AS name UNION MATCH (a:FbAd) RETURN a.name AS name LIMIT 10;"
+    verdict = _evaluate(query)
+
+    assert verdict["rewritten"]
+    assert verdict["query"] == (
+        "CALL {\nMATCH (c:FbCampaign) RETURN c.name AS name UNION MATCH (a:FbAd) RETURN a.name AS name LIMIT 10\n}\nRETURN *\nLIMIT 100"
+    )
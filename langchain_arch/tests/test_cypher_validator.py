@@ -0,0 +1,23 @@
+import os
+
+from langchain_arch.utils.cypher_validator import CypherValidator
+from langchain_arch.utils.schema_parser import parse_schema_markdown
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "neo4j_schema.md")
+
+
+def _validator() -> CypherValidator:
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        return CypherValidator(parse_schema_markdown(f.read()))
+
+
+def test_variable_length_hop_checks_only_relationship_types():
+    validator = _validator()
+    assert validator.validate("MATCH p=(a:FbAdAccount)-[:HAS_CAMPAIGN|HAS_ADSET*1..2]->(x) RETURN x") == []
+    errors = validator.validate("MATCH (a:FbAdAccount)-[:HAS_CAMPAIGN|HAS_ADSETS*1..2]->(x) RETURN x")
+    assert len(errors) == 1 and errors[0].startswith("Unknown relationship type :HAS_ADSETS.")
+
+
+def test_unlabelled_endpoint_is_rendered_as_empty_node():
+    errors = _validator().validate("MATCH (a:FbAdAccount)-[:HAS_ADSET]->(x) RETURN x")
+    assert errors and errors[0].startswith("No (:FbAdAccount)-[:HAS_ADSET]->() relationship")
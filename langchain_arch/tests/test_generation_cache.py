@@ -0,0 +1,34 @@
+import pytest
+
+from langchain_arch.utils.generation_cache import GenerationCache, MemoryGenerationBackend
+
+
+def _cache(question):
+    cache = GenerationCache(MemoryGenerationBackend(), similarity_threshold=0.8)
+    cache.store("insight", "v1", question, {"queries": [{"query": "MATCH ...", "params": {}}]})
+    return cache
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Show me the total spend of all active campaigns last week", "Show me the total spend of all paused campaigns last week"),
+    ("What is the total spend of my account since January", "What is the total spend of my account since February"),
+    ("How many clicks did the campaign Summer Sale get last month", "How many clicks did the campaign Winter Sale get last month"),
+    ("Top 5 campaigns by clicks", "Top 10 campaigns by clicks"),
+])
+def test_different_entity_status_or_period_is_not_similar(cached, asked):
+    assert _cache(cached).lookup("insight", "v1", asked) is None
+
+
+def test_synonyms_and_word_order_are_similar():
+    cache = _cache("Which running adverts had the biggest spending last week")
+    match = cache.lookup("insight", "v1", "Which active ads had the highest spend last week")
+
+    assert match is not None and match["match"] == "similar"
+
+
+def test_default_threshold_is_exact_only():
+    cache = GenerationCache(MemoryGenerationBackend())
+    cache.store("insight", "v1", "Which running adverts had the biggest spending", {"queries": []})
+
+    assert cache.lookup("insight", "v1", "Which active ads had the highest spend") is None
+    assert cache.lookup("insight", "v1", "which running adverts had the biggest spending?")["match"] == "exact"
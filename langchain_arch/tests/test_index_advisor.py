@@ -0,0 +1,30 @@
+import pytest
+
+from langchain_arch.utils.index_advisor import IndexAdvisor, extract_filtered_properties
+from langchain_arch.utils.schema_parser import parse_schema_markdown
+
+SCHEMA = """
+## Node Types & Properties
+### `:`FbCampaign``
+- name : String
+- status : String
+"""
+
+
+@pytest.mark.parametrize("operator", ["STARTS WITH", "ENDS WITH", "starts  with"])
+def test_text_operator_does_not_end_the_where_clause(operator):
+    query = f"MATCH (c:FbCampaign) WHERE c.name {operator} $x AND c.status = $s WITH c RETURN c"
+
+    assert extract_filtered_properties(query) == {
+        ("FbCampaign", "name", " ".join(operator.upper().split())),
+        ("FbCampaign", "status", "="),
+    }
+
+
+def test_ends_with_filters_get_a_text_index_and_starts_with_a_range_index():
+    advisor = IndexAdvisor(parse_schema_markdown(SCHEMA))
+    advisor.add_query("MATCH (c:FbCampaign) WHERE c.name ENDS WITH $suffix RETURN c")
+    advisor.add_query("MATCH (c:FbCampaign) WHERE c.status STARTS WITH $prefix RETURN c")
+    statements = {(item["property"], item["statement"].split(" INDEX")[0]) for item in advisor.recommend()}
+
+    assert statements == {("name", "CREATE TEXT"), ("status", "CREATE")}
@@ -0,0 +1,23 @@
+from langchain_arch.utils.json_stream import JsonFieldStreamer
+
+
+def _stream(chunks):
+    streamer = JsonFieldStreamer("insight")
+    return "".join(streamer.feed(chunk) for chunk in chunks), streamer
+
+
+def test_malformed_unicode_escape_is_shown_as_written():
+    text, streamer = _stream(['{"insight": "CTR \\uZZ', 'ZZ rose", "reasoning": "r"}'])
+    assert text == "CTR \\uZZZZ rose"
+    assert streamer.done
+
+
+def test_surrogate_pair_split_across_chunks():
+    text, _ = _stream(['{"insight": "up \\ud83d', '\\ude80 now"}'])
+    assert text == "up \U0001F680 now"
+
+
+def test_lone_surrogate_is_replaced():
+    text, streamer = _stream(['{"insight": "a \\ud83d and \\ude80 b"}'])
+    assert text == "a \ufffd and \ufffd b"
+    assert streamer.done
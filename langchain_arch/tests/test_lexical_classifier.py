@@ -0,0 +1,59 @@
+import json
+
+from langchain_arch.agents import lexical_classifier
+from langchain_arch.agents.lexical_classifier import LexicalClassifier, evaluate, get_confidence_threshold
+
+EXAMPLES = [
+    ("How can I improve the CTR of my campaigns?", "optimization"),
+    ("Which campaigns should I allocate more budget to?", "optimization"),
+    ("Suggest ways to reduce my cost per click", "optimization"),
+    ("What were the top 5 performing campaigns last month?", "insight"),
+    ("Show me the ads with the lowest click-through rate", "insight"),
+    ("How many impressions did we get last week?", "insight"),
+]
+
+
+def test_classify_uses_the_cue_words():
+    classifier = LexicalClassifier()
+
+    assert classifier.classify("How can I improve my campaigns?")["workflow"] == "optimization"
+    assert classifier.classify("Show me the total spend last week")["workflow"] == "insight"
+    assert 0.5 <= classifier.classify("campaigns")["confidence"] <= 1.0
+
+
+def test_train_fits_the_labelled_queries():
+    classifier = LexicalClassifier(weights={}, bias=0.0)
+    assert not classifier.trained
+    classifier.train(EXAMPLES, epochs=50)
+
+    assert classifier.trained
+    assert all(classifier.classify(query)["workflow"] == workflow for query, workflow in EXAMPLES)
+
+
+def test_evaluate_reports_agreement_per_threshold():
+    classifier = LexicalClassifier()
+    queries = [query for query, _ in EXAMPLES] + ["unlabelled question"]
+    reference = [workflow for _, workflow in EXAMPLES] + [None]
+    report = evaluate(classifier, queries, reference, thresholds=[0.5, 1.01])
+
+    assert report["labelled"] == len(EXAMPLES)
+    assert sum(report["confusion"].values()) == len(EXAMPLES)
+    assert report["by_threshold"][0] == {"threshold": 0.5, "coverage": 1.0, "agreement": report["agreement"]}
+    assert report["by_threshold"][1] == {"threshold": 1.01, "coverage": 0.0, "agreement": None}
+
+
+def test_threshold_defers_to_the_llm_until_a_model_is_trained(tmp_path, monkeypatch):
+    monkeypatch.delenv("LOCAL_CLASSIFIER_THRESHOLD", raising=False)
+    monkeypatch.setattr(lexical_classifier, "_classifier", LexicalClassifier())
+    assert get_confidence_threshold() > 1
+
+    path = tmp_path / "classifier.json"
+    trained = LexicalClassifier()
+    trained.train(EXAMPLES)
+    trained.save(str(path))
+    assert json.loads(path.read_text())["weights"]
+    monkeypatch.setattr(lexical_classifier, "_classifier", LexicalClassifier.load(str(path)))
+    assert get_confidence_threshold() == 0.85
+
+    monkeypatch.setenv("LOCAL_CLASSIFIER_THRESHOLD", "0.7")
+    assert get_confidence_threshold() == 0.7
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import Runnable
+
+from langchain_arch.utils.llm_hedging import HedgedRunnable, HedgePolicy
+
+
+class FakeStreamingModel(Runnable):
+    """Streams one planned answer per call: (seconds before the first chunk, chunks or an exception)."""
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.calls = 0
+        self.closed = []
+
+    def invoke(self, input, config=None, **kwargs):
+        raise NotImplementedError
+
+    async def astream(self, input, config=None, **kwargs):
+        call = self.calls
+        self.calls += 1
+        delay, answer = self.plans[call]
+        try:
+            await asyncio.sleep(delay)
+            if isinstance(answer, Exception):
+                raise answer
+            for text in answer:
+                yield AIMessageChunk(content=text)
+        finally:
+            self.closed.append(call)
+
+
+def _policy(budget=1.0):
+    # Ten 50 ms first tokens: the hedge delay is 50 ms
+    policy = HedgePolicy("test", percentile=0.5, budget=budget, min_samples=10, min_delay_ms=1)
+    for _ in range(10):
+        policy.record(50.0, hedged=False, hedge_won=False)
+    return policy
+
+
+def _stream(model, policy):
+    async def main():
+        return [chunk.content async for chunk in HedgedRunnable(model, policy).astream("question")]
+    return asyncio.run(main())
+
+
+def test_primary_answering_before_the_delay_is_not_hedged():
+    model = FakeStreamingModel([(0, ["pri", "mary"])])
+    policy = _policy()
+
+    assert _stream(model, policy) == ["pri", "mary"]
+    assert model.calls == 1
+    assert policy.stats()["hedged"] == 0
+
+
+def test_hedge_wins_and_the_slow_primary_is_cancelled():
+    model = FakeStreamingModel([(5, ["slow"]), (0, ["he", "dge"])])
+    policy = _policy()
+
+    assert _stream(model, policy) == ["he", "dge"]
+    assert model.calls == 2
+    assert sorted(model.closed) == [0, 1]
+    stats = policy.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_budget_refuses_a_duplicate():
+    model = FakeStreamingModel([(0.2, ["primary"])])
+    policy = _policy(budget=0.0)
+
+    assert _stream(model, policy) == ["primary"]
+    assert model.calls == 1
+    stats = policy.stats()
+    assert stats["hedged"] == 0 and stats["skipped_budget"] == 1
+
+
+def test_primary_error_before_the_delay_is_raised_without_a_hedge():
+    model = FakeStreamingModel([(0, RuntimeError("rate limited"))])
+    policy = _policy()
+
+    with pytest.raises(RuntimeError, match="rate limited"):
+        _stream(model, policy)
+    assert model.calls == 1
+    assert policy.stats()["hedged"] == 0
+
+
+def test_no_hedging_until_enough_latencies_are_known():
+    model = FakeStreamingModel([(0.1, ["primary"])])
+    policy = HedgePolicy("test", min_samples=10)
+
+    assert policy.delay() is None
+    assert _stream(model, policy) == ["primary"]
+    assert model.calls == 1
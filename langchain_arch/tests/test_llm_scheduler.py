@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from langchain_arch.utils import llm_scheduler
+from langchain_arch.utils.llm_scheduler import GovernedTransport, LLMCallContext, LLMScheduler, reset_call_context, set_call_context
+
+
+class FakeClock:
+    """Stands in for the scheduler's time module, so the rolling window can be advanced without waiting."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", clock)
+    return clock
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def _queue(scheduler, order, name, session_id="s", priority="batch", tokens=1):
+    """Starts an acquire() that records `name` in `order` once admitted, then finishes its request."""
+    async def acquire():
+        grant = await scheduler.acquire(tokens, session_id, priority)
+        order.append(name)
+        grant.release()
+    return asyncio.create_task(acquire())
+
+
+def test_requests_per_minute_window_rolls(clock):
+    async def main():
+        scheduler = LLMScheduler(requests_per_minute=2)
+        await scheduler.acquire(1)
+        clock.now += 30
+        await scheduler.acquire(1)
+        order = []
+        third = _queue(scheduler, order, "third")
+        await _settle()
+        assert order == [] and scheduler.stats()["waiting"] == 1
+        # The first request leaves the window 60 s after it was admitted
+        assert scheduler._timer.when() - asyncio.get_running_loop().time() == pytest.approx(30, abs=1)
+
+        clock.now += 30
+        scheduler._dispatch()
+        await third
+        assert order == ["third"] and scheduler.stats()["window_requests"] == 2
+    asyncio.run(main())
+
+
+def test_tokens_per_minute_budget(clock):
+    async def main():
+        scheduler = LLMScheduler(tokens_per_minute=1000)
+        await scheduler.acquire(600)
+        order = []
+        second = _queue(scheduler, order, "second", tokens=600)
+        await _settle()
+        assert order == []
+
+        clock.now += 60
+        scheduler._dispatch()
+        await second
+        assert order == ["second"] and scheduler.stats()["window_tokens"] == 600
+        # A request larger than the whole budget is capped to it rather than waiting forever
+        clock.now += 60
+        assert (await scheduler.acquire(5000)).tokens == 1000
+    asyncio.run(main())
+
+
+def test_priority_classes_then_sessions_take_turns(clock):
+    async def main():
+        scheduler = LLMScheduler(max_concurrent=1)
+        holding = await scheduler.acquire(1, "a", "interactive")
+        order = []
+        tasks = [
+            _queue(scheduler, order, "batch", "a", "batch"),
+            _queue(scheduler, order, "a1", "a", "interactive"),
+            _queue(scheduler, order, "a2", "a", "interactive"),
+            _queue(scheduler, order, "a3", "a", "interactive"),
+            _queue(scheduler, order, "b1", "b", "interactive"),
+            _queue(scheduler, order, "speculative", "b", "speculative"),
+        ]
+        await _settle()
+        holding.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ["a1", "b1", "a2", "a3", "speculative", "batch"]
+        stats = scheduler.stats()
+        assert stats["in_flight"] == 0
+        assert stats["priorities"]["interactive"] == {"admitted": 5, "queued": 4, "avg_wait_ms": 0.0}
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_is_skipped(clock):
+    async def main():
+        scheduler = LLMScheduler(max_concurrent=1)
+        holding = await scheduler.acquire(1)
+        order = []
+        cancelled = _queue(scheduler, order, "cancelled")
+        waiting = _queue(scheduler, order, "waiting")
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+
+        holding.release()
+        await waiting
+        assert cancelled.cancelled() and order == ["waiting"]
+        assert scheduler.stats()["in_flight"] == 0 and scheduler.stats()["waiting"] == 0
+    asyncio.run(main())
+
+
+class FakeBody(httpx.AsyncByteStream):
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield b'data: {"choices": []}\n\n'
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeTransport(httpx.AsyncBaseTransport):
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = FakeBody()
+
+    async def handle_async_request(self, request):
+        return httpx.Response(self.status_code, headers=self.headers, stream=self.body)
+
+
+def _request(content="hello"):
+    body = {"messages": [{"role": "user", "content": content}], "max_tokens": 100}
+    return httpx.Request("POST", "https://api.example.com/v1/chat/completions", content=json.dumps(body).encode())
+
+
+def test_streamed_body_holds_its_grant_until_closed(clock):
+    async def main():
+        scheduler = LLMScheduler(max_concurrent=1)
+        transport = GovernedTransport(FakeTransport(), scheduler)
+        token = set_call_context(LLMCallContext("s1", "interactive"))
+        try:
+            response = await transport.handle_async_request(_request("x" * 40))
+        finally:
+            reset_call_context(token)
+        assert scheduler.stats()["in_flight"] == 1
+        assert scheduler.stats()["priorities"]["interactive"]["admitted"] == 1
+        assert scheduler.stats()["window_tokens"] == 10 + 100
+
+        async for _ in response.stream:
+            pass
+        assert scheduler.stats()["in_flight"] == 0
+        # Closing after the body was read does not release a second time
+        await response.aclose()
+        assert scheduler.stats()["in_flight"] == 0
+    asyncio.run(main())
+
+
+def test_rate_limited_response_pauses_admission(clock):
+    async def main():
+        scheduler = LLMScheduler(requests_per_minute=100)
+        transport = GovernedTransport(FakeTransport(429, {"retry-after-ms": "2500"}), scheduler)
+        response = await transport.handle_async_request(_request())
+        await response.aclose()
+
+        assert scheduler.rate_limited == 1
+        assert scheduler._delay(1) == pytest.approx(2.5)
+    asyncio.run(main())
@@ -0,0 +1,19 @@
+from langchain_arch.utils.query_cache import QueryResultCache, normalize_cypher
+
+
+def test_comment_markers_inside_string_literals_are_kept():
+    a = "MATCH (w:Website {url: 'http://a.com'}) RETURN w"
+    b = "MATCH (w:Website {url: 'http://b.com'}) RETURN w"
+    assert normalize_cypher(a) == a
+    assert QueryResultCache.make_key(a, None) != QueryResultCache.make_key(b, None)
+
+
+def test_whitespace_inside_string_literals_is_kept():
+    a = "MATCH (c:FbCampaign) WHERE c.name = 'Summer  Sale' RETURN c"
+    b = "MATCH (c:FbCampaign) WHERE c.name = 'Summer Sale' RETURN c"
+    assert QueryResultCache.make_key(a, None) != QueryResultCache.make_key(b, None)
+
+
+def test_comments_and_whitespace_outside_literals_are_normalised():
+    query = "MATCH (c:FbCampaign) // campaigns\n  WHERE c.name = \"A // B\" /* note */\tRETURN c ;"
+    assert normalize_cypher(query) == 'MATCH (c:FbCampaign) WHERE c.name = "A // B" RETURN c'
@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_arch.utils.query_execution import run_generated_query
+from langchain_arch.utils.result_set import ResultSet
+
+
+class FakeQueryCache:
+    async def fetch_with_stats(self, neo4j_db, query, params, max_rows=None):
+        return ResultSet.from_records([{"name": "Summer Sale"}]), {"cache_hit": False, "wall_ms": 1.0}
+
+
+class FakeCostGuard:
+    def __init__(self, verdict):
+        self.verdict = verdict
+
+    async def check(self, neo4j_db, query, params):
+        return {"query": query, "rewritten": False, "reason": "", "max_operator_rows": 0, "operators": [], **self.verdict}
+
+
+class FakeWorkflow:
+    def __init__(self, cost_guard=None):
+        self.neo4j_db = None
+        self.query_cache = FakeQueryCache()
+        self.cost_guard = cost_guard
+        self.plan_cache_stats = self
+        self.recorded = []
+
+    def record(self, query):
+        self.recorded.append(query)
+
+
+def _run(workflow, item, **kwargs):
+    return asyncio.run(run_generated_query(workflow, item, 0, None, step="execute_opt_queries", label="Query 'o1'", **kwargs))
+
+
+def test_executed_query_returns_its_result_set_and_fields():
+    workflow = FakeWorkflow()
+    outcome = _run(workflow, {"query": "MATCH (c:FbCampaign) RETURN c.name", "params": {}}, fields={"objective": "o1"})
+
+    assert outcome["objective"] == "o1" and not outcome["rejected"]
+    assert len(outcome["result_set"]) == 1
+    [event] = outcome["events"]
+    assert event["step"] == "execute_opt_queries" and event["objective"] == "o1"
+    assert event["details"].startswith("Query 'o1' finished, 1 results.")
+    assert workflow.recorded == ["MATCH (c:FbCampaign) RETURN c.name"]
+
+
+def test_missing_parameter_and_cost_guard_reject_before_execution():
+    outcome = _run(FakeWorkflow(), {"query": "MATCH (c:FbCampaign) RETURN c LIMIT $limit", "params": {}})
+    assert outcome["rejected"] and outcome["result_set"] is None
+    assert "missing values for parameters: limit" in outcome["events"][0]["message"]
+
+    workflow = FakeWorkflow(FakeCostGuard({"allowed": False, "reason": "too many rows"}))
+    outcome = _run(workflow, {"query": "MATCH (n) RETURN n", "params": {}})
+    assert outcome["rejected"]
+    assert outcome["events"][0]["message"] == "Query 'o1' rejected by cost guard: too many rows"
+    assert workflow.recorded == []
+
+
+def test_rewritten_query_is_executed_and_reported():
+    rewritten = "MATCH (n:FbAd) RETURN n\nLIMIT 100"
+    workflow = FakeWorkflow(FakeCostGuard({"allowed": True, "rewritten": True, "query": rewritten, "reason": "appended LIMIT 100"}))
+    item = {"query": "MATCH (n:FbAd) RETURN n", "params": {}}
+    outcome = _run(workflow, item)
+
+    assert item["query"] == rewritten and workflow.recorded == [rewritten]
+    assert [e["status"] for e in outcome["events"]] == ["warning", "partial_complete"]
@@ -0,0 +1,32 @@
+from langchain_arch.utils.result_encoding import ResultEncoder
+from langchain_arch.utils.result_reduction import ResultReducer
+from langchain_arch.utils.result_set import ResultSet
+
+
+def _reducer():
+    return ResultReducer(ResultEncoder(), budget_tokens=1, top_k=50)
+
+
+def test_weekly_series_is_spread_over_every_week():
+    rs = ResultSet.from_records({"week": w, "spend": 1000.0 + w} for w in range(1, 400))
+    parts, summary = _reducer().summarize(rs, {"spend", "trend", "over", "time"}, 50)
+
+    assert summary["series"] == "week"
+    assert summary["metric"] == "spend"
+    kept = parts["50 of 399 rows evenly spaced over week"].column_values("week")
+    assert len(kept) == 50
+    assert kept[0] == 1 and kept[-1] == 399
+
+    note = ResultReducer._note({"result": "Result 1", **summary})
+    assert "evenly spaced over week" in note
+    assert "top" not in note
+
+
+def test_id_column_is_never_the_metric():
+    # Unsorted rows, so the metric falls back to the numeric column with the largest values
+    rs = ResultSet.from_records({"campaignId": 10_000_000 + (i * 37) % 120, "score": float(i % 7)} for i in range(120))
+    parts, summary = _reducer().summarize(rs, set(), 10)
+
+    assert summary["series"] is None
+    assert summary["metric"] == "score"
+    assert "top 10 of 120 rows by score" in parts
@@ -0,0 +1,20 @@
+from langchain_arch.utils.schema_parser import parse_schema_markdown
+from langchain_arch.utils.schema_service import render_schema_markdown
+
+
+def test_rendered_schema_parses_back_with_list_and_mixed_types():
+    node_properties = {"FbCampaign": {"id": "String", "tags": "List[String]", "budget": "Double|Long", "name": "String"}}
+    relationship_properties = {"HAS_ADSET": {"since": "Date", "weights": "List[Double]"}}
+    markdown = render_schema_markdown(
+        {"FbCampaign": 3, "FbAdSet": 7},
+        {**node_properties, "FbAdSet": {"id": "String"}},
+        [("FbCampaign", "HAS_ADSET", "FbAdSet")],
+        relationship_properties,
+    )
+    schema = parse_schema_markdown(markdown)
+
+    assert schema.node_properties["FbCampaign"] == node_properties["FbCampaign"]
+    assert schema.node_counts == {"FbAdSet": 7, "FbCampaign": 3}
+    [rel] = schema.relationships
+    assert (rel.start, rel.type, rel.end) == ("FbCampaign", "HAS_ADSET", "FbAdSet")
+    assert rel.properties == relationship_properties["HAS_ADSET"]
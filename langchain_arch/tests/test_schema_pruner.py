@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from langchain_arch.utils.schema_parser import parse_schema_markdown
+from langchain_arch.utils.schema_pruner import SchemaPruner
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "neo4j_schema.md")
+
+
+@pytest.fixture(scope="module")
+def pruner():
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        markdown = f.read()
+    return SchemaPruner(parse_schema_markdown(markdown), markdown)
+
+
+@pytest.mark.parametrize("question, insights", [
+    ("how are my ads doing", {"FbWeeklyInsight", "FbWeeklyCampaignInsight"}),
+    ("What were the top 5 performing campaigns last month?", {"FbMonthlyCampaignInsight"}),
+    ("Which are my best campaigns this week?", {"FbWeeklyInsight", "FbWeeklyCampaignInsight"}),
+])
+def test_performance_questions_keep_insight_labels(pruner, question, insights):
+    pruned = pruner.prune(question)
+
+    assert pruned.pruned
+    assert {label for label in pruned.labels if "Insight" in label} == insights
+
+
+def test_entity_property_question_does_not_add_insights(pruner):
+    pruned = pruner.prune("which campaigns have the highest daily budget")
+
+    assert pruned.labels == ["FbAdAccount", "FbCampaign"]
@@ -0,0 +1,57 @@
+import asyncio
+import re
+
+from langchain_arch.utils.schema_parser import parse_schema_markdown
+from langchain_arch.utils.schema_service import SchemaService
+
+# HAS_WEEKLY_INSIGHT goes from both FbAd and FbCampaign to FbWeeklyInsight
+RELATIONSHIPS = [("FbAd", "FbWeeklyInsight"), ("FbCampaign", "FbWeeklyInsight")]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.queries = []
+
+    async def stream(self, cypher_query, params=None, raise_errors=False):
+        self.queries.append(cypher_query)
+        rows = []
+        if "db.labels" in cypher_query:
+            rows = [{"label": label} for label in ("FbAd", "FbCampaign", "FbWeeklyInsight")]
+        elif "db.relationshipTypes" in cypher_query:
+            rows = [{"relationshipType": "HAS_WEEKLY_INSIGHT"}]
+        elif "nodeTypeProperties" in cypher_query:
+            rows = [{"nodeLabels": ["FbAd"], "propertyName": "id", "propertyTypes": ["String"]}]
+        elif "relTypeProperties" in cypher_query:
+            rows = [{"relType": ":`HAS_WEEKLY_INSIGHT`", "propertyName": None, "propertyTypes": None}]
+        elif "count(n)" in cypher_query:
+            rows = [{"count": 3}]
+        elif "count(*)" in cypher_query:
+            start = re.search(r"MATCH \(:`(\w+)`\)-", cypher_query)
+            end = re.search(r"->\(:`(\w+)`\)", cypher_query)
+            count = sum(1 for s, e in RELATIONSHIPS if (start and s == start.group(1)) or (end and e == end.group(1)))
+            rows = [{"count": count}]
+        elif "DISTINCT" in cypher_query:
+            rows = [{"start_labels": [s], "end_labels": [e]} for s, e in RELATIONSHIPS]
+        for row in rows:
+            yield row
+
+
+def _patterns(service):
+    db = FakeDatabase()
+    snapshot = asyncio.run(service.introspect(db))
+    schema = parse_schema_markdown(snapshot.markdown)
+    return {(rel.start, rel.type, rel.end) for rel in schema.relationships}, db.queries
+
+
+def test_patterns_come_from_the_count_store_by_default():
+    patterns, queries = _patterns(SchemaService())
+
+    assert patterns == {(s, "HAS_WEEKLY_INSIGHT", e) for s, e in RELATIONSHIPS}
+    assert not any("DISTINCT" in q for q in queries)
+
+
+def test_exact_patterns_scan_relationships():
+    patterns, queries = _patterns(SchemaService(exact_patterns=True))
+
+    assert patterns == {(s, "HAS_WEEKLY_INSIGHT", e) for s, e in RELATIONSHIPS}
+    assert any("DISTINCT" in q for q in queries)
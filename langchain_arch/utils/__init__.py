@@ -1,9 +1,109 @@
-from .neo4j_utils import Neo4jDatabase
+from .neo4j_utils import Neo4jDatabase, AsyncNeo4jDatabase
+from .neo4j_pool import (
+    init_driver,
+    get_driver,
+    close_driver,
+    init_async_driver,
+    get_async_driver,
+    close_async_driver,
+)
+from .result_set import ResultSet, ResultSetBuilder, serialize_results
+from .query_cache import QueryResultCache, get_query_cache, invalidate_query_cache
+from .cost_guard import CypherCostGuard, get_cost_guard
+from .cypher_params import normalize_generated_queries, missing_parameters, PlanCacheStats, get_plan_cache_stats
+from .schema_parser import GraphSchema, RelationshipType, parse_schema_markdown
+from .query_log import log_executed_query, read_query_log
+from .index_advisor import IndexAdvisor
+from .query_telemetry import RequestTimer, execution_stats
+from .schema_service import SchemaService, SchemaSnapshot, get_schema_service
+from .schema_pruner import SchemaPruner, PrunedSchema, prune_schema
+from .cypher_validator import CypherValidator
+from .speculation import SpeculativeRouting, get_speculative_routing
+from .llm_pool import get_llm, get_fallback_llm, get_agent_settings, load_routing_config, get_response_format, close_llm_clients
+from .llm_usage import LLMUsageStats, get_llm_usage
+from .llm_scheduler import LLMScheduler, LLMCallContext, GovernedTransport, get_llm_scheduler
+from .llm_hedging import HedgePolicy, HedgedRunnable, get_hedge_policy, hedging_stats
+from .json_stream import JsonFieldStreamer
+from .query_pipeline import StreamedQueryDispatcher
+from .query_execution import run_generated_query
+from .result_encoding import ResultEncoder, get_result_encoder, measure_encodings
+from .result_reduction import ResultReducer, get_result_reducer
+from .json_repair import RepairingJsonOutputParser, OutputValidationError, repair_json, schema_errors, get_parse_stats
+from .generation_cache import GenerationCache, MemoryGenerationBackend, SQLiteGenerationBackend, get_generation_cache
 # Remove imports from deleted streaming.py
 # from .streaming import AsyncStreamCallbackHandler, generate_stream
 
 __all__ = [
     "Neo4jDatabase",
+    "AsyncNeo4jDatabase",
+    "init_driver",
+    "get_driver",
+    "close_driver",
+    "init_async_driver",
+    "get_async_driver",
+    "close_async_driver",
+    "ResultSet",
+    "ResultSetBuilder",
+    "serialize_results",
+    "QueryResultCache",
+    "get_query_cache",
+    "invalidate_query_cache",
+    "CypherCostGuard",
+    "get_cost_guard",
+    "normalize_generated_queries",
+    "missing_parameters",
+    "PlanCacheStats",
+    "get_plan_cache_stats",
+    "GraphSchema",
+    "RelationshipType",
+    "parse_schema_markdown",
+    "log_executed_query",
+    "read_query_log",
+    "IndexAdvisor",
+    "RequestTimer",
+    "execution_stats",
+    "SchemaService",
+    "SchemaSnapshot",
+    "get_schema_service",
+    "SchemaPruner",
+    "PrunedSchema",
+    "prune_schema",
+    "CypherValidator",
+    "SpeculativeRouting",
+    "get_speculative_routing",
+    "get_llm",
+    "get_fallback_llm",
+    "get_agent_settings",
+    "load_routing_config",
+    "get_response_format",
+    "close_llm_clients",
+    "LLMUsageStats",
+    "get_llm_usage",
+    "LLMScheduler",
+    "LLMCallContext",
+    "GovernedTransport",
+    "get_llm_scheduler",
+    "HedgePolicy",
+    "HedgedRunnable",
+    "get_hedge_policy",
+    "hedging_stats",
+    "GenerationCache",
+    "MemoryGenerationBackend",
+    "SQLiteGenerationBackend",
+    "get_generation_cache",
+    "JsonFieldStreamer",
+    "StreamedQueryDispatcher",
+    "run_generated_query",
+    "ResultEncoder",
+    "get_result_encoder",
+    "measure_encodings",
+    "ResultReducer",
+    "get_result_reducer",
+    "RepairingJsonOutputParser",
+    "OutputValidationError",
+    "repair_json",
+    "schema_errors",
+    "get_parse_stats",
     # Remove exports from deleted streaming.py
     # "AsyncStreamCallbackHandler",
     # "generate_stream",
@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from .neo4j_utils import MAX_RESULT_ROWS
+from .query_cache import normalize_cypher
+
+# Load environment variables from .env file
+load_dotenv()
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# A LIMIT with any expression (toInteger($n), 10 + $offset, ...) and no later clause or subquery end
+_TRAILING_LIMIT = re.compile(
+    r"(?<![\w.$`])LIMIT\b"
+    r"(?:(?!(?<![\w.$`])(?:RETURN|WITH|MATCH|OPTIONAL|UNWIND|CALL|UNION|WHERE|ORDER|SKIP|LIMIT)\b)[^{}])*$",
+    re.IGNORECASE,
+)
+_UNION = re.compile(r"\bUNION\b", re.IGNORECASE)
+
+
+def _operator_name(plan: Dict[str, Any]) -> str:
+    # Operator types may carry a runtime suffix, e.g. "AllNodesScan@neo4j"
+    return str(plan.get("operatorType", "")).split("@")[0]
+
+
+def _estimated_rows(plan: Dict[str, Any]) -> float:
+    return float(plan.get("args", {}).get("EstimatedRows", 0) or 0)
+
+
+def _walk(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("children", []) or []:
+        yield from _walk(child)
+
+
+class CypherCostGuard:
+    """
+    Pre-execution check for LLM-generated Cypher based on its EXPLAIN plan.
+
+    - Rejects plans where any operator is estimated to produce more than
+      max_estimated_rows rows (e.g. a cartesian product over insight nodes).
+    - Rejects blocked operators (default CartesianProduct, AllNodesScan) once
+      they are estimated to touch at least blocked_operator_min_rows rows.
+    - Rewrites queries whose final output is estimated above max_output_rows and
+      have no trailing LIMIT by appending one, so the server can stop early.
+      A UNION is wrapped as CALL { ... } RETURN * LIMIT n, since a LIMIT
+      appended to it would cap only its last branch.
+
+    Verdicts are memoised per normalised query text, since EXPLAIN plans for the
+    same text rarely change between messages.
+    """
+    def __init__(
+        self,
+        max_estimated_rows: float,
+        max_output_rows: int,
+        blocked_operators: List[str],
+        blocked_operator_min_rows: float,
+        cache_size: int = 512,
+    ):
+        self.max_estimated_rows = max_estimated_rows
+        self.max_output_rows = max_output_rows
+        self.blocked_operators = set(blocked_operators)
+        self.blocked_operator_min_rows = blocked_operator_min_rows
+        self._verdicts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def evaluate(self, cypher_query: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Judges a query from its EXPLAIN plan.
+
+        Returns:
+            A verdict dict: {"allowed", "query" (possibly rewritten), "rewritten",
+            "reason", "estimated_rows" (top operator), "max_operator_rows", "operators"}.
+        """
+        operators = list(_walk(plan)) if plan else []
+        output_rows = _estimated_rows(plan) if plan else 0.0
+        max_rows = max((_estimated_rows(op) for op in operators), default=0.0)
+        verdict = {
+            "allowed": True,
+            "query": cypher_query,
+            "rewritten": False,
+            "reason": "",
+            "estimated_rows": output_rows,
+            "max_operator_rows": max_rows,
+            "operators": sorted({_operator_name(op) for op in operators}),
+        }
+
+        for op in operators:
+            name = _operator_name(op)
+            if name in self.blocked_operators and _estimated_rows(op) >= self.blocked_operator_min_rows:
+                verdict["allowed"] = False
+                verdict["reason"] = (
+                    f"Query plan uses {name} over an estimated {_estimated_rows(op):,.0f} rows. "
+                    "Anchor the pattern on labelled nodes connected from :FbAdAccount."
+                )
+                return verdict
+
+        if max_rows > self.max_estimated_rows:
+            verdict["allowed"] = False
+            verdict["reason"] = (
+                f"Estimated {max_rows:,.0f} intermediate rows exceeds the cost threshold "
+                f"of {self.max_estimated_rows:,.0f}."
+            )
+            return verdict
+
+        # Literals are blanked so a keyword inside a string is not taken for a clause
+        clauses = _STRING_LITERAL.sub("''", normalize_cypher(cypher_query))
+        if self.max_output_rows and output_rows > self.max_output_rows:
+            body = cypher_query.rstrip().rstrip(";")
+            if _UNION.search(clauses):
+                # A LIMIT appended to a union caps only its last branch
+                verdict["query"] = f"CALL {{\n{body}\n}}\nRETURN *\nLIMIT {self.max_output_rows}"
+                action = f"wrapped the union in CALL {{ ... }} RETURN * LIMIT {self.max_output_rows}"
+            elif not _TRAILING_LIMIT.search(clauses):
+                verdict["query"] = f"{body}\nLIMIT {self.max_output_rows}"
+                action = f"appended LIMIT {self.max_output_rows}"
+            if verdict["query"] != cypher_query:
+                verdict["rewritten"] = True
+                verdict["reason"] = f"Estimated {output_rows:,.0f} output rows; {action}."
+        return verdict
+
+    async def check(self, neo4j_db, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Runs EXPLAIN through neo4j_db and evaluates the plan, using memoised verdicts when available.
+        Planning errors (syntax, unknown functions) are raised to the caller.
+        """
+        key = normalize_cypher(cypher_query)
+        with self._lock:
+            cached = self._verdicts.get(key)
+            if cached is not None:
+                self._verdicts.move_to_end(key)
+                return cached
+        plan = await neo4j_db.explain(cypher_query, params)
+        verdict = self.evaluate(cypher_query, plan)
+        with self._lock:
+            self._verdicts[key] = verdict
+            while len(self._verdicts) > self._cache_size:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+
+_cost_guard: Optional[CypherCostGuard] = None
+
+
+def get_cost_guard() -> Optional[CypherCostGuard]:
+    """
+    Returns the process-wide guard, or None when CYPHER_COST_GUARD is disabled. Configured from:
+    CYPHER_MAX_ESTIMATED_ROWS (default 5,000,000), CYPHER_MAX_OUTPUT_ROWS (default NEO4J_MAX_RESULT_ROWS),
+    CYPHER_BLOCKED_OPERATORS (default "CartesianProduct,AllNodesScan"),
+    CYPHER_BLOCKED_OPERATOR_MIN_ROWS (default 1000).
+    """
+    global _cost_guard
+    if os.getenv("CYPHER_COST_GUARD", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _cost_guard is None:
+        _cost_guard = CypherCostGuard(
+            max_estimated_rows=float(os.getenv("CYPHER_MAX_ESTIMATED_ROWS", "5000000")),
+            max_output_rows=int(os.getenv("CYPHER_MAX_OUTPUT_ROWS", str(MAX_RESULT_ROWS))),
+            blocked_operators=[
+                op.strip() for op in os.getenv("CYPHER_BLOCKED_OPERATORS", "CartesianProduct,AllNodesScan").split(",") if op.strip()
+            ],
+            blocked_operator_min_rows=float(os.getenv("CYPHER_BLOCKED_OPERATOR_MIN_ROWS", "1000")),
+        )
+    return _cost_guard
@@ -0,0 +1,95 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# Matches $name and $`quoted name` placeholders
+_PARAM_PLACEHOLDER = re.compile(r"\$(?:`([^`]+)`|(\w+))")
+# String literals are skipped so a '$' inside quotes is not taken for a placeholder
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+
+
+def normalize_generated_queries(items: Any) -> List[Dict[str, Any]]:
+    """
+    Normalises query generator output to a list of {"query", "params", ...} dicts.
+
+    Accepts the current contract (objects with "query" and "params", plus
+    "objective" for optimization queries) and the legacy one (plain query
+    strings). Items without a query string are dropped; a missing or
+    non-object "params" becomes {}.
+    """
+    normalized = []
+    for item in items or []:
+        if isinstance(item, str):
+            normalized.append({"query": item, "params": {}})
+        elif isinstance(item, dict) and isinstance(item.get("query"), str) and item["query"].strip():
+            entry = dict(item)
+            entry["params"] = item["params"] if isinstance(item.get("params"), dict) else {}
+            normalized.append(entry)
+    return normalized
+
+
+def find_parameters(cypher_query: str) -> List[str]:
+    """Returns the distinct $parameter names referenced by a query, in order of appearance."""
+    text = _STRING_LITERAL.sub("''", cypher_query)
+    names = []
+    for quoted, plain in _PARAM_PLACEHOLDER.findall(text):
+        name = quoted or plain
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def missing_parameters(cypher_query: str, params: Optional[Dict[str, Any]]) -> List[str]:
+    """Returns placeholders used by the query that have no value in params."""
+    params = params or {}
+    return [name for name in find_parameters(cypher_query) if name not in params]
+
+
+class PlanCacheStats:
+    """
+    Estimates Neo4j plan-cache reuse from the client side.
+
+    Neo4j caches execution plans by query text, so a query whose exact text
+    was already sent recently should be served from the plan cache. This tracks
+    a bounded set of recently executed texts and counts repeats; it is an
+    approximation (the server cache is shared across processes and may evict).
+    """
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, cypher_query: str) -> bool:
+        """Records an execution; returns True if the same text was executed recently."""
+        key = cypher_query.strip()
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                self.hits += 1
+                return True
+            self._seen[key] = None
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            self.misses += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "distinct_queries": len(self._seen),
+            }
+
+
+_plan_cache_stats = PlanCacheStats()
+
+
+def get_plan_cache_stats() -> PlanCacheStats:
+    """Returns the process-wide plan-cache reuse tracker."""
+    return _plan_cache_stats
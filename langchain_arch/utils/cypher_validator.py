@@ -0,0 +1,156 @@
+import os
+import re
+import difflib
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from .schema_parser import GraphSchema
+
+# Load environment variables from .env file
+load_dotenv()
+
+_LINE_COMMENT = re.compile(r"//[^\n]*")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+
+_NODE = r"\(\s*(\w*)\s*((?::\s*`?\w+`?\s*)*)(\{[^{}]*\})?\s*\)"
+_REL = r"(<)?-\s*(?:\[\s*(\w*)\s*((?::\s*`?\w+`?(?:\s*\|\s*:?\s*`?\w+`?)*)?)\s*(\*[\d.\s]*)?(\{[^{}]*\})?\s*\])?\s*-(>)?"
+_NODE_PATTERN = re.compile(_NODE)
+# One hop: node, relationship, and the next node as lookahead so chains overlap
+_HOP_PATTERN = re.compile(_NODE + r"\s*" + _REL + r"\s*(?=" + _NODE + ")")
+_LABEL_NAME = re.compile(r"`?(\w+)`?")
+_MAP_KEY = re.compile(r"(\w+)\s*:")
+# var.prop, excluding $param.x, map.key.key chains and numbers such as 1.5
+_PROPERTY_ACCESS = re.compile(r"(?<![\w$.`])([A-Za-z_]\w*)\.([A-Za-z_]\w*)")
+
+
+def _strip(cypher_query: str) -> str:
+    text = _BLOCK_COMMENT.sub(" ", cypher_query)
+    text = _LINE_COMMENT.sub(" ", text)
+    return _STRING_LITERAL.sub("''", text)
+
+
+def _names(spec: str) -> List[str]:
+    return _LABEL_NAME.findall(spec or "")
+
+
+def _suggest(name: str, candidates) -> str:
+    close = difflib.get_close_matches(name, list(candidates), n=1, cutoff=0.6)
+    return f" Did you mean '{close[0]}'?" if close else ""
+
+
+class CypherValidator:
+    """
+    Static check of generated Cypher against the parsed schema, without a database round trip.
+
+    Verifies node labels, relationship types, relationship direction between
+    labelled endpoints of single hops, and properties read from variables bound to a label
+    (or relationship type). Variables it cannot resolve (WITH aliases, UNWIND
+    items, maps) are skipped, so it only reports definite mismatches.
+    """
+    def __init__(self, schema: GraphSchema):
+        self.schema = schema
+        self.labels: Set[str] = set(schema.node_properties) | set(schema.node_counts)
+        self.rel_types: Set[str] = {rel.type for rel in schema.relationships}
+        self.patterns: Set[Tuple[str, str, str]] = {(rel.start, rel.type, rel.end) for rel in schema.relationships}
+        self.rel_properties: Dict[str, Set[str]] = {}
+        for rel in schema.relationships:
+            self.rel_properties.setdefault(rel.type, set()).update(rel.properties)
+
+    def validate(self, cypher_query: str) -> List[str]:
+        """Returns a list of precise error messages; empty when the query fits the schema."""
+        text = _strip(cypher_query)
+        errors: List[str] = []
+        node_vars: Dict[str, Set[str]] = {}
+        rel_vars: Dict[str, Set[str]] = {}
+
+        for var, label_spec, prop_map in _NODE_PATTERN.findall(text):
+            labels = _names(label_spec)
+            for label in labels:
+                if label not in self.labels:
+                    errors.append(f"Unknown node label :{label}.{_suggest(label, self.labels)}")
+            known = {label for label in labels if label in self.labels}
+            if var and known:
+                node_vars.setdefault(var, set()).update(known)
+            for key in _MAP_KEY.findall(prop_map or ""):
+                self._check_node_property(known, key, errors, var or "(anonymous)")
+
+        for match in _HOP_PATTERN.finditer(text):
+            (left_var, left_spec, _, arrow_in, rel_var, rel_spec, var_length, rel_map, arrow_out,
+             right_var, right_spec, _) = match.groups()
+            rel_types = _names(rel_spec)
+            for rel_type in rel_types:
+                if rel_type not in self.rel_types:
+                    errors.append(f"Unknown relationship type :{rel_type}.{_suggest(rel_type, self.rel_types)}")
+            known_types = [t for t in rel_types if t in self.rel_types]
+            if rel_var and known_types:
+                rel_vars.setdefault(rel_var, set()).update(known_types)
+            for key in _MAP_KEY.findall(rel_map or ""):
+                self._check_rel_property(known_types, key, errors, rel_var or "(anonymous)")
+            # A variable-length hop's endpoints are those of the whole path, not of each
+            # relationship in it, so only its types are checked
+            if not known_types or (arrow_in and arrow_out) or var_length:
+                continue
+            left = set(_names(left_spec)) or node_vars.get(left_var, set())
+            right = set(_names(right_spec)) or node_vars.get(right_var, set())
+            start, end = (right, left) if arrow_in else (left, right)
+            directed = bool(arrow_in or arrow_out)
+            self._check_direction(start, known_types, end, directed, errors)
+
+        for var, prop in _PROPERTY_ACCESS.findall(text):
+            if var in node_vars:
+                self._check_node_property(node_vars[var], prop, errors, var)
+            elif var in rel_vars:
+                self._check_rel_property(rel_vars[var], prop, errors, var)
+
+        # Keep the first occurrence of each message
+        return list(dict.fromkeys(errors))
+
+    def _check_node_property(self, labels: Set[str], prop: str, errors: List[str], var: str) -> None:
+        if not labels:
+            return
+        available = set().union(*(self.schema.node_properties.get(label, {}).keys() for label in labels))
+        if prop not in available:
+            owner = "/".join(sorted(labels))
+            errors.append(f"Property '{prop}' does not exist on :{owner} (variable '{var}').{_suggest(prop, available)}")
+
+    def _check_rel_property(self, rel_types: List[str], prop: str, errors: List[str], var: str) -> None:
+        if not rel_types:
+            return
+        available = set().union(*(self.rel_properties.get(t, set()) for t in rel_types))
+        if prop not in available:
+            errors.append(f"Property '{prop}' does not exist on relationship :{'|'.join(rel_types)} (variable '{var}').")
+
+    def _check_direction(self, start: Set[str], rel_types: List[str], end: Set[str], directed: bool, errors: List[str]) -> None:
+        starts = start & self.labels
+        ends = end & self.labels
+        for rel_type in rel_types:
+            candidates = [(s, rel_type, e) for s in (starts or [None]) for e in (ends or [None])]
+
+            def exists(s: Optional[str], e: Optional[str]) -> bool:
+                return any(
+                    p[1] == rel_type and (s is None or p[0] == s) and (e is None or p[2] == e)
+                    for p in self.patterns
+                )
+
+            if any(exists(s, e) or (not directed and exists(e, s)) for s, _, e in candidates):
+                continue
+            s_name = f":{'/'.join(sorted(starts))}" if starts else ""
+            e_name = f":{'/'.join(sorted(ends))}" if ends else ""
+            if directed and any(exists(e, s) for s, _, e in candidates):
+                errors.append(
+                    f"Relationship direction is reversed: ({s_name})-[:{rel_type}]->({e_name}) does not exist, "
+                    f"but ({e_name})-[:{rel_type}]->({s_name}) does."
+                )
+            else:
+                valid = sorted(f"(:{p[0]})-[:{p[1]}]->(:{p[2]})" for p in self.patterns if p[1] == rel_type)
+                errors.append(
+                    f"No ({s_name})-[:{rel_type}]->({e_name}) relationship in the schema. "
+                    f"Valid :{rel_type} patterns: {', '.join(valid)}."
+                )
+
+
+def is_validation_enabled() -> bool:
+    """CYPHER_VALIDATION (default true) switches the static validator on or off."""
+    return os.getenv("CYPHER_VALIDATION", "true").lower() in ("1", "true", "yes")
@@ -0,0 +1,323 @@
+import os
+import re
+import sys
+import copy
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?%?")
+# Words that do not change which Cypher answers a question
+_STOPWORDS = {
+    "a", "an", "the", "me", "my", "our", "we", "i", "you", "your", "please", "can", "could", "would",
+    "will", "tell", "show", "give", "list", "display", "find", "get", "what", "which", "are", "is",
+    "was", "were", "do", "does", "did", "of", "for", "in", "on", "to", "and", "with", "by", "there",
+    "that", "this", "these", "those", "all", "some", "any", "about", "us", "let", "know", "want", "like",
+}
+# Interchangeable words, folded to one spelling when questions are compared for a similar match
+_SYNONYMS = {
+    "ads": "ad", "advert": "ad", "advertisement": "ad", "spending": "spend", "spent": "spend",
+    "performing": "performance", "perform": "performance", "doing": "performance",
+    "biggest": "highest", "largest": "highest", "greatest": "highest", "smallest": "lowest",
+    "currently": "current", "running": "active", "stopped": "paused",
+    # Filler that no query depends on
+    "just": "", "also": "", "really": "", "kindly": "",
+}
+
+
+def _fold(token: str) -> str:
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def question_tokens(question: str) -> List[str]:
+    """Lowercased, plural-folded words of a question without filler words."""
+    return [_fold(t) for t in _WORD.findall(question.lower()) if t not in _STOPWORDS]
+
+
+def normalize_question(question: str) -> str:
+    """The exact-match cache key text: normalised tokens in question order."""
+    return " ".join(question_tokens(question))
+
+
+def shingles(tokens: List[str]) -> Set[str]:
+    """Word unigrams and bigrams; bigrams keep some word order in the comparison."""
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _comparable(tokens: Iterable[str]) -> List[str]:
+    """Tokens with synonyms folded to one spelling and filler words such as "just" dropped."""
+    return [t for t in (_SYNONYMS.get(t, t) for t in tokens) if t]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MemoryGenerationBackend:
+    """In-process LRU of generation entries."""
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, str, str], entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Tuple[str, str, str]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def candidates(self, namespace: str, schema_version: str) -> List[Tuple[Tuple[str, str, str], Dict[str, Any]]]:
+        with self._lock:
+            return [(key, entry) for key, entry in self._entries.items() if key[0] == namespace and key[1] == schema_version]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteGenerationBackend:
+    """
+    Generation entries in a SQLite file, so they survive restarts and can be
+    shared by processes on one host. Least recently used rows are evicted.
+    """
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " namespace TEXT NOT NULL, schema_version TEXT NOT NULL, normalized TEXT NOT NULL,"
+            " entry TEXT NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (namespace, schema_version, normalized))"
+        )
+        self._conn.commit()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entry FROM generations WHERE namespace = ? AND schema_version = ? AND normalized = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE generations SET last_used = ? WHERE namespace = ? AND schema_version = ? AND normalized = ?",
+                (time.time(), *key),
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: Tuple[str, str, str], entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (namespace, schema_version, normalized, entry, last_used) VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(entry, default=str), time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM generations WHERE rowid NOT IN (SELECT rowid FROM generations ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key: Tuple[str, str, str]) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM generations WHERE namespace = ? AND schema_version = ? AND normalized = ?", key)
+            self._conn.commit()
+
+    def candidates(self, namespace: str, schema_version: str) -> List[Tuple[Tuple[str, str, str], Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT normalized, entry FROM generations WHERE namespace = ? AND schema_version = ?",
+                (namespace, schema_version),
+            ).fetchall()
+        return [((namespace, schema_version, normalized), json.loads(entry)) for normalized, entry in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+
+class GenerationCache:
+    """
+    Memoises query generator output (queries, params and reasoning) per question.
+
+    Keys are (workflow, schema version, normalised question), so a new schema
+    snapshot never reuses queries written against the old one. A question
+    without an exact match is compared with the stored questions for the same
+    workflow and schema version by Jaccard similarity of word shingles; a
+    stored entry is reused when the similarity reaches the threshold and every
+    word that differs between the two questions is a known synonym or filler.
+    Any other difference (a status, month, campaign name or number) may change
+    the query or its params, which shingle overlap alone would not reveal.
+    """
+    def __init__(self, backend, similarity_threshold: float = 1.0, ttl_seconds: float = 0):
+        self.backend = backend
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return bool(self.ttl_seconds) and time.time() - entry.get("stored_at", 0) > self.ttl_seconds
+
+    def lookup(self, namespace: str, schema_version: Optional[str], question: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"result", "match" ("exact" or "similar"), "similarity", "cached_question"}
+        for a reusable generation, or None.
+        """
+        tokens = question_tokens(question)
+        key = (namespace, schema_version or "", " ".join(tokens))
+        entry = self.backend.get(key)
+        if entry is not None and self._expired(entry):
+            self.backend.delete(key)
+            entry = None
+        if entry is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return {"result": copy.deepcopy(entry["result"]), "match": "exact", "similarity": 1.0, "cached_question": entry["question"]}
+
+        best, best_score = None, 0.0
+        if self.similarity_threshold < 1:
+            comparable = _comparable(tokens)
+            question_shingles, words = shingles(comparable), set(comparable)
+            for _, candidate in self.backend.candidates(key[0], key[1]):
+                candidate_tokens = _comparable(candidate["normalized"].split())
+                if set(candidate_tokens) != words or self._expired(candidate):
+                    continue
+                score = jaccard(question_shingles, shingles(candidate_tokens))
+                if score > best_score:
+                    best, best_score = candidate, score
+        if best is not None and best_score >= self.similarity_threshold:
+            with self._lock:
+                self.similar_hits += 1
+            return {"result": copy.deepcopy(best["result"]), "match": "similar", "similarity": round(best_score, 3), "cached_question": best["question"]}
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, namespace: str, schema_version: Optional[str], question: str, result: Dict[str, Any]) -> None:
+        """Stores a generation; call once its queries have run successfully."""
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        entry = {"question": question, "normalized": normalized, "result": copy.deepcopy(result), "stored_at": time.time()}
+        self.backend.put((namespace, schema_version or "", normalized), entry)
+        with self._lock:
+            self.stores += 1
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            hits = self.exact_hits + self.similar_hits
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "entries": len(self.backend),
+            }
+
+
+class _DisabledGenerationCache(GenerationCache):
+    """Drop-in used when GENERATION_CACHE is off: always misses, never stores."""
+    def __init__(self):
+        super().__init__(MemoryGenerationBackend(max_entries=0))
+
+    def lookup(self, namespace, schema_version, question):
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, namespace, schema_version, question, result):
+        return None
+
+
+_generation_cache: Optional[GenerationCache] = None
+
+
+def get_generation_cache() -> GenerationCache:
+    """
+    Returns the process-wide generation cache, configured from:
+    GENERATION_CACHE (memory, sqlite or off; default memory),
+    GENERATION_CACHE_PATH (SQLite file, default generation_cache.sqlite3),
+    GENERATION_CACHE_MAX_ENTRIES (default 500), GENERATION_CACHE_SIMILARITY
+    (default 1, exact matches only; e.g. 0.8 also reuses reworded questions) and GENERATION_CACHE_TTL_SECONDS
+    (default 0, no expiry; entries are already scoped to a schema version).
+    """
+    global _generation_cache
+    if _generation_cache is None:
+        backend_name = os.getenv("GENERATION_CACHE", "memory").strip().lower()
+        max_entries = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "500"))
+        if backend_name == "off":
+            _generation_cache = _DisabledGenerationCache()
+            return _generation_cache
+        backend = None
+        if backend_name == "sqlite":
+            path = os.getenv("GENERATION_CACHE_PATH", "generation_cache.sqlite3")
+            try:
+                backend = SQLiteGenerationBackend(path, max_entries=max_entries)
+            except sqlite3.Error as e:
+                print(f"Could not open generation cache '{path}', using memory: {e}")
+        elif backend_name != "memory":
+            print(f"Unknown GENERATION_CACHE backend '{backend_name}', using memory.")
+        _generation_cache = GenerationCache(
+            backend or MemoryGenerationBackend(max_entries=max_entries),
+            similarity_threshold=float(os.getenv("GENERATION_CACHE_SIMILARITY", "1")),
+            ttl_seconds=float(os.getenv("GENERATION_CACHE_TTL_SECONDS", "0")),
+        )
+    return _generation_cache
+
+
+# Clear the persisted cache, e.g. after prompt changes:
+#   python -m langchain_arch.utils.generation_cache clear
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in ("clear", "stats"):
+        print("Usage: python -m langchain_arch.utils.generation_cache clear|stats")
+        sys.exit(1)
+    cache = get_generation_cache()
+    if sys.argv[1] == "clear":
+        cache.clear()
+        print("Generation cache cleared.")
+    else:
+        print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,241 @@
+import re
+import sys
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+from .neo4j_utils import load_schema_markdown
+from .query_cache import normalize_cypher
+from .query_log import get_query_log_path, read_query_log
+from .schema_parser import GraphSchema, parse_schema_markdown, is_identifier_property
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# (var:Label ...) and (var:Label {prop: ...}); only the first label is used
+_NODE_BINDING = re.compile(r"\(\s*(\w+)\s*:\s*`?(\w+)`?(?:\s*:\s*`?\w+`?)*\s*(\{[^}]*\})?")
+_MAP_KEY = re.compile(r"(\w+)\s*:")
+# Clause keywords that end a WHERE predicate; the WITH of STARTS WITH / ENDS WITH is an operator,
+# and normalize_cypher() leaves a single space before it
+_CLAUSE_SPLIT = re.compile(
+    r"\b(WHERE|RETURN|(?<!STARTS\s)(?<!ENDS\s)WITH|OPTIONAL\s+MATCH|MATCH|UNWIND|ORDER\s+BY|SKIP|LIMIT|CALL|UNION|MERGE|CREATE|SET|DELETE)\b",
+    re.IGNORECASE,
+)
+_PROPERTY_PREDICATE = re.compile(
+    r"\b(\w+)\.(\w+)\s*(=~|<>|<=|>=|=|<|>|IN\b|STARTS\s+WITH|ENDS\s+WITH|CONTAINS|IS\s+(?:NOT\s+)?NULL)",
+    re.IGNORECASE,
+)
+# Reversed comparisons such as `$since <= wi.period_start`
+_REVERSED_PREDICATE = re.compile(r"(<>|<=|>=|=|<|>)\s*(\w+)\.(\w+)\b")
+
+_RANGE_OPERATORS = {"<", ">", "<=", ">=", "STARTS WITH"}
+_TEXT_OPERATORS = {"CONTAINS", "ENDS WITH"}
+
+
+def extract_filtered_properties(cypher_query: str) -> Set[Tuple[str, str, str]]:
+    """
+    Finds the label/property pairs a query filters on, from WHERE predicates
+    and inline property maps.
+
+    Returns:
+        A set of (label, property, operator) triples. Variables are resolved to
+        the label they were first bound with in the query.
+    """
+    text = _STRING_LITERAL.sub("''", normalize_cypher(cypher_query))
+    bindings: Dict[str, str] = {}
+    filters: Set[Tuple[str, str, str]] = set()
+
+    for var, label, prop_map in _NODE_BINDING.findall(text):
+        bindings.setdefault(var, label)
+        if prop_map:
+            for prop in _MAP_KEY.findall(prop_map):
+                filters.add((label, prop, "="))
+
+    parts = _CLAUSE_SPLIT.split(text)
+    # re.split with a capture group alternates: text, keyword, text, keyword, ...
+    for keyword, body in zip(parts[1::2], parts[2::2]):
+        if keyword.upper() != "WHERE":
+            continue
+        for var, prop, op in _PROPERTY_PREDICATE.findall(body):
+            if var in bindings:
+                filters.add((bindings[var], prop, " ".join(op.upper().split())))
+        for op, var, prop in _REVERSED_PREDICATE.findall(body):
+            if var in bindings:
+                # `$x <= v.p` constrains v.p from the other side, still a range predicate
+                filters.add((bindings[var], prop, op))
+    return filters
+
+
+class IndexAdvisor:
+    """
+    Suggests indexes and constraints from how generated Cypher actually filters.
+
+    Counts, per (label, property), how many logged executions filter on it,
+    keeps the pairs that exist in the schema, and turns them into idempotent
+    DDL: uniqueness constraints for identifier properties, TEXT indexes for
+    CONTAINS/ENDS WITH filters and RANGE indexes for everything else.
+    """
+    def __init__(self, schema: GraphSchema, min_count: int = 1):
+        self.schema = schema
+        self.min_count = min_count
+        self.filter_counts: Counter = Counter()
+        self.operators: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        self.unknown_pairs: Counter = Counter()
+        self.queries_seen = 0
+
+    def add_query(self, cypher_query: str, weight: int = 1) -> None:
+        self.queries_seen += weight
+        pairs_in_query = set()
+        for label, prop, op in extract_filtered_properties(cypher_query):
+            if not self.schema.has_property(label, prop):
+                self.unknown_pairs[(label, prop)] += weight
+                continue
+            self.operators[(label, prop)][op] += weight
+            pairs_in_query.add((label, prop))
+        for pair in pairs_in_query:
+            self.filter_counts[pair] += weight
+
+    def add_queries(self, queries: Iterable[str]) -> None:
+        for cypher_query in queries:
+            self.add_query(cypher_query)
+
+    def report(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Filtered label/property pairs, most frequent first."""
+        rows = []
+        for (label, prop), count in self.filter_counts.most_common(top):
+            rows.append({
+                "label": label,
+                "property": prop,
+                "filter_count": count,
+                "operators": dict(self.operators[(label, prop)]),
+                "node_count": self.schema.node_counts.get(label),
+                "identifier": is_identifier_property(label, prop),
+            })
+        return rows
+
+    def recommend(self, all_identifiers: bool = False) -> List[Dict[str, str]]:
+        """
+        Builds the DDL statements.
+
+        Args:
+            all_identifiers: Also constrain identifier properties that were never filtered on,
+                so hierarchy anchors are indexed before any queries are logged.
+
+        Returns:
+            A list of {"kind", "label", "property", "statement"} dicts; constraints come first
+            because a uniqueness constraint cannot be created over an existing index.
+        """
+        constraints, indexes = [], []
+        constrained = set()
+        candidates = [pair for pair, count in self.filter_counts.most_common() if count >= self.min_count]
+        if all_identifiers:
+            candidates += [
+                (label, prop) for label, props in self.schema.node_properties.items()
+                for prop in props if is_identifier_property(label, prop) and (label, prop) not in candidates
+            ]
+
+        for label, prop in candidates:
+            if is_identifier_property(label, prop):
+                name = f"uniq_{label.lower()}_{prop}"
+                constraints.append({
+                    "kind": "constraint", "label": label, "property": prop,
+                    "statement": f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.`{prop}` IS UNIQUE",
+                })
+                constrained.add((label, prop))
+
+        for label, prop in candidates:
+            if (label, prop) in constrained:
+                continue
+            ops = self.operators.get((label, prop), Counter())
+            text_ops = sum(count for op, count in ops.items() if op in _TEXT_OPERATORS)
+            if text_ops and text_ops * 2 >= sum(ops.values()):
+                name = f"text_{label.lower()}_{prop}"
+                statement = f"CREATE TEXT INDEX {name} IF NOT EXISTS FOR (n:`{label}`) ON (n.`{prop}`)"
+            else:
+                name = f"idx_{label.lower()}_{prop}"
+                statement = f"CREATE INDEX {name} IF NOT EXISTS FOR (n:`{label}`) ON (n.`{prop}`)"
+            indexes.append({"kind": "index", "label": label, "property": prop, "statement": statement})
+        return constraints + indexes
+
+
+def apply_statements(statements: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Runs the DDL on the pooled driver. Each statement is independent, so a
+    failure (e.g. duplicate values blocking a uniqueness constraint) is reported
+    and the rest still run.
+    """
+    from .neo4j_pool import get_driver, get_connection_details, close_driver
+
+    _, _, database = get_connection_details()
+    outcomes = []
+    try:
+        with get_driver().session(database=database) as session:
+            for item in statements:
+                try:
+                    session.run(item["statement"]).consume()
+                    outcomes.append({**item, "applied": True})
+                except Exception as e:
+                    outcomes.append({**item, "applied": False, "error": str(e)})
+    finally:
+        close_driver()
+    return outcomes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Suggest Neo4j indexes and constraints from the schema and executed queries.")
+    parser.add_argument("--schema", default="neo4j_schema.md", help="Path to the schema markdown file.")
+    parser.add_argument("--log", action="append", help="JSONL query log (defaults to CYPHER_QUERY_LOG). May be repeated.")
+    parser.add_argument("--top", type=int, default=20, help="Number of filtered pairs to report.")
+    parser.add_argument("--min-count", type=int, default=1, help="Minimum filter count before an index is suggested.")
+    parser.add_argument("--all-identifiers", action="store_true", help="Also constrain identifier properties never seen in filters.")
+    parser.add_argument("--apply", action="store_true", help="Run the statements against the configured database.")
+    args = parser.parse_args(argv)
+
+    schema_markdown = load_schema_markdown(args.schema)
+    if schema_markdown is None:
+        print(f"Schema file '{args.schema}' not found.")
+        return 1
+    advisor = IndexAdvisor(parse_schema_markdown(schema_markdown), min_count=args.min_count)
+
+    log_paths = args.log or ([get_query_log_path()] if get_query_log_path() else [])
+    if not log_paths:
+        print("No query log given (use --log or set CYPHER_QUERY_LOG); only schema-based suggestions are possible.")
+    for path in log_paths:
+        try:
+            advisor.add_queries(entry["query"] for entry in read_query_log(path))
+        except OSError as e:
+            print(f"Could not read query log {path}: {e}")
+            return 1
+
+    print(f"Analysed {advisor.queries_seen} executed queries.\n")
+    print("Most filtered label/property pairs:")
+    for row in advisor.report(args.top):
+        ops = ", ".join(f"{op} x{count}" for op, count in sorted(row["operators"].items(), key=lambda kv: -kv[1]))
+        nodes = f"{row['node_count']} nodes" if row["node_count"] is not None else "unknown size"
+        print(f"  {row['filter_count']:>6}  :{row['label']}.{row['property']}  ({ops}; {nodes})")
+    if advisor.unknown_pairs:
+        unknown = ", ".join(f":{label}.{prop}" for (label, prop), _ in advisor.unknown_pairs.most_common(10))
+        print(f"\nFiltered properties not in the schema (ignored): {unknown}")
+
+    statements = advisor.recommend(all_identifiers=args.all_identifiers)
+    print("\nSuggested statements:")
+    if not statements:
+        print("  (none)")
+    for item in statements:
+        print(f"  {item['statement']};")
+
+    if args.apply and statements:
+        print("\nApplying...")
+        failed = 0
+        for outcome in apply_statements(statements):
+            if outcome["applied"]:
+                print(f"  OK    {outcome['statement']}")
+            else:
+                failed += 1
+                print(f"  FAIL  {outcome['statement']}\n        {outcome['error']}")
+        return 1 if failed else 0
+    return 0
+
+
+# Usage:
+#   python -m langchain_arch.utils.index_advisor --log /var/log/cypher_queries.jsonl [--apply]
+if __name__ == '__main__':
+    sys.exit(main())
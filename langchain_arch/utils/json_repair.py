@@ -0,0 +1,250 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import Generation
+from langchain.output_parsers import OutputFixingParser
+
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_CLOSERS = {"{": "}", "[": "]"}
+TIERS = ("direct", "repaired", "llm_fixed", "failed")
+
+
+def _closes_string(text: str, pos: int) -> bool:
+    """Whether the quote at `pos` ends the string: it is followed by a structural character or the end of the text."""
+    rest = text[pos + 1:].lstrip()
+    if not rest or rest[0] in ":}]":
+        return True
+    if rest[0] != ",":
+        return False
+    # After a comma the next thing must be a value, a key or a closing bracket, not more prose
+    after = rest[1:].lstrip()
+    return not after or after[0] in '"{[]}-0123456789' or after.startswith(("true", "false", "null"))
+
+
+def repair_json(text: str) -> str:
+    """
+    Deterministic repair of the usual ways LLM JSON is malformed.
+
+    - Drops text around the JSON, such as ```json fences or a closing remark.
+    - Escapes raw newlines, tabs and other control characters inside strings.
+    - Escapes quotes inside strings that do not end the string, i.e. are not
+      followed by ':', ',', '}' or ']'.
+    - Doubles backslashes that start no valid escape: the Markdown pipe escape
+      "\\|" the prompts ask for in tables.
+    - Removes trailing commas.
+    - Closes a truncated final string and any brackets left open.
+
+    Returns the repaired text; it may still not be valid JSON.
+    """
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    end = max(text.rfind("}"), text.rfind("]"))
+    text = text[start:end + 1] if end > start else text[start:]
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < len(text) else ""
+                if nxt in _VALID_ESCAPES and nxt and (nxt != "u" or _is_hex(text[i + 2:i + 6])):
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                out.append("\\\\")
+                i += 1
+                continue
+            if ch == '"':
+                if _closes_string(text, i):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+            elif ch in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[ch])
+            elif ord(ch) < 0x20:
+                out.append(f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    if in_string:
+        out.append('"')
+    if stack:
+        _drop_trailing_comma(out)
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _is_hex(text: str) -> bool:
+    return len(text) == 4 and all(c in "0123456789abcdefABCDEF" for c in text)
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+class OutputValidationError(OutputParserException):
+    """Raised for LLM output that parsed but does not match the agent's output_schema."""
+
+
+def schema_errors(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Checks parsed LLM output against the subset of JSON schema the agents'
+    output_schema uses: type, enum, required, properties and items.
+
+    Returns one message per violation, e.g. '$.workflow: "reports" is not one of insight, optimization'.
+    """
+    expected = schema.get("type")
+    if expected in _JSON_TYPES:
+        python_type = _JSON_TYPES[expected]
+        # bool is an int subclass but not a JSON number
+        if not isinstance(value, python_type) or (isinstance(value, bool) and expected != "boolean"):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path}: {json.dumps(value)} is not one of {', '.join(map(str, schema['enum']))}"]
+    errors: List[str] = []
+    if isinstance(value, dict):
+        errors.extend(f"{path}: missing \"{key}\"" for key in schema.get("required", ()) if key not in value)
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(schema_errors(value[key], subschema, f"{path}.{key}"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(schema_errors(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+class ParseStats:
+    """Counts, per agent role, which tier produced each parsed LLM output."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, role: str, tier: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(role or "unknown", dict.fromkeys(TIERS, 0))
+            counts[tier] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            roles = {role: dict(counts) for role, counts in self._counts.items()}
+        totals = {tier: sum(counts[tier] for counts in roles.values()) for tier in TIERS}
+        parsed = sum(totals.values())
+        return {
+            **totals,
+            "llm_fix_rate": totals["llm_fixed"] / parsed if parsed else 0.0,
+            "roles": roles,
+        }
+
+
+_parse_stats = ParseStats()
+
+
+def get_parse_stats() -> ParseStats:
+    return _parse_stats
+
+
+class RepairingJsonOutputParser(JsonOutputParser):
+    """
+    JsonOutputParser that tries cheaper fixes before asking an LLM.
+
+    Tiers, each counted in get_parse_stats() under the agent's role:
+    direct (the text parsed as is), repaired (parsed after repair_json()),
+    llm_fixed (OutputFixingParser with `fixing_llm`, only if one is given)
+    and failed (the OutputParserException is raised). Partial parses while
+    streaming are not counted.
+    """
+    role: str = ""
+    fixing_llm: Optional[Any] = None
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        if partial:
+            return super().parse_result(result, partial=True)
+        try:
+            return self._parse_locally(result)
+        except OutputParserException as error:
+            if self.fixing_llm is None:
+                get_parse_stats().record(self.role, "failed")
+                raise
+            try:
+                parsed = self._fixing_parser().parse(result[0].text)
+            except Exception:
+                get_parse_stats().record(self.role, "failed")
+                raise error
+        get_parse_stats().record(self.role, "llm_fixed")
+        return parsed
+
+    async def aparse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        if partial:
+            return super().parse_result(result, partial=True)
+        try:
+            return self._parse_locally(result)
+        except OutputParserException as error:
+            if self.fixing_llm is None:
+                get_parse_stats().record(self.role, "failed")
+                raise
+            try:
+                parsed = await self._fixing_parser().aparse(result[0].text)
+            except Exception:
+                get_parse_stats().record(self.role, "failed")
+                raise error
+        get_parse_stats().record(self.role, "llm_fixed")
+        return parsed
+
+    def _parse_locally(self, result: List[Generation]) -> Any:
+        """The direct and repaired tiers; raises OutputParserException if both fail."""
+        try:
+            parsed = super().parse_result(result)
+            get_parse_stats().record(self.role, "direct")
+            return parsed
+        except OutputParserException as error:
+            try:
+                parsed = json.loads(repair_json(result[0].text), strict=False)
+            except ValueError:
+                raise error
+        get_parse_stats().record(self.role, "repaired")
+        return parsed
+
+    def _fixing_parser(self) -> OutputFixingParser:
+        return OutputFixingParser.from_llm(parser=JsonOutputParser(), llm=self.fixing_llm)
+
+    @property
+    def _type(self) -> str:
+        return "repairing_json_output_parser"
@@ -0,0 +1,118 @@
+import json
+from typing import Optional
+
+from .json_repair import _is_hex
+
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStreamer:
+    """
+    Extracts one top-level string field from JSON text while it is still arriving.
+
+    Feed it the model's output chunk by chunk; each feed() returns the newly
+    decoded characters of the field's value, e.g. the "insight" of the insight
+    generator's {"insight": ..., "reasoning": ...}. It tracks string and
+    nesting state, so the same key name inside another value or a nested
+    object is ignored, and it holds back an escape sequence split across
+    chunks until it is complete. Text before the opening brace (a ```json
+    fence) is skipped.
+    """
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_is_key = False
+        self._string_is_target = False
+        self._expect_key = False
+        self._current = []
+        self._last_key: Optional[str] = None
+
+    def feed(self, text: str) -> str:
+        """Adds received text; returns the part of the field value it completed."""
+        if self.done or not text:
+            return ""
+        self._buffer += text
+        emitted = []
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and not self.done:
+            ch = buffer[pos]
+            if self._in_string:
+                if ch == "\\":
+                    decoded, consumed = self._decode_escape(buffer, pos)
+                    if consumed == 0:
+                        break # Incomplete escape, wait for more text
+                    pos += consumed
+                    self._append(decoded, emitted)
+                    continue
+                if ch == '"':
+                    self._close_string()
+                else:
+                    self._append(ch, emitted)
+            elif ch == '"':
+                self._in_string = True
+                self._current = []
+                self._string_is_key = self._depth == 1 and self._expect_key
+                self._string_is_target = self._depth == 1 and not self._expect_key and self._last_key == self.field
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "{" and self._depth == 1:
+                    self._expect_key = True
+            elif ch in "}]":
+                self._depth -= 1
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_key = False
+                elif ch == ",":
+                    self._expect_key = True
+                    self._last_key = None
+            pos += 1
+        self._pos = pos
+        # Keep the buffer from growing with text that is already processed
+        self._buffer, self._pos = buffer[pos:], 0
+        delta = "".join(emitted)
+        self.value += delta
+        return delta
+
+    def _append(self, decoded: str, emitted: list) -> None:
+        if self._string_is_target:
+            emitted.append(decoded)
+        elif self._string_is_key:
+            self._current.append(decoded)
+
+    def _close_string(self) -> None:
+        self._in_string = False
+        if self._string_is_key:
+            self._last_key = "".join(self._current)
+        elif self._string_is_target:
+            self.done = True
+
+    @staticmethod
+    def _decode_escape(buffer: str, pos: int):
+        """Returns (decoded text, characters consumed); consumed is 0 if the escape is incomplete."""
+        if pos + 1 >= len(buffer):
+            return "", 0
+        kind = buffer[pos + 1]
+        if kind != "u":
+            return _SIMPLE_ESCAPES.get(kind, kind), 2
+        if pos + 6 > len(buffer):
+            return "", 0
+        if not _is_hex(buffer[pos + 2:pos + 6]):
+            # Malformed: show it as written; the parser repairs the full text later
+            return "\\u", 2
+        code = int(buffer[pos + 2:pos + 6], 16)
+        if 0xD800 <= code <= 0xDFFF:
+            # High surrogate: decode together with the following low surrogate
+            if code <= 0xDBFF:
+                if pos + 12 > len(buffer):
+                    return "", 0
+                low = buffer[pos + 8:pos + 12]
+                if buffer[pos + 6:pos + 8] == "\\u" and _is_hex(low) and 0xDC00 <= int(low, 16) <= 0xDFFF:
+                    return json.loads('"' + buffer[pos:pos + 12] + '"'), 12
+            # A lone surrogate cannot be encoded for display
+            return "\ufffd", 6
+        return chr(code), 6
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from .llm_usage import _percentile
+
+# Load environment variables from .env file
+load_dotenv()
+
+# First-token latencies and hedge decisions kept per role
+HEDGE_WINDOW = 200
+
+
+class HedgePolicy:
+    """
+    When one role's LLM calls are hedged, and how often they were.
+
+    The hedge delay is the `percentile` of the role's recent first-token
+    latencies, never less than `min_delay_ms`; until `min_samples` calls were
+    timed there is no delay and calls are not hedged. Duplicates are capped at
+    `budget`, the fraction of the last HEDGE_WINDOW calls that may be hedged:
+    a duplicate is billed for its prompt tokens even when it loses.
+    """
+    def __init__(self, role: str, percentile: float = 0.95, budget: float = 0.05,
+                 min_samples: int = 20, min_delay_ms: float = 200.0):
+        if not 0 < percentile < 1:
+            raise ValueError(f"Hedge percentile must be between 0 and 1, got {percentile}.")
+        self.role = role
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay_ms = min_delay_ms
+        self._first_token: deque = deque(maxlen=HEDGE_WINDOW)
+        self._decisions: deque = deque(maxlen=HEDGE_WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait for the first token before hedging, or None while there are too few samples."""
+        with self._lock:
+            if len(self._first_token) < max(self.min_samples, 1):
+                return None
+            delay_ms = _percentile(list(self._first_token), self.percentile)
+        return max(delay_ms, self.min_delay_ms) / 1000
+
+    def acquire(self) -> bool:
+        """Whether a duplicate may be sent now; counts it if so and the refusal otherwise."""
+        with self._lock:
+            hedged = sum(self._decisions)
+            if hedged + 1 > self.budget * (len(self._decisions) + 1):
+                self.skipped_budget += 1
+                return False
+            self._decisions.append(True)
+            self.hedged += 1
+            return True
+
+    def record(self, first_token_ms: float, hedged: bool, hedge_won: bool) -> None:
+        """
+        Records a finished race. `first_token_ms` is the winner's own time
+        to its first token, so the hedge delay does not feed back into the
+        latencies it is computed from.
+        """
+        with self._lock:
+            self.calls += 1
+            self._first_token.append(first_token_ms)
+            if not hedged:
+                self._decisions.append(False)
+            if hedge_won:
+                self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        with self._lock:
+            first_token = list(self._first_token)
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "skipped_budget": self.skipped_budget,
+                "delay_ms": round(delay * 1000, 1) if delay is not None else None,
+                "first_token_ms": {"p50": _percentile(first_token, 0.5), "p95": _percentile(first_token, 0.95)},
+            }
+
+
+async def _head(stream: AsyncIterator[Any]) -> List[Any]:
+    """Reads `stream` up to and including its first chunk with content (OpenAI streams an empty one first)."""
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        if getattr(chunk, "content", chunk):
+            break
+    return chunks
+
+
+async def _discard(task: "asyncio.Task", stream: Any) -> None:
+    """Cancels the losing call and closes its stream, which ends its HTTP request."""
+    task.cancel()
+    await asyncio.wait({task})
+    if not task.cancelled():
+        # Retrieve the outcome so a failed loser is not logged as unhandled
+        task.exception()
+    await stream.aclose()
+
+
+class HedgedRunnable(Runnable):
+    """
+    Wraps a streaming chat model so a call that has not produced its first
+    token within the policy's delay is sent a second time. Whichever copy
+    streams its first token first is used and the other is cancelled; the
+    rest of the answer comes from the winner only, so consumers see one
+    ordinary stream. Errors are not hedged: a call that fails before the
+    delay raises as usual, and after a hedge the other copy is awaited.
+
+    ainvoke() goes through the same race; sync invoke() is not hedged.
+    """
+    def __init__(self, bound: Runnable, policy: HedgePolicy):
+        self.bound = bound
+        self.policy = policy
+
+    def __getattr__(self, name: str) -> Any:
+        # model_name, temperature, ... of the wrapped model
+        if name == "bound":
+            raise AttributeError(name)
+        return getattr(self.bound, name)
+
+    @property
+    def InputType(self) -> Any:
+        return self.bound.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.bound.OutputType
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        message = None
+        async for chunk in self.astream(input, config, **kwargs):
+            message = chunk if message is None else message + chunk
+        return message
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        started = time.perf_counter()
+        primary = self.bound.astream(input, config, **kwargs)
+        primary_task = asyncio.create_task(_head(primary))
+        streams = {primary_task: primary}
+        delay = self.policy.delay()
+        hedged = False
+        try:
+            if delay is not None:
+                await asyncio.wait({primary_task}, timeout=delay)
+            if delay is not None and not primary_task.done() and self.policy.acquire():
+                hedged = True
+                hedge_started = time.perf_counter()
+                hedge = self.bound.astream(input, config, **kwargs)
+                hedge_task = asyncio.create_task(_head(hedge))
+                streams[hedge_task] = hedge
+                print(f"{self.policy.role}: no first token after {delay * 1000:.0f} ms; sent a hedged request.")
+            winner = await self._race(list(streams))
+        except BaseException:
+            for task, stream in streams.items():
+                await _discard(task, stream)
+            raise
+        for task, stream in streams.items():
+            if task is not winner:
+                await _discard(task, stream)
+        hedge_won = winner is not primary_task
+        self.policy.record((time.perf_counter() - (hedge_started if hedge_won else started)) * 1000, hedged, hedge_won)
+
+        stream = streams[winner]
+        try:
+            for chunk in winner.result():
+                yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    @staticmethod
+    async def _race(tasks: List["asyncio.Task"]) -> "asyncio.Task":
+        """The first task to finish without an error; raises the original call's error if all fail."""
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+        raise tasks[0].exception()
+
+
+_hedge_policies: Dict[str, HedgePolicy] = {}
+_hedge_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(role: str) -> Optional[HedgePolicy]:
+    """
+    Returns the role's hedge policy, or None when LLM_HEDGING is off (the
+    default). Configured from LLM_HEDGE_PERCENTILE (default 0.95),
+    LLM_HEDGE_BUDGET (fraction of calls, default 0.05), LLM_HEDGE_MIN_SAMPLES
+    (default 20) and LLM_HEDGE_MIN_DELAY_MS (default 200).
+    """
+    if os.getenv("LLM_HEDGING", "off").lower() not in ("on", "true", "1"):
+        return None
+    with _hedge_policies_lock:
+        policy = _hedge_policies.get(role)
+        if policy is None:
+            policy = HedgePolicy(
+                role,
+                percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+                budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.05")),
+                min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+                min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200")),
+            )
+            _hedge_policies[role] = policy
+        return policy
+
+
+def hedging_stats() -> Dict[str, Any]:
+    """Hedge counters of every role with a policy, keyed by role; empty when hedging is off."""
+    with _hedge_policies_lock:
+        policies = dict(_hedge_policies)
+    return {role: policy.stats() for role, policy in policies.items()}
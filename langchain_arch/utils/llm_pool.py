@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+from typing import Dict, Any, Optional
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+from .llm_usage import LLMUsageCallback
+from .llm_scheduler import GovernedTransport, get_llm_scheduler
+
+# Load environment variables from .env file
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Process-wide HTTP clients shared by every ChatOpenAI instance, so LLM calls
+# reuse keep-alive connections (and their TLS sessions) across agents and chat
+# messages instead of each agent owning a connection pool.
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+# One ChatOpenAI per agent role, plus one per role with a fallback model ("<role>:fallback")
+_llms: Dict[str, ChatOpenAI] = {}
+_lock = threading.Lock()
+# Parsed LLM_ROUTING_FILE, keyed by (path, mtime) so edits are picked up by new agents
+_routing_config: Dict[tuple, Dict[str, Any]] = {}
+ROUTING_KEYS = {"model", "temperature", "max_tokens", "timeout", "fallback_model"}
+
+
+def get_http_config() -> Dict[str, Any]:
+    """
+    Reads the LLM HTTP pool settings from environment variables.
+
+    LLM_MAX_CONNECTIONS: Maximum concurrent connections to the LLM API (default 100).
+    LLM_MAX_KEEPALIVE_CONNECTIONS: Idle connections kept open for reuse (default 20).
+    LLM_KEEPALIVE_EXPIRY: Seconds an idle connection is kept (default 60).
+    LLM_TIMEOUT: Default request timeout in seconds (default 120).
+    """
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "timeout": httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "120")), connect=10.0),
+    }
+
+
+def load_routing_config(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the model routing file (LLM_ROUTING_FILE), a JSON object of role ->
+    settings with an optional "default" entry, e.g.
+
+        {"default": {"model": "gpt-4o"},
+         "classifier": {"model": "gpt-4o-mini", "max_tokens": 200, "timeout": 15, "fallback_model": "gpt-4o"}}
+
+    Settings are model, temperature, max_tokens, timeout and fallback_model.
+    Returns {} without a file; raises ValueError for a malformed one.
+    """
+    path = path or os.getenv("LLM_ROUTING_FILE")
+    if not path:
+        return {}
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError as e:
+        raise ValueError(f"LLM routing file '{path}' cannot be read: {e}")
+    config = _routing_config.get(key)
+    if config is None:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if not isinstance(config, dict) or not all(isinstance(v, dict) for v in config.values()):
+            raise ValueError(f"LLM routing file '{path}' must map roles to objects of settings.")
+        for role, settings in config.items():
+            unknown = set(settings) - ROUTING_KEYS
+            if unknown:
+                raise ValueError(f"LLM routing file '{path}': unknown settings for '{role}': {', '.join(sorted(unknown))}")
+        _routing_config.clear()
+        _routing_config[key] = config
+    return config
+
+
+def get_agent_settings(role: str, default_temperature: float = 0.0) -> Dict[str, Any]:
+    """
+    Model settings for an agent role, e.g. "classifier" or "insight_generator".
+
+    LLM_MODEL sets the model for every role (default gpt-4o); LLM_<ROLE>_MODEL,
+    LLM_<ROLE>_TEMPERATURE, LLM_<ROLE>_MAX_TOKENS and LLM_<ROLE>_TIMEOUT
+    override it per role (e.g. LLM_CLASSIFIER_MODEL=gpt-4o-mini).
+    LLM_<ROLE>_FALLBACK_MODEL (or LLM_FALLBACK_MODEL for every role) names the
+    larger model an agent retries with when the fast model's output fails
+    validation. The same settings can come from LLM_ROUTING_FILE; a per-role
+    variable beats the file's role entry, which beats LLM_MODEL and
+    LLM_FALLBACK_MODEL, which beat the file's "default" entry.
+    """
+    prefix = f"LLM_{role.upper()}_"
+    config = load_routing_config()
+    routed = config.get(role, {})
+    default = config.get("default", {})
+
+    def setting(name: str, generic: Optional[str] = None) -> Any:
+        value = os.getenv(prefix + name.upper())
+        if value is None or value == "":
+            value = routed.get(name)
+        if value is None and generic:
+            value = os.getenv(generic) or None
+        if value is None:
+            value = default.get(name)
+        return value
+
+    max_tokens = setting("max_tokens")
+    timeout = setting("timeout")
+    temperature = setting("temperature")
+    model = setting("model", "LLM_MODEL") or DEFAULT_MODEL
+    fallback_model = setting("fallback_model", "LLM_FALLBACK_MODEL")
+    return {
+        "model": model,
+        "temperature": float(temperature) if temperature is not None else float(default_temperature),
+        "max_tokens": int(max_tokens) if max_tokens else None,
+        "request_timeout": float(timeout) if timeout else None,
+        # No fallback when it would be the same model
+        "fallback_model": fallback_model if fallback_model and fallback_model != model else None,
+    }
+
+
+def _is_strict_schema(schema: Any) -> bool:
+    """Whether a JSON schema meets strict structured-output rules: every object closed and all its properties required."""
+    if isinstance(schema, dict):
+        if schema.get("type") == "object":
+            properties = schema.get("properties")
+            if not properties or schema.get("additionalProperties") is not False or set(schema.get("required", ())) != set(properties):
+                return False
+        return all(_is_strict_schema(v) for v in schema.values())
+    if isinstance(schema, list):
+        return all(_is_strict_schema(v) for v in schema)
+    return True
+
+
+def get_response_format(role: str, schema: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    The OpenAI response_format for an agent role, from LLM_STRUCTURED_OUTPUT
+    (or LLM_<ROLE>_STRUCTURED_OUTPUT):
+
+    off: no constraint, the prompt alone asks for JSON.
+    json_object (default): the API guarantees syntactically valid JSON.
+    json_schema: the output follows the agent's JSON schema. Strict
+        (guaranteed) when the schema allows it; agents with free-form parts,
+        such as the query generators' params, get it as a non-strict schema.
+    """
+    mode = (os.getenv(f"LLM_{role.upper()}_STRUCTURED_OUTPUT") or os.getenv("LLM_STRUCTURED_OUTPUT") or "json_object").lower()
+    if mode == "off":
+        return None
+    if mode == "json_schema" and schema:
+        return {"type": "json_schema", "json_schema": {"name": role, "schema": schema, "strict": _is_strict_schema(schema)}}
+    return {"type": "json_object"}
+
+
+def get_http_clients() -> "tuple[httpx.Client, httpx.AsyncClient]":
+    """
+    Returns the shared sync and async HTTP clients, creating them on first use.
+    With LLM budgets configured, the async client's requests go through the
+    LLM scheduler (utils/llm_scheduler.py).
+    """
+    global _http_client, _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            config = get_http_config()
+            _http_client = httpx.Client(**config)
+            scheduler = get_llm_scheduler()
+            if scheduler.enabled:
+                # Agents call the LLM asynchronously, so only this client is rate-limited and queued
+                transport = GovernedTransport(httpx.AsyncHTTPTransport(limits=config["limits"]), scheduler)
+                _async_http_client = httpx.AsyncClient(transport=transport, timeout=config["timeout"])
+            else:
+                _async_http_client = httpx.AsyncClient(**config)
+        return _http_client, _async_http_client
+
+
+def _build_llm(key: str, role: str, settings: Dict[str, Any]) -> ChatOpenAI:
+    http_client, async_http_client = get_http_clients()
+    kwargs = {k: v for k, v in settings.items() if v is not None and k != "fallback_model"}
+    llm = ChatOpenAI(
+        streaming=True,
+        http_client=http_client,
+        http_async_client=async_http_client,
+        # Per-role latency and token counts (utils/llm_usage.py)
+        callbacks=[LLMUsageCallback(role, kwargs["model"])],
+        **kwargs,
+    )
+    with _lock:
+        return _llms.setdefault(key, llm)
+
+
+def get_llm(role: str, default_temperature: float = 0.0) -> ChatOpenAI:
+    """
+    Returns the ChatOpenAI for an agent role, built once per process on top of
+    the shared HTTP clients.
+    """
+    llm = _llms.get(role)
+    if llm is not None:
+        return llm
+    return _build_llm(role, role, get_agent_settings(role, default_temperature))
+
+
+def get_fallback_llm(role: str, default_temperature: float = 0.0) -> Optional[ChatOpenAI]:
+    """
+    Returns the ChatOpenAI for the role's fallback model, or None if the role
+    has none. It keeps the role's temperature and max tokens but not its
+    timeout, which is usually tuned for the fast model; LLM_TIMEOUT applies.
+    """
+    key = f"{role}:fallback"
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+    settings = get_agent_settings(role, default_temperature)
+    if not settings["fallback_model"]:
+        return None
+    settings = {**settings, "model": settings["fallback_model"], "request_timeout": None}
+    return _build_llm(key, role, settings)
+
+
+async def close_llm_clients() -> None:
+    """Closes the shared HTTP clients. Intended as the application shutdown hook."""
+    global _http_client, _async_http_client
+    with _lock:
+        http_client, async_http_client = _http_client, _async_http_client
+        _http_client = _async_http_client = None
+        _llms.clear()
+    if async_http_client is not None:
+        try:
+            await async_http_client.aclose()
+            http_client.close()
+            print("LLM HTTP client pool closed.")
+        except Exception as e:
+            print(f"Error closing LLM HTTP client pool: {e}")
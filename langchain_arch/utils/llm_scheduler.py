@@ -0,0 +1,370 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar, Token
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Priority classes, served in this order
+PRIORITIES = ("interactive", "speculative", "batch")
+WINDOW_SECONDS = 60.0
+# Pause after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class LLMCallContext:
+    """
+    Who the LLM calls of one request are made for: the chat session and its
+    priority class. Also collects the request's queue-wait totals, shared by
+    the contexts derived with with_priority() (e.g. speculative generation).
+    """
+    __slots__ = ("session_id", "priority", "totals")
+
+    def __init__(self, session_id: str, priority: str = "interactive", totals: Optional[Dict[str, float]] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority '{priority}', expected one of {', '.join(PRIORITIES)}.")
+        self.session_id = session_id
+        self.priority = priority
+        self.totals = totals if totals is not None else {"calls": 0, "queued_calls": 0, "wait_ms": 0.0, "reported_calls": 0, "reported_wait_ms": 0.0}
+
+    def with_priority(self, priority: str) -> "LLMCallContext":
+        return LLMCallContext(self.session_id, priority, self.totals)
+
+    def record(self, wait_ms: float) -> None:
+        self.totals["calls"] += 1
+        if wait_ms > 0:
+            self.totals["queued_calls"] += 1
+            self.totals["wait_ms"] += wait_ms
+
+    def take_queue_wait(self) -> Optional[Dict[str, Any]]:
+        """Queue wait recorded since the last call, or None if no call had to wait."""
+        totals = self.totals
+        queued = totals["queued_calls"] - totals["reported_calls"]
+        if not queued:
+            return None
+        wait_ms = totals["wait_ms"] - totals["reported_wait_ms"]
+        totals["reported_calls"], totals["reported_wait_ms"] = totals["queued_calls"], totals["wait_ms"]
+        return {"queued_calls": queued, "wait_ms": round(wait_ms, 1)}
+
+
+_call_context: ContextVar[Optional[LLMCallContext]] = ContextVar("llm_call_context", default=None)
+
+
+def current_call_context() -> Optional[LLMCallContext]:
+    return _call_context.get()
+
+
+def set_call_context(context: Optional[LLMCallContext]) -> Token:
+    return _call_context.set(context)
+
+
+def reset_call_context(token: Token) -> None:
+    try:
+        _call_context.reset(token)
+    except ValueError:
+        # An async generator finalised from another context (e.g. by the garbage collector)
+        pass
+
+
+async def with_priority(priority: str, awaitable: Awaitable[Any]) -> Any:
+    """Awaits `awaitable` with the current call context lowered to `priority`; meant as a task body."""
+    context = current_call_context()
+    if context is not None:
+        # Tasks run in a copy of the creator's context, so this does not leak back
+        set_call_context(context.with_priority(priority))
+    return await awaitable
+
+
+class LLMGrant:
+    """Admission of one LLM request; release() once its response is closed."""
+    __slots__ = ("scheduler", "tokens", "wait_ms", "_released")
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int, wait_ms: float):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.wait_ms = wait_ms
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.scheduler._release()
+
+
+class _Waiter:
+    __slots__ = ("tokens", "priority", "future", "enqueued")
+
+    def __init__(self, tokens: int, priority: str, future: "asyncio.Future"):
+        self.tokens = tokens
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM requests.
+
+    Budgets are requests and tokens per rolling minute and requests in
+    flight (0 for no limit). A request that does not fit waits in a queue:
+    higher priority classes first (interactive, then speculative, then
+    batch), and within a class the sessions take turns, one request each,
+    so one busy session cannot hold up the others. Queued requests are
+    admitted in that order even if a later, smaller one would fit. A 429
+    from the provider pauses admission for its Retry-After time instead of
+    letting every queued request run into the same limit.
+
+    Tokens are estimated before the call: prompt characters / 4 plus the
+    request's max_tokens, or `completion_tokens` without one. Meant for the
+    single event loop the app runs on.
+    """
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrent: int = 0, completion_tokens: int = 500):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrent = max_concurrent
+        self.completion_tokens = completion_tokens
+        # priority -> session -> waiting requests; sessions rotate to the end once served
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        # (admitted_at, tokens) of the requests of the last minute
+        self._window: Deque[tuple] = deque()
+        self._window_tokens = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self.queued = {p: 0 for p in PRIORITIES}
+        self.wait_ms = {p: 0.0 for p in PRIORITIES}
+        self.max_wait_ms = 0.0
+        self.rate_limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute or self.max_concurrent)
+
+    def estimate_tokens(self, request: httpx.Request) -> int:
+        try:
+            body = json.loads(request.content or b"{}")
+        except ValueError:
+            return self.completion_tokens
+        chars = sum(len(m.get("content") or "") if isinstance(m.get("content"), str) else len(json.dumps(m.get("content")))
+                    for m in body.get("messages", ()) if isinstance(m, dict))
+        return math.ceil(chars / 4) + int(body.get("max_tokens") or self.completion_tokens)
+
+    async def acquire(self, tokens: int, session_id: str = "default", priority: str = "batch") -> LLMGrant:
+        """Waits until the request fits the budgets and it is its turn; returns its grant."""
+        if self.tokens_per_minute:
+            # A request larger than the whole budget runs alone in an empty window
+            tokens = min(tokens, self.tokens_per_minute)
+        if not self._has_waiters() and self._delay(tokens) == 0:
+            return self._admit(tokens, priority, 0.0)
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(tokens, priority, future)
+        self._queues[priority].setdefault(session_id, deque()).append(waiter)
+        self.queued[priority] += 1
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up
+                future.result().release()
+            else:
+                future.cancel()
+                self._dispatch()
+            raise
+
+    def backoff(self, retry_after: float) -> None:
+        """Pauses admission after the provider answered 429."""
+        self.rate_limited += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[p] for p in PRIORITIES)
+
+    def _expire(self, now: float) -> None:
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _delay(self, tokens: int) -> Optional[float]:
+        """Seconds until a request of `tokens` fits (0 for now), or None while the in-flight limit is reached."""
+        if self.max_concurrent and self._in_flight >= self.max_concurrent:
+            return None
+        now = time.monotonic()
+        self._expire(now)
+        delay = max(0.0, self._paused_until - now)
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            oldest = self._window[len(self._window) - self.requests_per_minute][0]
+            delay = max(delay, oldest + WINDOW_SECONDS - now)
+        if self.tokens_per_minute and self._window_tokens + tokens > self.tokens_per_minute:
+            excess = self._window_tokens + tokens - self.tokens_per_minute
+            for admitted_at, admitted_tokens in self._window:
+                excess -= admitted_tokens
+                if excess <= 0:
+                    delay = max(delay, admitted_at + WINDOW_SECONDS - now)
+                    break
+        return delay
+
+    def _next_waiter(self) -> Optional[tuple]:
+        """(priority, session_id, waiter) of the request whose turn it is, dropping cancelled ones."""
+        for priority in PRIORITIES:
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, waiters = next(iter(sessions.items()))
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()
+                if waiters:
+                    return priority, session_id, waiters[0]
+                del sessions[session_id]
+        return None
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while True:
+            turn = self._next_waiter()
+            if turn is None:
+                return
+            priority, session_id, waiter = turn
+            delay = self._delay(waiter.tokens)
+            if delay is None:
+                # Dispatched again when a request in flight finishes
+                return
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            sessions = self._queues[priority]
+            sessions[session_id].popleft()
+            # The session goes to the back of its class: sessions take turns
+            sessions.move_to_end(session_id)
+            waiter.future.set_result(self._admit(waiter.tokens, priority, (time.monotonic() - waiter.enqueued) * 1000))
+
+    def _admit(self, tokens: int, priority: str, wait_ms: float) -> LLMGrant:
+        self._window.append((time.monotonic(), tokens))
+        self._window_tokens += tokens
+        self._in_flight += 1
+        self.admitted[priority] += 1
+        self.wait_ms[priority] += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        return LLMGrant(self, tokens, wait_ms)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        if self._has_waiters():
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "waiting": sum(len(w) for p in PRIORITIES for w in self._queues[p].values()),
+            "window_requests": len(self._window),
+            "window_tokens": self._window_tokens,
+            "rate_limited": self.rate_limited,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "priorities": {
+                p: {
+                    "admitted": self.admitted[p],
+                    "queued": self.queued[p],
+                    "avg_wait_ms": round(self.wait_ms[p] / self.admitted[p], 1) if self.admitted[p] else 0.0,
+                }
+                for p in PRIORITIES
+            },
+        }
+
+
+def _retry_after(headers: httpx.Headers) -> float:
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, ValueError):
+            continue
+    return DEFAULT_RETRY_AFTER
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that releases the request's grant when it is closed (streamed completions end here)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, grant: LLMGrant):
+        self._stream = stream
+        self._grant = grant
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._grant.release()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._grant.release()
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport for the shared async LLM client: every request, from any
+    agent, chain, fixing parser or retry, is admitted by the LLMScheduler
+    under the current LLMCallContext's session and priority. Calls made
+    outside a Router run count as the "default" session at batch priority.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: LLMScheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        context = current_call_context()
+        session_id, priority = (context.session_id, context.priority) if context is not None else ("default", "batch")
+        grant = await self.scheduler.acquire(self.scheduler.estimate_tokens(request), session_id, priority)
+        if context is not None:
+            context.record(grant.wait_ms)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            grant.release()
+            raise
+        if response.status_code == 429:
+            self.scheduler.backoff(_retry_after(response.headers))
+        if response.is_closed:
+            # Body already read by the transport
+            grant.release()
+        else:
+            response.stream = _ReleasingStream(response.stream, grant)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_llm_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Returns the process-wide LLM scheduler, configured from the environment:
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE and LLM_MAX_CONCURRENT_REQUESTS
+    (default 0, no limit; with all three at 0 requests are not governed) and
+    LLM_COMPLETION_TOKENS_ESTIMATE (default 500) for requests without max_tokens.
+    """
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        _llm_scheduler = LLMScheduler(
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "0")),
+            completion_tokens=int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500")),
+        )
+    return _llm_scheduler
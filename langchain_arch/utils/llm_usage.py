@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from .result_encoding import count_tokens
+
+# Latencies kept per role for the percentiles
+LATENCY_WINDOW = 1000
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 1)
+
+
+class LLMUsageStats:
+    """
+    Per-role LLM latency and token counts, fed by LLMUsageCallback, and how
+    often each role fell back from its fast model to the larger one.
+
+    Streamed responses carry no token usage, so prompt and completion tokens
+    are counted locally with tiktoken (or estimated, see count_tokens) unless
+    the API reported them.
+    """
+    def __init__(self):
+        self._roles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _role(self, role: str) -> Dict[str, Any]:
+        entry = self._roles.get(role)
+        if entry is None:
+            entry = {
+                "calls": 0, "errors": 0, "fallbacks": 0, "fallback_reasons": {},
+                "prompt_tokens": 0, "completion_tokens": 0, "tokens_estimated": False,
+                "models": {}, "latency": deque(maxlen=LATENCY_WINDOW), "first_token": deque(maxlen=LATENCY_WINDOW),
+            }
+            self._roles[role] = entry
+        return entry
+
+    def record_call(self, role: str, model: str, latency_ms: float, first_token_ms: Optional[float],
+                    prompt_tokens: int, completion_tokens: int, estimated: bool) -> None:
+        with self._lock:
+            entry = self._role(role)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["tokens_estimated"] = entry["tokens_estimated"] or estimated
+            model_entry = entry["models"].setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0})
+            model_entry["calls"] += 1
+            model_entry["prompt_tokens"] += prompt_tokens
+            model_entry["completion_tokens"] += completion_tokens
+            model_entry["latency_ms"] += latency_ms
+            entry["latency"].append(latency_ms)
+            if first_token_ms is not None:
+                entry["first_token"].append(first_token_ms)
+
+    def record_error(self, role: str) -> None:
+        with self._lock:
+            self._role(role)["errors"] += 1
+
+    def record_fallback(self, role: str, reason: str) -> None:
+        """Counts a retry with the fallback model; `reason` is the validation failure, e.g. "unparseable"."""
+        with self._lock:
+            entry = self._role(role)
+            entry["fallbacks"] += 1
+            entry["fallback_reasons"][reason] = entry["fallback_reasons"].get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            roles = {}
+            for role, entry in self._roles.items():
+                latency, first_token = list(entry["latency"]), list(entry["first_token"])
+                roles[role] = {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "fallbacks": entry["fallbacks"],
+                    "fallback_reasons": dict(entry["fallback_reasons"]),
+                    "latency_ms": {
+                        "avg": round(sum(latency) / len(latency), 1) if latency else None,
+                        "p50": _percentile(latency, 0.5),
+                        "p95": _percentile(latency, 0.95),
+                    },
+                    "first_token_ms": {"p50": _percentile(first_token, 0.5), "p95": _percentile(first_token, 0.95)},
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                    "tokens_estimated": entry["tokens_estimated"],
+                    "models": {
+                        model: {**m, "latency_ms": round(m["latency_ms"] / m["calls"], 1)}
+                        for model, m in entry["models"].items()
+                    },
+                }
+        return {
+            "calls": sum(r["calls"] for r in roles.values()),
+            "fallbacks": sum(r["fallbacks"] for r in roles.values()),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in roles.values()),
+            "completion_tokens": sum(r["completion_tokens"] for r in roles.values()),
+            "roles": roles,
+        }
+
+
+_llm_usage = LLMUsageStats()
+
+
+def get_llm_usage() -> LLMUsageStats:
+    return _llm_usage
+
+
+class LLMUsageCallback(BaseCallbackHandler):
+    """
+    Attached to each role's ChatOpenAI by utils/llm_pool.py: times every call
+    (start to last token, and to the first streamed token) and records it in
+    get_llm_usage() under the agent's role.
+    """
+    # Cheap bookkeeping: run in the event loop instead of an executor thread
+    run_inline = True
+
+    def __init__(self, role: str, model: str):
+        self.role = role
+        self.model = model
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = "\n".join(
+            m.content if isinstance(m.content, str) else str(m.content)
+            for batch in messages for m in batch
+        )
+        self._runs[run_id] = {"started": time.perf_counter(), "first_token": None, "prompt": prompt}
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None and token:
+            run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        now = time.perf_counter()
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens"):
+            prompt_tokens, completion_tokens, estimated = usage["prompt_tokens"], usage.get("completion_tokens", 0), False
+        else:
+            completion = "".join(g.text for generations in response.generations for g in generations)
+            prompt_tokens, prompt_estimated = count_tokens(run["prompt"], self.model)
+            completion_tokens, completion_estimated = count_tokens(completion, self.model)
+            estimated = prompt_estimated or completion_estimated
+        first_token_ms = (run["first_token"] - run["started"]) * 1000 if run["first_token"] is not None else None
+        get_llm_usage().record_call(
+            self.role, self.model, (now - run["started"]) * 1000, first_token_ms,
+            prompt_tokens, completion_tokens, estimated,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # A cancelled call (a losing hedged request, an abandoned speculation) is not an error
+        if self._runs.pop(run_id, None) is not None and not isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            get_llm_usage().record_error(self.role)
@@ -0,0 +1,132 @@
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from neo4j import GraphDatabase, AsyncGraphDatabase, Driver, AsyncDriver
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Process-wide driver registry. A single driver owns the Bolt connection pool,
+# so every Router / workflow borrows sessions from it instead of paying TLS and
+# auth setup on each chat message.
+_driver: Optional[Driver] = None
+_driver_lock = threading.Lock()
+# Async counterpart used by the workflows. Concurrent queries are then bounded
+# by the Bolt pool size instead of the event loop's default thread pool.
+_async_driver: Optional[AsyncDriver] = None
+
+
+def get_pool_config() -> Dict[str, Any]:
+    """
+    Reads the connection pool settings from environment variables.
+
+    NEO4J_MAX_POOL_SIZE: Maximum number of pooled Bolt connections (default 50).
+    NEO4J_MAX_CONNECTION_LIFETIME: Seconds before a pooled connection is recycled (default 3600).
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT: Seconds to wait for a free connection (default 60).
+    """
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")),
+    }
+
+
+def get_connection_details() -> Tuple[str, Tuple[str, str], str]:
+    """
+    Reads NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD and NEO4J_DATABASE.
+
+    Returns:
+        A tuple of (uri, auth, database).
+    """
+    uri = os.getenv("NEO4J_URI")
+    user = os.getenv("NEO4J_USERNAME")
+    password = os.getenv("NEO4J_PASSWORD")
+    database = os.getenv("NEO4J_DATABASE", "neo4j") # Default to 'neo4j' if not set
+
+    if not all([uri, user, password]):
+        raise ValueError(
+            "Neo4j connection details (NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD) "
+            "must be set in environment variables."
+        )
+    return uri, (user, password), database
+
+
+def init_driver() -> Driver:
+    """
+    Creates the shared driver and verifies connectivity once.
+    Safe to call more than once; later calls return the existing driver.
+    Intended as the application startup hook.
+    """
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            uri, auth, database = get_connection_details()
+            try:
+                driver = GraphDatabase.driver(uri, auth=auth, **get_pool_config())
+                driver.verify_connectivity()
+            except Exception as e:
+                print(f"Failed to connect to Neo4j: {e}")
+                raise
+            _driver = driver
+            print(f"Neo4j driver pool initialised for database: {database} at {uri}")
+        return _driver
+
+
+def get_driver() -> Driver:
+    """Returns the shared driver, creating it on first use if startup did not."""
+    if _driver is None:
+        return init_driver()
+    return _driver
+
+
+def close_driver() -> None:
+    """Closes the shared driver and its pool. Intended as the application shutdown hook."""
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            try:
+                _driver.close()
+                print("Neo4j driver pool closed.")
+            except Exception as e:
+                print(f"Error closing Neo4j driver pool: {e}")
+            finally:
+                _driver = None
+
+
+async def init_async_driver() -> AsyncDriver:
+    """
+    Creates the shared async driver and verifies connectivity once.
+    Must be awaited on the event loop that will run the queries.
+    Intended as the application startup hook.
+    """
+    driver = get_async_driver()
+    try:
+        await driver.verify_connectivity()
+    except Exception as e:
+        print(f"Failed to connect to Neo4j: {e}")
+        raise
+    return driver
+
+
+def get_async_driver() -> AsyncDriver:
+    """Returns the shared async driver, creating it on first use if startup did not."""
+    global _async_driver
+    if _async_driver is None:
+        uri, auth, database = get_connection_details()
+        _async_driver = AsyncGraphDatabase.driver(uri, auth=auth, **get_pool_config())
+        print(f"Neo4j async driver pool initialised for database: {database} at {uri}")
+    return _async_driver
+
+
+async def close_async_driver() -> None:
+    """Closes the shared async driver and its pool. Intended as the application shutdown hook."""
+    global _async_driver
+    if _async_driver is not None:
+        driver, _async_driver = _async_driver, None
+        try:
+            await driver.close()
+            print("Neo4j async driver pool closed.")
+        except Exception as e:
+            print(f"Error closing Neo4j async driver pool: {e}")
@@ -1,44 +1,76 @@
 import os
-from neo4j import GraphDatabase
+import time
+from neo4j import Driver, AsyncDriver
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator, Callable, Tuple
+
+from .neo4j_pool import get_driver, get_async_driver, get_connection_details
+from .result_set import ResultSet, ResultSetBuilder
+from .query_log import log_executed_query
+from .query_telemetry import PROFILE_QUERIES, execution_stats
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Records pulled from the server per Bolt round trip when streaming results
+DEFAULT_FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+# Row cap applied by the workflows to LLM-written queries (0 disables the cap)
+MAX_RESULT_ROWS = int(os.getenv("NEO4J_MAX_RESULT_ROWS", "2000"))
+
+def load_schema_markdown(schema_file_path: str) -> str | None:
+    """
+    Loads the graph schema from a specified Markdown file.
+
+    Args:
+        schema_file_path: The path to the Markdown file containing the schema.
+
+    Returns:
+        The content of the schema file as a string, or None if the file cannot be read.
+    """
+    try:
+        # Adjust path relative to the project root if necessary
+        # Assuming this script is run from the project root or schema_file_path is absolute
+        full_path = os.path.abspath(schema_file_path)
+        if not os.path.exists(full_path):
+             # Try path relative to this file's directory if not found
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Go up one level from utils
+            full_path = os.path.join(base_dir, schema_file_path)
+
+
+        if os.path.exists(full_path):
+             with open(full_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        else:
+            print(f"Schema file not found at expected paths: {schema_file_path} or {full_path}")
+            return None
+    except Exception as e:
+        print(f"Error reading schema file {schema_file_path}: {e}")
+        return None
+
 class Neo4jDatabase:
     """
     Utility class for interacting with a Neo4j database.
 
-    Handles connection management, query execution, and schema retrieval.
+    Handles query execution and schema retrieval. Sessions are borrowed from the
+    process-wide driver pool (see neo4j_pool.py) unless a driver is passed in.
     Reads connection details from environment variables:
     NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, NEO4J_DATABASE
     """
-    def __init__(self):
-        uri = os.getenv("NEO4J_URI")
-        user = os.getenv("NEO4J_USERNAME")
-        password = os.getenv("NEO4J_PASSWORD")
-        self.database = os.getenv("NEO4J_DATABASE", "neo4j") # Default to 'neo4j' if not set
-
-        if not all([uri, user, password]):
-            raise ValueError(
-                "Neo4j connection details (NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD) "
-                "must be set in environment variables."
-            )
-
-        try:
-            self._driver = GraphDatabase.driver(uri, auth=(user, password))
-            self._driver.verify_connectivity()
-            print(f"Successfully connected to Neo4j database: {self.database} at {uri}")
-        except Exception as e:
-            print(f"Failed to connect to Neo4j: {e}")
-            raise
+    def __init__(self, driver: Optional[Driver] = None):
+        _, _, self.database = get_connection_details()
+        # Only close drivers we were handed explicitly; the pooled one is
+        # shut down by the application shutdown hook.
+        self._owns_driver = driver is not None
+        self._driver = driver if driver is not None else get_driver()
+        # Execution telemetry of the most recent query() call (see query_telemetry.py)
+        self.last_query_stats: Optional[Dict[str, Any]] = None
 
     def close(self):
-        """Closes the Neo4j driver connection."""
-        if self._driver:
+        """Releases this handle. Closes the driver only if it was passed in explicitly."""
+        if self._driver and self._owns_driver:
             self._driver.close()
             print("Neo4j connection closed.")
+        self._driver = None
 
     def query(self, cypher_query: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
@@ -55,10 +87,13 @@ class Neo4jDatabase:
         if params is None:
             params = {}
         try:
+            started = time.perf_counter()
             with self._driver.session(database=self.database) as session:
                 result = session.run(cypher_query, params)
                 # Consume the result fully and convert records to dictionaries
-                return [record.data() for record in result]
+                records = [record.data() for record in result]
+                self.last_query_stats = execution_stats(result.consume(), len(records), (time.perf_counter() - started) * 1000)
+                return records
         except Exception as e:
             print(f"Error executing Cypher query: {e}")
             print(f"Query: {cypher_query}")
@@ -66,6 +101,60 @@ class Neo4jDatabase:
             # Depending on the desired error handling, you might re-raise, return None, or empty list
             return [] # Return empty list on error for now
 
+    def stream(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        fetch_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Executes a Cypher query and yields records one at a time without
+        materialising the whole result.
+
+        Args:
+            cypher_query: The Cypher query string to execute.
+            params: Optional dictionary of parameters for the query.
+            fetch_size: Records pulled per round trip (defaults to NEO4J_FETCH_SIZE).
+            max_rows: Optional cap; the rest of the result is discarded once reached.
+
+        Yields:
+            One dictionary per record. Stops early (after logging) if the query fails.
+        """
+        if params is None:
+            params = {}
+        try:
+            with self._driver.session(database=self.database, fetch_size=fetch_size or DEFAULT_FETCH_SIZE) as session:
+                result = session.run(cypher_query, params)
+                count = 0
+                for record in result:
+                    yield record.data()
+                    count += 1
+                    if max_rows and count >= max_rows:
+                        break
+        except Exception as e:
+            print(f"Error executing Cypher query: {e}")
+            print(f"Query: {cypher_query}")
+            print(f"Params: {params}")
+
+    def stream_batches(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        fetch_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Like stream(), but yields lists of up to fetch_size records."""
+        batch_size = fetch_size or DEFAULT_FETCH_SIZE
+        batch = []
+        for record in self.stream(cypher_query, params, fetch_size=batch_size, max_rows=max_rows):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
     def get_schema_markdown(self, schema_file_path: str) -> str | None:
         """
         Loads the graph schema from a specified Markdown file.
@@ -76,25 +165,7 @@ class Neo4jDatabase:
         Returns:
             The content of the schema file as a string, or None if the file cannot be read.
         """
-        try:
-            # Adjust path relative to the project root if necessary
-            # Assuming this script is run from the project root or schema_file_path is absolute
-            full_path = os.path.abspath(schema_file_path)
-            if not os.path.exists(full_path):
-                 # Try path relative to this file's directory if not found
-                base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Go up one level from utils
-                full_path = os.path.join(base_dir, schema_file_path)
-
-
-            if os.path.exists(full_path):
-                 with open(full_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            else:
-                print(f"Schema file not found at expected paths: {schema_file_path} or {full_path}")
-                return None
-        except Exception as e:
-            print(f"Error reading schema file {schema_file_path}: {e}")
-            return None
+        return load_schema_markdown(schema_file_path)
 
     def __enter__(self):
         return self
@@ -102,8 +173,199 @@ class Neo4jDatabase:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+class AsyncNeo4jDatabase:
+    """
+    Asyncio counterpart of Neo4jDatabase built on the neo4j AsyncGraphDatabase driver.
+
+    Used by the workflows so concurrent Cypher queries wait on the Bolt pool
+    (see neo4j_pool.py) rather than holding threads in the event loop's
+    default executor.
+    """
+    def __init__(self, driver: Optional[AsyncDriver] = None):
+        _, _, self.database = get_connection_details()
+        self._owns_driver = driver is not None
+        self._driver = driver if driver is not None else get_async_driver()
+
+    async def close(self):
+        """Releases this handle. Closes the driver only if it was passed in explicitly."""
+        if self._driver and self._owns_driver:
+            await self._driver.close()
+            print("Neo4j async connection closed.")
+        self._driver = None
+
+    async def query(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        max_rows: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Executes a Cypher query against the database.
+
+        Args:
+            cypher_query: The Cypher query string to execute.
+            params: Optional dictionary of parameters for the query.
+            max_rows: Optional cap on the number of records returned.
+
+        Returns:
+            A list of records, where each record is a dictionary.
+            Returns an empty list if the query fails or yields no results.
+        """
+        return [record async for record in self.stream(cypher_query, params, max_rows=max_rows)]
+
+    async def stream(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        fetch_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        raise_errors: bool = False,
+        on_summary: Optional[Callable[[Any], None]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Executes a Cypher query and yields records as dictionaries as they arrive.
+
+        Args:
+            cypher_query: The Cypher query string to execute.
+            params: Optional dictionary of parameters for the query.
+            fetch_size: Records pulled per round trip (defaults to NEO4J_FETCH_SIZE).
+            max_rows: Optional cap; the rest of the result is discarded once reached.
+            raise_errors: Re-raise query failures instead of just logging them.
+            on_summary: Optional callback receiving the ResultSummary once the result is consumed.
+
+        Yields:
+            One dictionary per record. Stops early (after logging) if the query fails.
+        """
+        if params is None:
+            params = {}
+        try:
+            async with self._driver.session(database=self.database, fetch_size=fetch_size or DEFAULT_FETCH_SIZE) as session:
+                result = await session.run(cypher_query, params)
+                count = 0
+                async for record in result:
+                    yield record.data()
+                    count += 1
+                    if max_rows and count >= max_rows:
+                        break
+                if on_summary is not None:
+                    # Discards any records left past the cap and returns the timings
+                    on_summary(await result.consume())
+        except Exception as e:
+            print(f"Error executing Cypher query: {e}")
+            print(f"Query: {cypher_query}")
+            print(f"Params: {params}")
+            if raise_errors:
+                raise
+
+    async def stream_batches(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        fetch_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+        raise_errors: bool = False,
+        on_summary: Optional[Callable[[Any], None]] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Like stream(), but yields lists of up to fetch_size records."""
+        batch_size = fetch_size or DEFAULT_FETCH_SIZE
+        batch = []
+        async for record in self.stream(cypher_query, params, fetch_size=batch_size, max_rows=max_rows, raise_errors=raise_errors, on_summary=on_summary):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def fetch_result_set(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        max_rows: Optional[int] = None,
+    ) -> ResultSet:
+        """
+        Streams a query batch by batch into a columnar ResultSet.
+
+        Args:
+            cypher_query: The Cypher query string to execute.
+            params: Optional dictionary of parameters for the query.
+            max_rows: Optional cap on the number of records fetched.
+
+        Returns:
+            The ResultSet. Unlike query(), failures are raised to the caller.
+        """
+        result_set, _ = await self.fetch_result_set_with_stats(cypher_query, params, max_rows=max_rows)
+        return result_set
+
+    async def fetch_result_set_with_stats(
+        self,
+        cypher_query: str,
+        params: Dict[str, Any] = None,
+        max_rows: Optional[int] = None,
+        profile: Optional[bool] = None,
+    ) -> Tuple[ResultSet, Dict[str, Any]]:
+        """
+        Like fetch_result_set(), but also returns execution telemetry from the result summary.
+
+        Args:
+            profile: Run under PROFILE to collect db hits (defaults to NEO4J_PROFILE_QUERIES).
+
+        Returns:
+            A tuple of (result_set, stats) where stats holds rows, available_after_ms,
+            consumed_after_ms, wall_ms and db_hits (None unless profiled).
+        """
+        profile = PROFILE_QUERIES if profile is None else profile
+        summaries = []
+        started = time.perf_counter()
+        builder = ResultSetBuilder()
+        executed_query = f"PROFILE {cypher_query}" if profile else cypher_query
+        async for batch in self.stream_batches(executed_query, params, max_rows=max_rows, raise_errors=True, on_summary=summaries.append):
+            builder.extend(batch)
+        result_set = builder.build()
+        wall_ms = (time.perf_counter() - started) * 1000
+        stats = execution_stats(summaries[0] if summaries else None, len(result_set), wall_ms, profiled=profile)
+        # Feeds the index advisor and slow-query analysis when CYPHER_QUERY_LOG is set
+        log_executed_query(cypher_query, params, stats=stats)
+        return result_set, stats
+
+    async def explain(self, cypher_query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Plans a query with EXPLAIN without executing it.
+
+        Args:
+            cypher_query: The Cypher query string to plan.
+            params: Optional dictionary of parameters for the query.
+
+        Returns:
+            The plan tree as returned by the server (operatorType, args, identifiers, children).
+            Syntax and schema errors are raised to the caller.
+        """
+        async with self._driver.session(database=self.database) as session:
+            result = await session.run(f"EXPLAIN {cypher_query}", params or {})
+            summary = await result.consume()
+            return summary.plan or {}
+
+    def get_schema_markdown(self, schema_file_path: str) -> str | None:
+        """
+        Loads the graph schema from a specified Markdown file.
+
+        Args:
+            schema_file_path: The path to the Markdown file containing the schema.
+
+        Returns:
+            The content of the schema file as a string, or None if the file cannot be read.
+        """
+        return load_schema_markdown(schema_file_path)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
 # Example usage (optional, for testing)
 if __name__ == '__main__':
+    from .neo4j_pool import close_driver
     # Make sure you have a .env file with your Neo4j credentials
     # and neo4j_schema.md in the root or specified path
     try:
@@ -133,6 +395,7 @@ if __name__ == '__main__':
             print("Query executed, but returned no results or an error occurred.")
 
         db.close()
+        close_driver()
 
     except ValueError as ve:
         print(f"Configuration Error: {ve}")
@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .result_set import ResultSet
+from .query_telemetry import cached_stats
+
+# Load environment variables from .env file
+load_dotenv()
+
+# String literals and backtick-quoted names are matched first, so "//" or
+# runs of spaces inside them are kept as written
+_CYPHER_TOKENS = re.compile(
+    r"(?P<literal>'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)"
+    # Whitespace and comments between tokens, collapsed to one space
+    r"|(?P<gap>(?:\s+|//[^\n]*|/\*.*?\*/)+)",
+    re.DOTALL,
+)
+
+
+def _normalize_token(match: "re.Match") -> str:
+    return match.group("literal") or " "
+
+
+def normalize_cypher(cypher_query: str) -> str:
+    """
+    Normalises Cypher text for cache keys: drops comments, collapses
+    whitespace and trailing semicolons outside string literals and quoted
+    names. Literals keep their case and spacing, so queries that differ only
+    inside one never share a key.
+    """
+    text = _CYPHER_TOKENS.sub(_normalize_token, cypher_query).strip()
+    return text.rstrip(";").strip()
+
+
+class QueryResultCache:
+    """
+    Memory-bounded LRU cache of query ResultSets with a TTL.
+
+    Keys are the normalised Cypher text plus the JSON-encoded parameters and row cap.
+    The Facebook data only changes when the weekly sync runs, so the ingestion job
+    invalidates the cache: in-process via invalidate(), or from another process by
+    touching the stamp file (QUERY_CACHE_STAMP_FILE), whose mtime is checked on lookup.
+    """
+    def __init__(self, max_bytes: int, ttl_seconds: float, stamp_file: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stamp_file = stamp_file
+        self._entries: "OrderedDict[Tuple[str, str, Optional[int]], Tuple[float, ResultSet]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stamp_mtime = self._read_stamp()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(cypher_query: str, params: Optional[Dict[str, Any]], max_rows: Optional[int] = None) -> Tuple[str, str, Optional[int]]:
+        return (normalize_cypher(cypher_query), json.dumps(params or {}, sort_keys=True, default=str), max_rows)
+
+    def _read_stamp(self) -> Optional[float]:
+        if not self.stamp_file:
+            return None
+        try:
+            return os.stat(self.stamp_file).st_mtime
+        except OSError:
+            return None
+
+    def _check_stamp(self) -> None:
+        """Drops everything if the ingestion stamp file changed since we last looked."""
+        if not self.stamp_file:
+            return
+        mtime = self._read_stamp()
+        if mtime != self._stamp_mtime:
+            self._stamp_mtime = mtime
+            self._clear()
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        self.invalidations += 1
+
+    def get(self, cypher_query: str, params: Optional[Dict[str, Any]] = None, max_rows: Optional[int] = None) -> Optional[ResultSet]:
+        key = self.make_key(cypher_query, params, max_rows)
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result_set = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result_set
+                # Expired
+                del self._entries[key]
+                self._bytes -= result_set.nbytes
+            self.misses += 1
+            return None
+
+    def put(self, cypher_query: str, params: Optional[Dict[str, Any]], result_set: ResultSet, max_rows: Optional[int] = None) -> None:
+        size = result_set.nbytes
+        if size > self.max_bytes:
+            return # Too large to be worth caching
+        key = self.make_key(cypher_query, params, max_rows)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1].nbytes
+            self._entries[key] = (time.monotonic(), result_set)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Drops all cached results. Call after new data has been ingested."""
+        with self._lock:
+            self._stamp_mtime = self._read_stamp()
+            self._clear()
+
+    async def fetch(self, neo4j_db, cypher_query: str, params: Optional[Dict[str, Any]] = None, max_rows: Optional[int] = None) -> Tuple[ResultSet, bool]:
+        """
+        Returns the cached ResultSet for a query, or runs it via neo4j_db.fetch_result_set and caches it.
+
+        Returns:
+            A tuple of (result_set, cache_hit). Failed queries raise and are not cached.
+        """
+        result_set, stats = await self.fetch_with_stats(neo4j_db, cypher_query, params, max_rows)
+        return result_set, stats["cache_hit"]
+
+    async def fetch_with_stats(self, neo4j_db, cypher_query: str, params: Optional[Dict[str, Any]] = None, max_rows: Optional[int] = None) -> Tuple[ResultSet, Dict[str, Any]]:
+        """
+        Like fetch(), but returns the execution telemetry (see query_telemetry.py)
+        instead of a bare hit flag; stats["cache_hit"] tells the two apart.
+        """
+        started = time.perf_counter()
+        cached = self.get(cypher_query, params, max_rows)
+        if cached is not None:
+            return cached, cached_stats(len(cached), (time.perf_counter() - started) * 1000)
+        result_set, stats = await neo4j_db.fetch_result_set_with_stats(cypher_query, params, max_rows=max_rows)
+        self.put(cypher_query, params, result_set, max_rows)
+        return result_set, stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class _DisabledQueryCache(QueryResultCache):
+    """Drop-in used when QUERY_CACHE_ENABLED is false: always misses, never stores."""
+    def get(self, cypher_query, params=None, max_rows=None):
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, cypher_query, params, result_set, max_rows=None):
+        return None
+
+
+_query_cache: Optional[QueryResultCache] = None
+
+
+def get_query_cache() -> QueryResultCache:
+    """
+    Returns the process-wide result cache, configured from:
+    QUERY_CACHE_ENABLED (default true), QUERY_CACHE_MAX_MB (default 64),
+    QUERY_CACHE_TTL_SECONDS (default 3600), QUERY_CACHE_STAMP_FILE (optional).
+    """
+    global _query_cache
+    if _query_cache is None:
+        enabled = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        cache_cls = QueryResultCache if enabled else _DisabledQueryCache
+        _query_cache = cache_cls(
+            max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600")),
+            stamp_file=os.getenv("QUERY_CACHE_STAMP_FILE") or None,
+        )
+    return _query_cache
+
+
+def invalidate_query_cache() -> None:
+    """
+    Ingestion hook. Clears this process's cache and, if QUERY_CACHE_STAMP_FILE
+    is set, touches it so other processes drop their caches on next lookup.
+    """
+    stamp_file = os.getenv("QUERY_CACHE_STAMP_FILE")
+    if stamp_file:
+        with open(stamp_file, "a"):
+            pass
+        os.utime(stamp_file, None)
+    get_query_cache().invalidate()
+
+
+# Run from the ingestion job after the weekly sync:
+#   python -m langchain_arch.utils.query_cache invalidate
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != "invalidate":
+        print("Usage: python -m langchain_arch.utils.query_cache invalidate")
+        sys.exit(1)
+    if not os.getenv("QUERY_CACHE_STAMP_FILE"):
+        print("QUERY_CACHE_STAMP_FILE is not set; nothing to signal to running processes.")
+        sys.exit(1)
+    invalidate_query_cache()
+    print(f"Query cache invalidated (stamp: {os.getenv('QUERY_CACHE_STAMP_FILE')}).")
@@ -0,0 +1,93 @@
+from typing import Dict, Any, List, Optional
+
+from .neo4j_utils import MAX_RESULT_ROWS
+from .query_telemetry import format_execution_stats
+from .cypher_params import missing_parameters
+from .cypher_validator import CypherValidator
+
+
+async def run_generated_query(
+    workflow: Any,
+    item: Dict[str, Any],
+    index: int,
+    validator: Optional[CypherValidator],
+    step: str,
+    label: str,
+    fields: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Checks and executes one generated query for a workflow (its neo4j_db,
+    query_cache, cost_guard and plan_cache_stats); started as soon as the
+    generator has finished writing the query.
+
+    Args:
+        step: Workflow step of the execution events, e.g. "execute_cypher".
+        label: How messages name the query, e.g. "Cypher query 1".
+        fields: Extra keys added to the outcome and to every event, e.g. the objective.
+
+    Returns:
+        {"index", "events", "rejected", "result_set", **fields}: the status/error events
+        to yield, whether the query was rejected before execution (missing parameters,
+        schema mismatch, cost guard), and the ResultSet, or None if it was rejected or failed.
+    """
+    fields = fields or {}
+    events: List[Dict[str, Any]] = []
+    outcome = {"index": index, **fields, "events": events, "rejected": False, "result_set": None}
+    query, params = item["query"], item["params"]
+
+    def event(**values: Any) -> None:
+        events.append({"type": values.pop("type", "error"), "step": values.pop("step", step), **fields, **values, "query_index": index})
+
+    missing = missing_parameters(query, params)
+    if missing:
+        event(message=f"{label} is missing values for parameters: {', '.join(missing)}", query=query)
+        outcome["rejected"] = True
+        return outcome
+
+    if validator is not None:
+        validation_errors = validator.validate(query)
+        if validation_errors:
+            event(step="validate_cypher", message=f"{label} does not match the schema: " + " ".join(validation_errors), query=query, validation_errors=validation_errors)
+            outcome["rejected"] = True
+            return outcome
+
+    # EXPLAIN-based cost guard
+    if workflow.cost_guard is not None:
+        try:
+            verdict = await workflow.cost_guard.check(workflow.neo4j_db, query, params)
+        except Exception as e:
+            event(message=f"{label} could not be planned: {e}", query=query)
+            outcome["rejected"] = True
+            return outcome
+        if not verdict["allowed"]:
+            event(message=f"{label} rejected by cost guard: {verdict['reason']}", query=query, estimated_rows=verdict["max_operator_rows"], operators=verdict["operators"])
+            outcome["rejected"] = True
+            return outcome
+        if verdict["rewritten"]:
+            item["query"] = query = verdict["query"]
+            event(type="status", step="check_cypher_cost", status="warning", details=f"{label}: {verdict['reason']}")
+
+    try:
+        # Served from the result cache when possible; otherwise the cursor is
+        # consumed batch by batch into a ResultSet, bounded by the row cap.
+        result_set, stats = await workflow.query_cache.fetch_with_stats(workflow.neo4j_db, query, params, max_rows=MAX_RESULT_ROWS)
+    except Exception as e:
+        print(f"Error executing {label}: {e}")
+        event(message=f"{label} failed: {e}", query=query)
+        return outcome
+    if not stats["cache_hit"]:
+        workflow.plan_cache_stats.record(query)
+
+    outcome["result_set"] = result_set
+    truncated = bool(MAX_RESULT_ROWS) and len(result_set) >= MAX_RESULT_ROWS
+    cache_hit = stats.get("cache_hit", False)
+    details = f"{label} finished, {len(result_set)} results."
+    if truncated:
+        details += f" (capped at {MAX_RESULT_ROWS} rows)"
+    if cache_hit:
+        details += " (cached)"
+    timing = format_execution_stats(stats)
+    if timing:
+        details += f" [{timing}]"
+    event(type="status", status="partial_complete", details=details, truncated=truncated, cache_hit=cache_hit, execution=stats)
+    return outcome
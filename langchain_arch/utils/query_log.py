@@ -0,0 +1,51 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, Any, Iterator, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+_log_lock = threading.Lock()
+
+
+def get_query_log_path() -> Optional[str]:
+    """Returns the executed-query log path from CYPHER_QUERY_LOG, or None when logging is disabled."""
+    return os.getenv("CYPHER_QUERY_LOG") or None
+
+
+def log_executed_query(cypher_query: str, params: Optional[Dict[str, Any]] = None, stats: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Appends one executed query, with its execution telemetry, as a JSON line to
+    CYPHER_QUERY_LOG. No-op when the variable is unset; write failures are logged and ignored.
+    """
+    path = get_query_log_path()
+    if not path:
+        return
+    entry = {"ts": time.time(), "query": cypher_query, "params": params or {}}
+    if stats:
+        entry.update({key: value for key, value in stats.items() if key != "cache_hit"})
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Error writing query log {path}: {e}")
+
+
+def read_query_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the entries of a JSONL query log, skipping malformed lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get("query"), str):
+                yield entry
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from langchain_core.outputs import Generation
+
+from .cypher_params import normalize_generated_queries
+
+
+def _outcome(task: "asyncio.Task") -> Any:
+    """The task's result, or the exception it raised."""
+    return task.exception() or task.result()
+
+
+class StreamedQueryDispatcher:
+    """
+    Starts work on generated queries while the generator is still writing.
+
+    feed() receives the generator's raw text as it streams and re-parses the
+    partial JSON whenever a new object may have opened. An item of "queries"
+    is complete once the list has grown past it, i.e. the model has opened the
+    next one; the last item once a key after "queries" opens, or when the
+    stream ends (finish()). Each complete item is normalised and handed to
+    `run_query(item, index)` as a task, so checking and executing it in Neo4j
+    overlaps with the generation of the remaining queries and the reasoning.
+    Items without a query are dropped and counted in `skipped`.
+    """
+    def __init__(self, run_query: Callable[[Dict[str, Any], int], Awaitable[Any]], output_parser: Any = None):
+        self.run_query = run_query
+        self.output_parser = output_parser
+        self.items: List[Dict[str, Any]] = []
+        self.skipped = 0
+        self.started = time.perf_counter()
+        self.generation_ms: Optional[float] = None
+        # Milliseconds from the start of generation to each dispatch
+        self.dispatch_ms: List[float] = []
+        self._text: List[str] = []
+        self._offered = 0
+        self._maybe_closed = False
+        self._pending: Set[asyncio.Task] = set()
+
+    def feed(self, text: str) -> int:
+        """Adds streamed generator text; returns how many queries it completed and dispatched."""
+        if not text:
+            return 0
+        self._text.append(text)
+        # The list only grows when an object opens, and is only known to be closed
+        # once a key follows the "]", so other chunks need no re-parse
+        if "]" in text:
+            self._maybe_closed = True
+        if not ("{" in text or (self._maybe_closed and '"' in text)):
+            return 0
+        partial = self.output_parser.parse_result([Generation(text="".join(self._text))], partial=True)
+        if not isinstance(partial, dict):
+            return 0
+        # A key after "queries" (the reasoning) means the list itself is closed
+        keys = list(partial)
+        closed = "queries" in keys and keys[-1] != "queries"
+        if closed:
+            self._maybe_closed = False
+        return self.offer(partial.get("queries"), final=closed)
+
+    def finish(self) -> Any:
+        """
+        Parses the complete generator output (raising OutputParserException like
+        the chain would) and dispatches the remaining queries.
+        """
+        self.generation_ms = (time.perf_counter() - self.started) * 1000
+        result = self.output_parser.parse("".join(self._text))
+        if isinstance(result, dict):
+            self.offer(result.get("queries"), final=True)
+        return result
+
+    def offer(self, raw_items: Any, final: bool = False) -> int:
+        """Dispatches the items of a (partial) queries list that became complete."""
+        if not isinstance(raw_items, list):
+            return 0
+        complete = len(raw_items) if final else len(raw_items) - 1
+        dispatched = 0
+        while self._offered < complete:
+            raw_item = raw_items[self._offered]
+            self._offered += 1
+            normalized = normalize_generated_queries([raw_item])
+            if not normalized:
+                self.skipped += 1
+                continue
+            item, index = normalized[0], len(self.items)
+            self.items.append(item)
+            self.dispatch_ms.append(round((time.perf_counter() - self.started) * 1000, 1))
+            self._pending.add(asyncio.create_task(self.run_query(item, index)))
+            dispatched += 1
+        return dispatched
+
+    def finished(self) -> List[Any]:
+        """Outcomes of tasks that finished since the last call, without waiting."""
+        done = [task for task in self._pending if task.done()]
+        self._pending.difference_update(done)
+        return [_outcome(task) for task in done]
+
+    async def drain(self) -> AsyncIterator[Any]:
+        """Outcomes of the remaining tasks, in completion order."""
+        while self._pending:
+            done, self._pending = await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield _outcome(task)
+
+    def cancel(self) -> None:
+        """Cancels queries still running, e.g. after another one was rejected."""
+        for task in self._pending:
+            task.cancel()
+        self._pending.clear()
+
+    def overlap_stats(self) -> Dict[str, Any]:
+        """How far ahead of the end of generation the queries were dispatched."""
+        stats: Dict[str, Any] = {"dispatched": len(self.items), "skipped": self.skipped, "dispatch_ms": self.dispatch_ms}
+        if self.generation_ms is not None:
+            stats["generation_ms"] = round(self.generation_ms, 1)
+            if self.dispatch_ms:
+                stats["first_dispatch_lead_ms"] = round(max(self.generation_ms - self.dispatch_ms[0], 0.0), 1)
+        return stats
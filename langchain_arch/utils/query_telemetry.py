@@ -0,0 +1,149 @@
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Prefix executed queries with PROFILE to collect db hits. Costs extra server work,
+# so it is meant for diagnosing slow patterns rather than for normal operation.
+PROFILE_QUERIES = os.getenv("NEO4J_PROFILE_QUERIES", "false").lower() in ("1", "true", "yes")
+
+# Workflow steps that are dominated by LLM calls rather than database work
+LLM_STEPS = {"classify_query", "generate_cypher", "generate_insight", "generate_opt_queries", "generate_recommendations"}
+DB_STEPS = {"check_cypher_cost", "execute_cypher", "execute_opt_queries"}
+# Time LLM calls waited for capacity in the LLM scheduler, part of the LLM steps' time
+QUEUE_STEP = "llm_queue"
+
+
+def total_db_hits(profile: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Sums dbHits over a PROFILE plan tree (summary.profile), or None without a profile."""
+    if not profile:
+        return None
+    hits = int(profile.get("dbHits", 0) or 0)
+    for child in profile.get("children", []) or []:
+        hits += total_db_hits(child) or 0
+    return hits
+
+
+def execution_stats(summary, rows: int, wall_ms: float, profiled: bool = False) -> Dict[str, Any]:
+    """
+    Builds the per-query telemetry dict from a neo4j ResultSummary.
+
+    available_after_ms is the server time until the first record was ready,
+    consumed_after_ms the time until the last one was consumed; wall_ms is the
+    client-side time including network and record decoding.
+    """
+    return {
+        "rows": rows,
+        "available_after_ms": getattr(summary, "result_available_after", None),
+        "consumed_after_ms": getattr(summary, "result_consumed_after", None),
+        "wall_ms": round(wall_ms, 1),
+        "db_hits": total_db_hits(getattr(summary, "profile", None)) if profiled else None,
+        "cache_hit": False,
+    }
+
+
+def cached_stats(rows: int, wall_ms: float) -> Dict[str, Any]:
+    """Telemetry for a result served from the query cache (no server time)."""
+    return {
+        "rows": rows,
+        "available_after_ms": None,
+        "consumed_after_ms": None,
+        "wall_ms": round(wall_ms, 1),
+        "db_hits": None,
+        "cache_hit": True,
+    }
+
+
+def format_execution_stats(stats: Optional[Dict[str, Any]]) -> str:
+    """Short human-readable form for status details, e.g. 'db 12+30 ms, 4,210 db hits'."""
+    if not stats or stats.get("cache_hit"):
+        return ""
+    parts = []
+    if stats.get("available_after_ms") is not None:
+        parts.append(f"db {stats['available_after_ms']}+{stats.get('consumed_after_ms') or 0} ms")
+    parts.append(f"wall {stats['wall_ms']:.0f} ms")
+    if stats.get("db_hits") is not None:
+        parts.append(f"{stats['db_hits']:,} db hits")
+    return ", ".join(parts)
+
+
+class RequestTimer:
+    """
+    Builds a per-request timing report by observing the status events a
+    Router run yields: time spent in each step, the execution telemetry
+    attached to partial_complete events, and when the first insight_delta
+    (the first streamed answer text) arrived.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._step_started: Dict[str, float] = {}
+        self._step_elapsed: Dict[str, float] = {}
+        self._step_status: Dict[str, str] = {}
+        self.queries: List[Dict[str, Any]] = []
+        self.first_token_ms: Optional[float] = None
+        self.queue_wait_ms = 0.0
+
+    def observe(self, chunk: Any) -> None:
+        if not isinstance(chunk, dict) or "step" not in chunk:
+            return
+        step, now = chunk["step"], time.perf_counter()
+        if chunk.get("type") == "insight_delta":
+            if self.first_token_ms is None:
+                self.first_token_ms = round((now - self.started) * 1000, 1)
+            return
+        if chunk.get("type") == "error":
+            self._finish(step, now, "failed")
+            return
+        if chunk.get("type") != "status":
+            return
+        status = chunk.get("status")
+        if step == QUEUE_STEP:
+            # Reported after the fact with the measured wait; overlaps the LLM steps it delayed
+            self.queue_wait_ms += chunk.get("wait_ms") or 0.0
+            self._step_elapsed[step] = self.queue_wait_ms
+            self._step_status[step] = status
+            return
+        if status == "in_progress":
+            self._step_started.setdefault(step, now)
+        elif status in ("completed", "failed"):
+            self._finish(step, now, status)
+        elif status == "partial_complete" and chunk.get("execution"):
+            entry = {"step": step, "query_index": chunk.get("query_index"), **chunk["execution"]}
+            if chunk.get("objective"):
+                entry["objective"] = chunk["objective"]
+            self.queries.append(entry)
+
+    def _finish(self, step: str, now: float, status: str) -> None:
+        started = self._step_started.pop(step, None)
+        if started is not None:
+            self._step_elapsed[step] = self._step_elapsed.get(step, 0.0) + (now - started) * 1000
+            self._step_status[step] = status
+
+    def report(self) -> Dict[str, Any]:
+        stages = [
+            {"step": step, "ms": round(ms, 1), "status": self._step_status.get(step)}
+            for step, ms in self._step_elapsed.items()
+        ]
+        db_server_ms = sum(
+            (q.get("available_after_ms") or 0) + (q.get("consumed_after_ms") or 0) for q in self.queries
+        )
+        db_hits = [q["db_hits"] for q in self.queries if q.get("db_hits") is not None]
+        slowest = max(self.queries, key=lambda q: q.get("wall_ms") or 0, default=None)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "first_token_ms": self.first_token_ms,
+            "llm_ms": round(sum(ms for step, ms in self._step_elapsed.items() if step in LLM_STEPS), 1),
+            "queue_wait_ms": round(self.queue_wait_ms, 1),
+            "db_ms": round(sum(ms for step, ms in self._step_elapsed.items() if step in DB_STEPS), 1),
+            "db_server_ms": db_server_ms,
+            "db_hits": sum(db_hits) if db_hits else None,
+            "query_count": len(self.queries),
+            "cached_queries": sum(1 for q in self.queries if q.get("cache_hit")),
+            "slowest_query": slowest,
+            "stages": stages,
+            "queries": self.queries,
+        }
@@ -0,0 +1,351 @@
+import csv
+import io
+import json
+import math
+import os
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .result_set import ResultSet, serialize_results, to_plain
+
+# Load environment variables from .env file
+load_dotenv()
+
+_COMPACT_SEPARATORS = (",", ":")
+FORMATS = ("json", "pretty", "csv", "markdown")
+# Encodings compared by measure_encodings() when none are given
+DEFAULT_MEASURE_SPECS = ("pretty", "json", "json,round=4", "csv", "csv,dictionary,round=4", "markdown", "markdown,dictionary,round=4")
+_FENCES = {"json": "json", "pretty": "json", "csv": "csv", "markdown": "markdown"}
+_LABELS = {"json": "JSON", "pretty": "JSON", "csv": "CSV, one table per result", "markdown": "Markdown tables, one per result"}
+
+
+def round_significant(value: float, digits: int) -> Any:
+    """
+    Rounds a float to `digits` significant digits without touching its integer
+    part: 0.0053217 -> 0.005322 and 12345.678 -> 12346 for digits=4.
+    """
+    if not math.isfinite(value) or value == 0:
+        return value
+    decimals = digits - 1 - math.floor(math.log10(abs(value)))
+    if decimals <= 0:
+        return int(round(value))
+    return round(value, decimals)
+
+
+Table = Tuple[Optional[str], List[str], List[List[Any]]]
+
+
+def _records_table(title: Optional[str], records: List[Any]) -> Table:
+    result_set = ResultSet.from_records(records)
+    return _result_set_table(title, result_set)
+
+
+def _result_set_table(title: Optional[str], result_set: ResultSet) -> Table:
+    columns = [result_set.column_values(c) for c in result_set.columns]
+    return title, list(result_set.columns), [list(row) for row in zip(*columns)]
+
+
+def _is_result_map(data: Dict[Any, Any]) -> bool:
+    """True for {objective: results} (results may be summarised into a nested dict); False for a single record."""
+    return bool(data) and all(isinstance(v, (ResultSet, list, tuple)) or (isinstance(v, dict) and _is_result_map(v)) for v in data.values())
+
+
+def to_tables(data: Any, title: Optional[str] = None) -> List[Table]:
+    """
+    Splits query results into (title, columns, rows) tables.
+
+    A ResultSet is one table; a dict of objective -> results gives one table
+    per objective; a list of ResultSets (the combined multi-query shape) one
+    table per query, with row dictionaries in it collected into a table.
+    """
+    if isinstance(data, ResultSet):
+        return [_result_set_table(title, data)]
+    if isinstance(data, dict):
+        if not _is_result_map(data):
+            return [_records_table(title, [data])]
+        tables = []
+        for key, value in data.items():
+            tables.extend(to_tables(value, str(key) if title is None else f"{title} / {key}"))
+        return tables
+    if isinstance(data, (list, tuple)):
+        result_sets = sum(1 for item in data if isinstance(item, ResultSet))
+        tables, records = [], []
+        for item in data:
+            if isinstance(item, ResultSet):
+                if records:
+                    tables.append(_records_table(title, records)); records = []
+                # Several results in one list are the queries of one question
+                item_title = title
+                if result_sets > 1:
+                    item_title = f"Result {len(tables) + 1}" if title is None else f"{title} / Result {len(tables) + 1}"
+                tables.append(_result_set_table(item_title, item))
+            else:
+                records.append(item if isinstance(item, dict) else {"value": to_plain(item)})
+        if records or not tables:
+            tables.append(_records_table(title, records))
+        return tables
+    return [_records_table(title, [{"value": to_plain(data)}])]
+
+
+class ResultEncoder:
+    """
+    Renders query results for a generator prompt.
+
+    format:
+        json: compact JSON (the default, same as serialize_results)
+        pretty: indented JSON, the former prompt encoding, kept as a baseline
+        csv: one CSV table per result, column names written once
+        markdown: one Markdown table per result
+    round_digits: rounds floats to this many significant digits, keeping the
+        integer part (0 = off).
+    dictionary: strings of at least `dictionary_min_length` characters that occur
+        `dictionary_min_repeats` times or more (campaign and ad group names) are
+        written once in a legend and referenced as ~1, ~2, ... in the data.
+
+    Specs are written as "<format>[,dictionary][,round=N]", e.g. "csv,dictionary,round=4".
+    """
+    def __init__(self, format: str = "json", round_digits: int = 0, dictionary: bool = False, dictionary_min_repeats: int = 3, dictionary_min_length: int = 12):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown result encoding '{format}'; expected one of {', '.join(FORMATS)}.")
+        self.format = format
+        self.round_digits = round_digits
+        self.dictionary = dictionary
+        self.dictionary_min_repeats = dictionary_min_repeats
+        self.dictionary_min_length = dictionary_min_length
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "ResultEncoder":
+        parts = [p.strip().lower() for p in spec.split(",") if p.strip()]
+        kwargs: Dict[str, Any] = {"format": parts[0] if parts else "json"}
+        for option in parts[1:]:
+            if option in ("dictionary", "dict"):
+                kwargs["dictionary"] = True
+            elif option.startswith("round="):
+                kwargs["round_digits"] = int(option.split("=", 1)[1])
+            else:
+                raise ValueError(f"Unknown result encoding option '{option}' in '{spec}'.")
+        return cls(**kwargs)
+
+    @property
+    def spec(self) -> str:
+        parts = [self.format]
+        if self.dictionary:
+            parts.append("dictionary")
+        if self.round_digits:
+            parts.append(f"round={self.round_digits}")
+        return ",".join(parts)
+
+    @property
+    def label(self) -> str:
+        """Describes the encoding in the prompt, e.g. "Retrieved Data (CSV, one table per result)"."""
+        return _LABELS[self.format]
+
+    def encode(self, data: Any, notes: Optional[List[str]] = None) -> str:
+        """
+        The prompt text for the results: notes (e.g. what the result reduction
+        summarised), an optional dictionary legend, then the fenced data.
+        """
+        prefix = "".join(f"Note: {note}\n" for note in notes or ()) + ("\n" if notes else "")
+        return prefix + self._encode(data)
+
+    def _encode(self, data: Any) -> str:
+        if self.format == "json" and not self.round_digits and not self.dictionary:
+            return self._fence(serialize_results(data))
+        if self.format in ("json", "pretty"):
+            plain = self._plain(data)
+            codes = self._dictionary_codes(self._strings(plain))
+            plain = self._map_values(plain, codes)
+            indent = 2 if self.format == "pretty" else None
+            separators = None if indent else _COMPACT_SEPARATORS
+            return self._legend(codes) + self._fence(json.dumps(plain, indent=indent, separators=separators, ensure_ascii=False))
+
+        tables = to_tables(data)
+        if len(tables) == 1 and tables[0][0] is None and not tables[0][2]:
+            # No results at all: keep the "[]" the prompts treat as empty data
+            return "```json\n[]\n```"
+        codes = self._dictionary_codes(v for _, _, rows in tables for row in rows for v in row if isinstance(v, str))
+        blocks = []
+        for title, columns, rows in tables:
+            rows = [[self._map_value(v, codes) for v in row] for row in rows]
+            render = self._csv if self.format == "csv" else self._markdown
+            body = render(columns, rows) if columns else "(no rows)"
+            blocks.append((f"{title}:\n" if title else "") + self._fence(body))
+        return self._legend(codes) + "\n\n".join(blocks)
+
+    # --- value transforms ---
+
+    def _plain(self, data: Any) -> Any:
+        """JSON-ready copy in the shape serialize_results writes (ResultSets in a list are flattened)."""
+        if isinstance(data, ResultSet):
+            return data.to_records()
+        if isinstance(data, dict):
+            return {str(key): self._plain(value) for key, value in data.items()}
+        if isinstance(data, (list, tuple)):
+            rows = []
+            for item in data:
+                if isinstance(item, ResultSet):
+                    rows.extend(item.to_records())
+                else:
+                    rows.append(to_plain(item))
+            return rows
+        return to_plain(data)
+
+    def _strings(self, value: Any) -> Iterator[str]:
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            for item in value.values():
+                yield from self._strings(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from self._strings(item)
+
+    def _dictionary_codes(self, strings) -> Dict[str, str]:
+        if not self.dictionary:
+            return {}
+        counts = Counter(s for s in strings if len(s) >= self.dictionary_min_length)
+        # Codes in order of first appearance (Counter keeps insertion order)
+        repeated = [s for s, n in counts.items() if n >= self.dictionary_min_repeats]
+        return {s: f"~{i}" for i, s in enumerate(repeated, 1)}
+
+    def _map_values(self, value: Any, codes: Dict[str, str]) -> Any:
+        if isinstance(value, dict):
+            return {key: self._map_values(item, codes) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._map_values(item, codes) for item in value]
+        return self._map_value(value, codes)
+
+    def _map_value(self, value: Any, codes: Dict[str, str]) -> Any:
+        if isinstance(value, float) and self.round_digits:
+            return round_significant(value, self.round_digits)
+        if isinstance(value, str) and codes:
+            return codes.get(value, value)
+        if isinstance(value, (dict, list)):
+            return self._map_values(value, codes)
+        return value
+
+    # --- rendering ---
+
+    def _fence(self, body: str) -> str:
+        return f"```{_FENCES[self.format]}\n{body}\n```"
+
+    @staticmethod
+    def _legend(codes: Dict[str, str]) -> str:
+        if not codes:
+            return ""
+        lines = [f"{code} = {json.dumps(value, ensure_ascii=False)}" for value, code in codes.items()]
+        return "Repeated values are abbreviated in the data below:\n" + "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def _cell(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, separators=_COMPACT_SEPARATORS, ensure_ascii=False)
+        return str(value)
+
+    def _csv(self, columns: List[str], rows: List[List[Any]]) -> str:
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([self._cell(v) for v in row] for row in rows)
+        return out.getvalue().rstrip("\n")
+
+    def _markdown(self, columns: List[str], rows: List[List[Any]]) -> str:
+        def cell(value: Any) -> str:
+            return self._cell(value).replace("|", "\\|").replace("\n", " ")
+        lines = ["| " + " | ".join(cell(c) for c in columns) + " |", "|" + "---|" * len(columns)]
+        lines.extend("| " + " | ".join(cell(v) for v in row) + " |" for row in rows)
+        return "\n".join(lines)
+
+
+@lru_cache(maxsize=8)
+def _tiktoken_encoding(model: str):
+    """The tiktoken encoding for a model, or None when tiktoken or its BPE files are unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown model names (e.g. a deployment alias from LLM_ROUTING_FILE) use the gpt-4o encoding
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The BPE files are downloaded on first use; offline hosts fall back to an estimate
+        print(f"tiktoken unavailable for {model} ({e.__class__.__name__}); estimating tokens from length.")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> Tuple[int, bool]:
+    """Returns (tokens, estimated); estimated is True when tiktoken could not be used (about 4 chars per token)."""
+    encoding = _tiktoken_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4), True
+    return len(encoding.encode(text)), False
+
+
+def measure_encodings(data: Any, specs: Optional[List[str]] = None, model: str = "gpt-4o") -> List[Dict[str, Any]]:
+    """
+    Encodes the same payload every way in `specs` and reports the size of each,
+    smallest first: {"encoding", "chars", "tokens", "estimated"}.
+    """
+    measurements = []
+    for spec in dict.fromkeys(specs or DEFAULT_MEASURE_SPECS):
+        text = ResultEncoder.from_spec(spec).encode(data)
+        tokens, estimated = count_tokens(text, model)
+        measurements.append({"encoding": spec, "chars": len(text), "tokens": tokens, "estimated": estimated})
+    return sorted(measurements, key=lambda m: m["tokens"])
+
+
+def summarize_measurements(encoder: ResultEncoder, measurements: List[Dict[str, Any]]) -> str:
+    """One-line status detail, e.g. 'Results as json: 1,204 tokens; smallest is csv,dictionary,round=4 (512 tokens).'"""
+    current = next((m for m in measurements if m["encoding"] == encoder.spec), None)
+    best = measurements[0]
+    estimated = " (estimated)" if best["estimated"] else ""
+    current_text = f"{current['tokens']:,} tokens" if current else "not measured"
+    return f"Results as {encoder.spec}: {current_text}; smallest is {best['encoding']} ({best['tokens']:,} tokens){estimated}."
+
+
+def get_result_encoder(role: str) -> ResultEncoder:
+    """
+    Result encoder for a generator agent role, from environment variables.
+
+    RESULT_ENCODING: Spec for every generator (default json), e.g. "csv,dictionary,round=4".
+    RESULT_ENCODING_<ROLE>: Per-role override, e.g. RESULT_ENCODING_INSIGHT_GENERATOR=markdown.
+    """
+    spec = os.getenv(f"RESULT_ENCODING_{role.upper()}") or os.getenv("RESULT_ENCODING") or "json"
+    try:
+        return ResultEncoder.from_spec(spec)
+    except ValueError as e:
+        print(f"{e} Using json.")
+        return ResultEncoder()
+
+
+def is_measurement_enabled() -> bool:
+    """RESULT_ENCODING_MEASURE=true makes the workflows report the token count of each encoding."""
+    return os.getenv("RESULT_ENCODING_MEASURE", "false").lower() in ("1", "true", "yes")
+
+
+if __name__ == '__main__':
+    # Usage: python -m langchain_arch.utils.result_encoding results.json [spec ...]
+    # Prints the size of each encoding of a saved result payload (a list of rows
+    # or a dict of objective -> rows), using LLM_MODEL for the tokenizer.
+    import sys
+    from .llm_pool import DEFAULT_MODEL
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m langchain_arch.utils.result_encoding <results.json> [spec ...]")
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    model = os.getenv("LLM_MODEL") or DEFAULT_MODEL
+    for m in measure_encodings(payload, sys.argv[2:] or None, model):
+        suffix = " (estimated)" if m["estimated"] else ""
+        print(f"{m['encoding']:<32} {m['tokens']:>8,} tokens{suffix} {m['chars']:>10,} chars")
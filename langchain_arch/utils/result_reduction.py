@@ -0,0 +1,326 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .generation_cache import question_tokens
+from .result_encoding import ResultEncoder, count_tokens
+from .result_set import ResultSet
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Column-name words that mark the usual ranking metric when nothing better is known, most important first
+_METRIC_WORDS = ("spend", "cost", "conversion", "revenue", "value", "click", "impression", "reach", "ctr", "cpc", "cpm", "roas")
+_ASCENDING_WORDS = {"bottom", "lowest", "least", "worst", "min", "minimum", "ascending", "smallest", "cheapest"}
+# Column-name words of dimensions (time periods and ids); rows sorted by one are a series, not a ranking
+_DIMENSION_WORDS = {"id", "date", "day", "week", "month", "quarter", "year", "period", "time", "timestamp", "hour"}
+_CAMEL = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+QUANTILES = (25, 50, 75, 90)
+
+
+def column_tokens(name: str) -> List[str]:
+    """Plural-folded words of a column name: "totalClicks" -> ["total", "click"]."""
+    return question_tokens(" ".join(_CAMEL.findall(name)))
+
+
+def is_dimension(name: str) -> bool:
+    """Whether a column names a time period or an id ("week", "dateStart", "campaignId") rather than a metric."""
+    return bool(set(column_tokens(name)) & _DIMENSION_WORDS)
+
+
+def _direction(values: np.ndarray) -> Optional[bool]:
+    """True if the values never fall, False if they never rise, None if they are unsorted or all equal."""
+    if len(values) < 2 or values[0] == values[-1]:
+        return None
+    if np.all(values[1:] >= values[:-1]):
+        return True
+    if np.all(values[1:] <= values[:-1]):
+        return False
+    return None
+
+
+class ResultReducer:
+    """
+    Keeps the query results sent to a generator within a token budget.
+
+    The payload is encoded with the agent's ResultEncoder and counted locally
+    (tiktoken, or a length estimate). While it is over budget, the largest
+    result is replaced by a summary computed with NumPy over all its rows:
+
+    - for a series (rows sorted by a time or id column such as week), `top_k`
+      rows evenly spaced over it, first and last included;
+    - otherwise the top `top_k` rows by the ranked metric: the column the
+      query already sorted by, else a numeric column named in the question,
+      else the first common ad metric (spend, cost, conversions, ...), else
+      the largest one. Time and id columns are never the metric;
+    - count, sum, mean, min, quartiles, p90 and max of every numeric column;
+    - row counts and per-column sums and means per group of the finest text
+      column that still groups rows (e.g. campaign name for ad-level rows),
+      limited to the `max_groups` largest groups by the metric.
+
+    If the summaries of every result are still too large, top_k is halved
+    (down to 5) and the results are summarised again. The same input always
+    gives the same reduction.
+    """
+    def __init__(self, encoder: ResultEncoder, budget_tokens: int, model: str = "gpt-4o", top_k: int = 50, max_groups: int = 20):
+        self.encoder = encoder
+        self.budget_tokens = budget_tokens
+        self.model = model
+        self.top_k = top_k
+        self.max_groups = max_groups
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_tokens > 0
+
+    def count(self, data: Any) -> Tuple[int, bool]:
+        return count_tokens(self.encoder.encode(data), self.model)
+
+    def reduce(self, data: Any, question: str = "") -> Tuple[Any, Dict[str, Any]]:
+        """
+        Returns (data, report). data is unchanged when it fits the budget;
+        otherwise reduced results are replaced by {summary name: ResultSet}.
+        The report has budget_tokens, tokens_before, tokens_after, estimated,
+        reduced (per-result summaries) and notes (sentences for the prompt).
+        """
+        tokens, estimated = self.count(data)
+        report: Dict[str, Any] = {"budget_tokens": self.budget_tokens, "tokens_before": tokens, "tokens_after": tokens, "estimated": estimated, "reduced": [], "notes": []}
+        if not self.enabled or tokens <= self.budget_tokens:
+            return data, report
+
+        named = self._named_results(data)
+        words = set(question_tokens(question)) if question else set()
+        # Largest results first; each is reduced only while the payload is over budget
+        sizes = {name: self.count(rs)[0] for name, rs in named.items() if len(rs) > 0}
+        top_k = self.top_k
+        while True:
+            replaced: Dict[str, Any] = {}
+            summaries = []
+            for name in sorted(sizes, key=lambda n: -sizes[n]):
+                rs = named[name]
+                if len(rs) <= top_k:
+                    continue
+                replaced[name], summary = self.summarize(rs, words, top_k)
+                summaries.append({"result": name, **summary})
+                tokens = self.count(self._rebuild(data, named, replaced))[0]
+                if tokens <= self.budget_tokens:
+                    break
+            if tokens <= self.budget_tokens or top_k <= 5:
+                break
+            top_k = max(top_k // 2, 5)
+
+        report["tokens_after"] = tokens
+        report["reduced"] = summaries
+        report["notes"] = [self._note(s) for s in summaries]
+        return self._rebuild(data, named, replaced), report
+
+    def summarize(self, rs: ResultSet, question_words: set, top_k: int) -> Tuple[Dict[str, ResultSet], Dict[str, Any]]:
+        """Top rows, quantiles and group totals for one ResultSet, plus a description of what was kept."""
+        numeric = [c for c in rs.columns if rs.is_numeric(c)]
+        series = self._series_column(rs)
+        metric, presorted, ascending = self._ranked_metric(rs, [c for c in numeric if not is_dimension(c)], question_words)
+        summary: Dict[str, Any] = {"rows": len(rs), "kept_rows": min(top_k, len(rs)), "series": series, "metric": metric, "ascending": ascending, "group_by": None, "groups": 0}
+        parts: Dict[str, ResultSet] = {}
+
+        if series is not None:
+            # Ranking a series by its period would keep only one end of it; spread the rows over the whole range instead
+            order = np.unique(np.linspace(0, len(rs) - 1, min(top_k, len(rs))).round().astype(np.int64))
+        elif metric is None or presorted:
+            # Unranked, or already in the query's ORDER BY: the first rows are the top rows
+            order = np.arange(min(top_k, len(rs)))
+        else:
+            values = self._values(rs, metric, fill=np.inf if ascending else -np.inf)
+            order = np.argsort(values if ascending else -values, kind="stable")[:top_k]
+        if series is not None:
+            label = f"{len(order)} of {len(rs)} rows evenly spaced over {series}"
+        else:
+            label = f"top {len(order)} of {len(rs)} rows" + (f" by {metric}" if metric else "")
+        parts[label] = rs.take(order)
+
+        if numeric:
+            parts[f"distribution of all {len(rs)} rows"] = self._quantiles(rs, numeric)
+
+        group_column = self._group_column(rs)
+        if group_column is not None:
+            groups, group_count = self._group_totals(rs, group_column, numeric, metric)
+            parts[f"totals by {group_column}"] = groups
+            summary["group_by"], summary["groups"] = group_column, group_count
+        summary["kept_rows"] = len(order)
+        return parts, summary
+
+    # --- metric and grouping choice ---
+
+    @staticmethod
+    def _values(rs: ResultSet, column: str, fill: float) -> np.ndarray:
+        values = rs.column(column).astype(np.float64)
+        nulls = rs.null_mask(column)
+        if nulls is not None:
+            values = np.where(nulls, fill, values)
+        return values
+
+    def _series_column(self, rs: ResultSet) -> Optional[str]:
+        """The first time or id column the rows are sorted by (numbers, or text such as ISO dates), if any."""
+        for column in rs.columns:
+            if not is_dimension(column):
+                continue
+            if rs.is_numeric(column):
+                values = self._values(rs, column, fill=np.nan)
+                values = values[~np.isnan(values)]
+            else:
+                present = [v for v in rs.column_values(column) if v is not None]
+                if not all(isinstance(v, str) for v in present):
+                    continue
+                values = np.array(present, dtype=str)
+            if _direction(values) is not None:
+                return column
+        return None
+
+    def _ranked_metric(self, rs: ResultSet, numeric: List[str], question_words: set) -> Tuple[Optional[str], bool, bool]:
+        """(metric, already sorted by it, ascending), from the numeric columns that are not time or id columns."""
+        ascending = bool(question_words & _ASCENDING_WORDS)
+        named = [c for c in numeric if set(column_tokens(c)) & question_words]
+        for column in named + [c for c in numeric if c not in named]:
+            values = self._values(rs, column, fill=np.nan)
+            rising = _direction(values[~np.isnan(values)])
+            if rising is not None:
+                return column, True, rising
+        if named:
+            return named[0], False, ascending
+        for word in _METRIC_WORDS:
+            for column in numeric:
+                if word in column_tokens(column):
+                    return column, False, ascending
+        if numeric:
+            sums = [np.abs(self._values(rs, c, fill=0.0)).sum() for c in numeric]
+            return numeric[int(np.argmax(sums))], False, ascending
+        return None, False, ascending
+
+    def _group_column(self, rs: ResultSet) -> Optional[str]:
+        """The text column with the most distinct values that still leaves at least two rows per group on average."""
+        best, best_count = None, 1
+        for column in rs.columns:
+            if rs.is_numeric(column):
+                continue
+            values = rs.column_values(column)
+            if any(v is not None and not isinstance(v, str) for v in values):
+                continue
+            distinct = len(set(values))
+            if best_count < distinct <= len(rs) // 2:
+                best, best_count = column, distinct
+        return best
+
+    # --- summaries ---
+
+    def _quantiles(self, rs: ResultSet, numeric: List[str]) -> ResultSet:
+        records = []
+        for column in numeric:
+            values = self._values(rs, column, fill=np.nan)
+            values = values[~np.isnan(values)]
+            record: Dict[str, Any] = {"column": column, "count": int(len(values))}
+            if len(values):
+                percentiles = np.percentile(values, QUANTILES)
+                record.update({"sum": values.sum(), "mean": values.mean(), "min": values.min()})
+                record.update({f"p{q}": p for q, p in zip(QUANTILES, percentiles)})
+                record["max"] = values.max()
+            records.append(record)
+        return ResultSet.from_records(records)
+
+    def _group_totals(self, rs: ResultSet, group_column: str, numeric: List[str], metric: Optional[str]) -> Tuple[ResultSet, int]:
+        keys = rs.column_values(group_column)
+        index: Dict[Any, int] = {}
+        codes = np.fromiter((index.setdefault(k, len(index)) for k in keys), dtype=np.int64, count=len(keys))
+        n_groups = len(index)
+        counts = np.bincount(codes, minlength=n_groups)
+        sums = {c: np.bincount(codes, weights=self._values(rs, c, fill=0.0), minlength=n_groups) for c in numeric}
+        present = {c: np.bincount(codes, weights=~rs.null_mask(c) if rs.null_mask(c) is not None else None, minlength=n_groups) for c in numeric}
+        ranking = sums[metric] if metric in sums else counts.astype(np.float64)
+        order = np.argsort(-ranking, kind="stable")
+        names = list(index)
+
+        records = []
+        for g in order[:self.max_groups].tolist():
+            record: Dict[str, Any] = {group_column: names[g], "rows": int(counts[g])}
+            for c in numeric:
+                record[f"{c}_sum"] = sums[c][g]
+                record[f"{c}_avg"] = sums[c][g] / present[c][g] if present[c][g] else None
+            records.append(record)
+        rest = order[self.max_groups:]
+        if len(rest):
+            record = {group_column: f"(other {len(rest)} groups)", "rows": int(counts[rest].sum())}
+            for c in numeric:
+                total, n = sums[c][rest].sum(), present[c][rest].sum()
+                record[f"{c}_sum"] = total
+                record[f"{c}_avg"] = total / n if n else None
+            records.append(record)
+        return ResultSet.from_records(records), n_groups
+
+    # --- payload shapes ---
+
+    @staticmethod
+    def _named_results(data: Any) -> Dict[str, ResultSet]:
+        """The ResultSets of a payload by display name: "Result N" for the insight list, the objective for the optimization dict."""
+        if isinstance(data, ResultSet):
+            return {"Result 1": data}
+        if isinstance(data, dict):
+            return {str(k): v if isinstance(v, ResultSet) else ResultSet.from_records(v) for k, v in data.items() if isinstance(v, (ResultSet, list))}
+        if isinstance(data, (list, tuple)):
+            return {f"Result {i+1}": item for i, item in enumerate(data) if isinstance(item, ResultSet)}
+        return {}
+
+    @staticmethod
+    def _rebuild(data: Any, named: Dict[str, ResultSet], replaced: Dict[str, Any]) -> Any:
+        if not replaced:
+            return data
+        if isinstance(data, dict):
+            return {k: replaced.get(str(k), v) for k, v in data.items()}
+        if isinstance(data, ResultSet) or len(named) == 1:
+            return replaced["Result 1"]
+        # A list of results becomes {"Result N": ...} so summaries stay apart from the rows of other queries
+        return {name: replaced.get(name, rs) for name, rs in named.items()}
+
+    @staticmethod
+    def _note(summary: Dict[str, Any]) -> str:
+        note = f"{summary['result']} had {summary['rows']:,} rows, more than fit the prompt; shown are"
+        if summary["series"]:
+            note += f" {summary['kept_rows']} rows evenly spaced over {summary['series']} (first and last included)"
+        else:
+            note += f" the top {summary['kept_rows']}"
+            if summary["metric"]:
+                note += f" by {summary['metric']} ({'lowest' if summary['ascending'] else 'highest'} first)"
+        note += ", the distribution of every numeric column over all rows"
+        if summary["group_by"]:
+            note += f" and totals per {summary['group_by']} ({summary['groups']} groups)"
+        return note + "."
+
+
+def describe_reduction(report: Dict[str, Any]) -> str:
+    """Status detail for a reduction report."""
+    estimated = " (estimated)" if report["estimated"] else ""
+    if report["tokens_before"] > report["budget_tokens"] and not report["reduced"]:
+        return f"Results exceed the {report['budget_tokens']:,}-token budget ({report['tokens_before']:,} tokens{estimated}) but no result has enough rows to summarise."
+    if not report["reduced"]:
+        return f"Results fit the {report['budget_tokens']:,}-token budget ({report['tokens_before']:,} tokens{estimated})."
+    names = ", ".join(s["result"] for s in report["reduced"])
+    return f"Results over the {report['budget_tokens']:,}-token budget; summarised {names} ({report['tokens_before']:,} -> {report['tokens_after']:,} tokens{estimated})."
+
+
+def get_result_reducer(role: str, encoder: ResultEncoder, model: str) -> ResultReducer:
+    """
+    Result reducer for a generator agent role, from environment variables.
+
+    RESULT_TOKEN_BUDGET: Tokens of results allowed in a generator prompt (default 12000, 0 disables).
+    RESULT_TOKEN_BUDGET_<ROLE>: Per-role override, e.g. RESULT_TOKEN_BUDGET_OPTIMIZATION_GENERATOR.
+    RESULT_REDUCTION_TOP_K: Rows kept per reduced result (default 50).
+    RESULT_REDUCTION_MAX_GROUPS: Groups listed in the per-group totals (default 20).
+    """
+    budget = os.getenv(f"RESULT_TOKEN_BUDGET_{role.upper()}") or os.getenv("RESULT_TOKEN_BUDGET", "12000")
+    return ResultReducer(
+        encoder,
+        budget_tokens=int(budget),
+        model=model,
+        top_k=int(os.getenv("RESULT_REDUCTION_TOP_K", "50")),
+        max_groups=int(os.getenv("RESULT_REDUCTION_MAX_GROUPS", "20")),
+    )
@@ -0,0 +1,248 @@
+import json
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+from neo4j.time import Date, DateTime, Time
+
+_TEMPORAL_TYPES = (Date, DateTime, Time, date, datetime, time)
+_COMPACT_SEPARATORS = (",", ":")
+
+
+def to_plain(value: Any) -> Any:
+    """Converts Neo4j temporal types (also inside lists/maps) to ISO strings and NumPy scalars to Python."""
+    if isinstance(value, _TEMPORAL_TYPES):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _to_column(values: List[Any]) -> tuple:
+    """
+    Packs one column's values into the most compact representation.
+
+    Returns:
+        (values, nulls) where values is an int64/float64 ndarray for numeric
+        columns (nulls holds the None mask, or None if there are none) and a
+        plain list for everything else.
+    """
+    present = [v for v in values if v is not None]
+    if not present or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in present):
+        return values, None
+
+    has_nulls = len(present) != len(values)
+    nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(values)) if has_nulls else None
+    dtype = np.int64 if all(isinstance(v, int) for v in present) else np.float64
+    fill = 0 if dtype is np.int64 else np.nan
+    try:
+        array = np.fromiter((fill if v is None else v for v in values), dtype=dtype, count=len(values))
+    except OverflowError:
+        # Integers beyond int64 stay as Python objects
+        return values, None
+    return array, nulls
+
+
+class RowView(Mapping):
+    """Read-only, lazily evaluated view of one row of a ResultSet."""
+    __slots__ = ("_result_set", "_index")
+
+    def __init__(self, result_set: "ResultSet", index: int):
+        self._result_set = result_set
+        self._index = index
+
+    def __getitem__(self, column: str) -> Any:
+        if column not in self._result_set._data:
+            raise KeyError(column)
+        return self._result_set.value(column, self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._result_set.columns)
+
+    def __len__(self) -> int:
+        return len(self._result_set.columns)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class ResultSet:
+    """
+    Columnar container for Cypher query results.
+
+    Column names are stored once; numeric columns (spend, clicks, impressions, ...)
+    are held in NumPy arrays with an optional null mask, all other columns as plain
+    lists of JSON-ready values. Rows are exposed as lazy RowView mappings, and
+    to_json() writes compact JSON straight from the columns.
+    """
+    __slots__ = ("columns", "_data", "_nulls", "_length")
+
+    def __init__(self, columns: List[str], data: Dict[str, Any], nulls: Dict[str, Optional[np.ndarray]], length: int):
+        self.columns = columns
+        self._data = data
+        self._nulls = nulls
+        self._length = length
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ResultSet":
+        """Builds a ResultSet from an iterable of record dictionaries."""
+        builder = ResultSetBuilder()
+        builder.extend(records)
+        return builder.build()
+
+    @classmethod
+    def empty(cls) -> "ResultSet":
+        return cls([], {}, {}, 0)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[RowView]:
+        return (RowView(self, i) for i in range(self._length))
+
+    def __repr__(self) -> str:
+        return f"ResultSet(columns={self.columns!r}, rows={self._length})"
+
+    def row(self, index: int) -> RowView:
+        if not -self._length <= index < self._length:
+            raise IndexError(index)
+        return RowView(self, index % self._length)
+
+    def column(self, name: str) -> Union[np.ndarray, List[Any]]:
+        """Returns the raw column storage (ndarray for numeric columns, list otherwise)."""
+        return self._data[name]
+
+    def is_numeric(self, name: str) -> bool:
+        return isinstance(self._data[name], np.ndarray)
+
+    def null_mask(self, name: str) -> Optional[np.ndarray]:
+        return self._nulls.get(name)
+
+    def value(self, column: str, index: int) -> Any:
+        values = self._data[column]
+        if isinstance(values, np.ndarray):
+            nulls = self._nulls.get(column)
+            if nulls is not None and nulls[index]:
+                return None
+            return values[index].item()
+        return values[index]
+
+    def column_values(self, name: str) -> List[Any]:
+        """Returns a column as a list of Python values, with None for nulls."""
+        values = self._data[name]
+        if not isinstance(values, np.ndarray):
+            return values
+        plain = values.tolist()
+        nulls = self._nulls.get(name)
+        if nulls is not None:
+            for i in np.flatnonzero(nulls):
+                plain[i] = None
+        return plain
+
+    def take(self, indices: Union[np.ndarray, List[int]]) -> "ResultSet":
+        """New ResultSet with the given rows, in the given order (fancy indexing on numeric columns)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        data, nulls = {}, {}
+        for name in self.columns:
+            values = self._data[name]
+            data[name] = values[indices] if isinstance(values, np.ndarray) else [values[i] for i in indices.tolist()]
+            mask = self._nulls.get(name)
+            nulls[name] = mask[indices] if mask is not None else None
+        return ResultSet(list(self.columns), data, nulls, len(indices))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Materialises the rows as a list of dictionaries (for callers that need the legacy shape)."""
+        columns = [self.column_values(c) for c in self.columns]
+        return [dict(zip(self.columns, values)) for values in zip(*columns)]
+
+    def iter_json_rows(self) -> Iterator[str]:
+        """Yields each row as a compact JSON object string, encoding keys only once."""
+        keys = [json.dumps(c) + ":" for c in self.columns]
+        encoded = [
+            [json.dumps(v, separators=_COMPACT_SEPARATORS) for v in self.column_values(c)]
+            for c in self.columns
+        ]
+        for values in zip(*encoded):
+            yield "{" + ",".join(k + v for k, v in zip(keys, values)) + "}"
+
+    def to_json(self) -> str:
+        """Compact JSON array of row objects, the shape the generator prompts expect."""
+        return "[" + ",".join(self.iter_json_rows()) + "]"
+
+    def to_columnar_json(self) -> str:
+        """Compact JSON with column names once: {"columns": [...], "rows": [[...], ...]}."""
+        columns = [self.column_values(c) for c in self.columns]
+        return json.dumps({"columns": self.columns, "rows": [list(r) for r in zip(*columns)]}, separators=_COMPACT_SEPARATORS)
+
+    @property
+    def nbytes(self) -> int:
+        """Rough in-memory footprint, used to size caches."""
+        total = 0
+        for name, values in self._data.items():
+            if isinstance(values, np.ndarray):
+                total += values.nbytes
+                nulls = self._nulls.get(name)
+                if nulls is not None:
+                    total += nulls.nbytes
+            else:
+                total += sum(len(v) if isinstance(v, str) else 16 for v in values) + 8 * len(values)
+        return total
+
+
+class ResultSetBuilder:
+    """Accumulates record batches column by column, without keeping per-row dicts."""
+
+    def __init__(self):
+        self.columns: List[str] = []
+        self._values: Dict[str, List[Any]] = {}
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            for key in record:
+                if key not in self._values:
+                    # Column first seen mid-stream: back-fill earlier rows with None
+                    self.columns.append(key)
+                    self._values[key] = [None] * self._length
+            for key in self.columns:
+                self._values[key].append(to_plain(record.get(key)))
+            self._length += 1
+
+    def build(self) -> ResultSet:
+        data, nulls = {}, {}
+        for key in self.columns:
+            data[key], nulls[key] = _to_column(self._values[key])
+        return ResultSet(list(self.columns), data, nulls, self._length)
+
+
+def serialize_results(data: Any) -> str:
+    """
+    Serialises query results for a prompt as compact JSON.
+
+    Accepts a ResultSet, a list (ResultSets in it are flattened into one row
+    array, matching the combined multi-query shape), a dict of objective ->
+    results, or any other JSON-compatible value.
+    """
+    if isinstance(data, ResultSet):
+        return data.to_json()
+    if isinstance(data, dict):
+        return "{" + ",".join(
+            json.dumps(str(key)) + ":" + serialize_results(value) for key, value in data.items()
+        ) + "}"
+    if isinstance(data, (list, tuple)):
+        parts = chain.from_iterable(
+            item.iter_json_rows() if isinstance(item, ResultSet)
+            else (json.dumps(to_plain(item), separators=_COMPACT_SEPARATORS),)
+            for item in data
+        )
+        return "[" + ",".join(parts) + "]"
+    return json.dumps(to_plain(data), separators=_COMPACT_SEPARATORS)
@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Section headers as written by the schema export, e.g.
+#   ### `:`FbCampaign``
+#   ### `(`FbCampaign`)-[:HAS_ADSET]->(`FbAdSet`)`
+_NODE_HEADER = re.compile(r"^###\s+`:`?(\w+)`*\s*$")
+_REL_HEADER = re.compile(r"^###\s+`\(`?(\w+)`?\)-\[:(\w+)\]->\(`?(\w+)`?\)`\s*$")
+# Types as written by the export or the live snapshot: String, List[String], Double|Long
+_PROPERTY_LINE = re.compile(r"^-\s+`?(\w+)`?\s*:\s*([\w\[\]|]+)\s*$")
+_COUNT_LINE = re.compile(r"^-\s+`(\w+)`\s*:\s*(\d+)\s*$")
+
+
+class RelationshipType:
+    """One (start)-[:TYPE]->(end) pattern from the schema, with its properties."""
+    __slots__ = ("start", "type", "end", "properties")
+
+    def __init__(self, start: str, rel_type: str, end: str, properties: Optional[Dict[str, str]] = None):
+        self.start = start
+        self.type = rel_type
+        self.end = end
+        self.properties = properties or {}
+
+    def __repr__(self) -> str:
+        return f"(:{self.start})-[:{self.type}]->(:{self.end})"
+
+
+class GraphSchema:
+    """
+    Parsed form of neo4j_schema.md: node labels with their properties and
+    counts, and the relationship patterns connecting them.
+    """
+    def __init__(self):
+        self.node_counts: Dict[str, int] = {}
+        self.node_properties: Dict[str, Dict[str, str]] = {}
+        self.relationships: List[RelationshipType] = []
+
+    @property
+    def labels(self) -> List[str]:
+        return list(self.node_properties)
+
+    @property
+    def relationship_types(self) -> List[str]:
+        return sorted({rel.type for rel in self.relationships})
+
+    def has_label(self, label: str) -> bool:
+        return label in self.node_properties
+
+    def has_property(self, label: str, prop: str) -> bool:
+        return prop in self.node_properties.get(label, {})
+
+    def property_type(self, label: str, prop: str) -> Optional[str]:
+        return self.node_properties.get(label, {}).get(prop)
+
+    def relationships_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[RelationshipType]:
+        return [
+            rel for rel in self.relationships
+            if (start is None or rel.start == start) and (end is None or rel.end == end)
+        ]
+
+
+def parse_schema_markdown(markdown: str) -> GraphSchema:
+    """
+    Parses the schema markdown produced by the schema export.
+
+    Consecutive relationship headers share the property list that follows them,
+    matching how the export groups patterns of the same type.
+    """
+    schema = GraphSchema()
+    current_label: Optional[str] = None
+    pending_rels: List[RelationshipType] = []
+    previous_was_rel_header = False
+    section = None
+
+    for raw_line in markdown.splitlines():
+        line = raw_line.strip()
+        if line.startswith("## "):
+            lowered = line.lower()
+            section = "counts" if "count" in lowered else "relationships" if "relationship" in lowered else "nodes"
+            current_label, pending_rels = None, []
+            previous_was_rel_header = False
+            continue
+
+        rel_match = _REL_HEADER.match(line)
+        if rel_match:
+            # A header directly after another header joins its group
+            if not previous_was_rel_header:
+                pending_rels = []
+            rel = RelationshipType(*rel_match.groups())
+            schema.relationships.append(rel)
+            pending_rels.append(rel)
+            current_label = None
+            previous_was_rel_header = True
+            continue
+        if line:
+            previous_was_rel_header = False
+
+        node_match = _NODE_HEADER.match(line)
+        if node_match:
+            current_label = node_match.group(1)
+            schema.node_properties.setdefault(current_label, {})
+            pending_rels = []
+            continue
+
+        if section == "counts":
+            count_match = _COUNT_LINE.match(line)
+            if count_match:
+                schema.node_counts[count_match.group(1)] = int(count_match.group(2))
+            continue
+
+        prop_match = _PROPERTY_LINE.match(line)
+        if prop_match:
+            name, prop_type = prop_match.groups()
+            if current_label is not None:
+                schema.node_properties[current_label][name] = prop_type
+            for rel in pending_rels:
+                rel.properties[name] = prop_type
+
+    return schema
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def is_identifier_property(label: str, prop: str) -> bool:
+    """`id`, or `<x>_id` where the label ends with x (e.g. FbAdAccount.account_id)."""
+    if prop == "id":
+        return True
+    return prop.endswith("_id") and _snake_case(label).endswith(prop[:-3])
+
+
+def label_property_pairs(schema: GraphSchema) -> List[Tuple[str, str]]:
+    """Returns every (label, property) pair declared in the schema."""
+    return [(label, prop) for label, props in schema.node_properties.items() for prop in props]
+
+
+_parsed_schemas: "OrderedDict[str, GraphSchema]" = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def parse_schema_cached(markdown: str, version: str, max_entries: int = 4) -> GraphSchema:
+    """parse_schema_markdown(), memoised by schema version so each snapshot is parsed once."""
+    with _parsed_lock:
+        schema = _parsed_schemas.get(version)
+        if schema is not None:
+            _parsed_schemas.move_to_end(version)
+            return schema
+    schema = parse_schema_markdown(markdown)
+    with _parsed_lock:
+        _parsed_schemas[version] = schema
+        while len(_parsed_schemas) > max_entries:
+            _parsed_schemas.popitem(last=False)
+    return schema
@@ -0,0 +1,309 @@
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from .schema_parser import GraphSchema, parse_schema_cached, is_identifier_property
+from .schema_service import render_schema_markdown
+
+# Load environment variables from .env file
+load_dotenv()
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL_SPLIT = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+# Label name prefixes that carry no meaning in questions (FbCampaign -> campaign)
+_LABEL_PREFIXES = ("fb",)
+# Properties kept on labels that are only included to connect the path
+_ESSENTIAL_PROPERTY = re.compile(r"^(id|name|.*status)$")
+# Folded question words asking how entities perform, which is answered from insight labels
+_PERFORMANCE_WORDS = {
+    "perform", "performing", "performance", "doing", "top", "best", "worst", "bottom", "highest", "lowest",
+    "rank", "trend", "result", "metric", "insight", "daily", "day", "week", "month", "year",
+}
+
+
+def _normalize_token(token: str) -> str:
+    """Crude singular/adjective folding so 'campaigns', 'weekly' match 'campaign', 'week'."""
+    if len(token) > 5 and token.endswith("ly"):
+        token = token[:-2]
+    if len(token) > 3 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 2 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _tokens(text: str) -> List[str]:
+    return [_normalize_token(t) for t in _WORD.findall(text.lower())]
+
+
+def _label_tokens(label: str) -> List[str]:
+    tokens = [t.lower() for t in _CAMEL_SPLIT.split(label)]
+    while tokens and tokens[0] in _LABEL_PREFIXES and len(tokens) > 1:
+        tokens = tokens[1:]
+    return [_normalize_token(t) for t in tokens]
+
+
+class PrunedSchema:
+    """The schema markdown to put in a prompt, and what was kept."""
+    __slots__ = ("markdown", "labels", "pruned", "reason")
+
+    def __init__(self, markdown: str, labels: List[str], pruned: bool, reason: str = ""):
+        self.markdown = markdown
+        self.labels = labels
+        self.pruned = pruned
+        self.reason = reason
+
+
+class SchemaPruner:
+    """
+    Selects the part of the schema a question needs.
+
+    - Entity labels are matched from the question by their name ("ad set",
+      "adset", "campaigns", ...), longest phrase first.
+    - Labels owning a property the question mentions ("spend", "clicks", ...)
+      are added as metric labels, limited to the ones nearest a matched entity
+      when there is one, and to the granularity the question names ("weekly").
+      A question about performance, ranking or a period that names no metric
+      ("top performing campaigns last month") gets the insight labels instead.
+    - The anchor label (the root that reaches the most labels, i.e. the top of
+      the hierarchy), every label on the shortest path from it to an entity, and
+      the labels between an entity and its metric labels are added so the
+      generator can write the required traversal.
+
+    Selected labels keep all their properties; path-only labels keep just
+    identifiers, names and status fields. If nothing matches, or everything
+    would be kept, or no insight label can be reached for a performance
+    question, the full schema is returned.
+    """
+    def __init__(self, schema: GraphSchema, full_markdown: str):
+        self.schema = schema
+        self.full_markdown = full_markdown
+        self.label_tokens = {label: _label_tokens(label) for label in schema.labels}
+        self.phrases = self._build_phrases()
+        self.adjacency = self._build_adjacency()
+        self.anchor = self._find_anchor()
+        self.insight_labels = {label for label, tokens in self.label_tokens.items() if "insight" in tokens}
+        label_count = max(len(schema.labels), 1)
+        # Properties on most labels (id, name, account_id) say nothing about which label is meant
+        self.property_labels: Dict[str, Set[str]] = {}
+        for label, props in schema.node_properties.items():
+            for prop in props:
+                self.property_labels.setdefault(prop, set()).add(label)
+        self.generic_properties = {prop for prop, labels in self.property_labels.items() if len(labels) * 2 > label_count}
+
+    def _build_phrases(self) -> List[tuple]:
+        """(phrase tokens, label) pairs, longest first."""
+        phrases = []
+        last_tokens: Dict[str, List[str]] = {}
+        for label, tokens in self.label_tokens.items():
+            phrases.append((tuple(tokens), label))
+            if len(tokens) > 1:
+                phrases.append((("".join(tokens),), label))
+            last_tokens.setdefault(tokens[-1], []).append(label)
+        for token, labels in last_tokens.items():
+            # A distinctive last word ("campaign", "creative", "account") names its label on its own
+            if len(labels) == 1 and len(token) >= 4 and (token,) not in {p for p, _ in phrases}:
+                phrases.append(((token,), labels[0]))
+        return sorted(phrases, key=lambda item: -len(item[0]))
+
+    def _build_adjacency(self) -> Dict[str, Set[str]]:
+        adjacency: Dict[str, Set[str]] = {label: set() for label in self.schema.labels}
+        for rel in self.schema.relationships:
+            adjacency.setdefault(rel.start, set()).add(rel.end)
+            adjacency.setdefault(rel.end, set()).add(rel.start)
+        return adjacency
+
+    def _find_anchor(self) -> Optional[str]:
+        outgoing: Dict[str, Set[str]] = {}
+        has_incoming = set()
+        for rel in self.schema.relationships:
+            outgoing.setdefault(rel.start, set()).add(rel.end)
+            if rel.start != rel.end:
+                has_incoming.add(rel.end)
+        best, best_reach = None, 0
+        for label in outgoing:
+            if label in has_incoming:
+                continue
+            seen, queue = {label}, deque([label])
+            while queue:
+                for nxt in outgoing.get(queue.popleft(), ()):
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        queue.append(nxt)
+            if len(seen) > best_reach:
+                best, best_reach = label, len(seen)
+        return best
+
+    def _shortest_path(self, start: str, goal: str) -> List[str]:
+        if start == goal:
+            return [start]
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for nxt in sorted(self.adjacency.get(node, ())):
+                if nxt in previous:
+                    continue
+                previous[nxt] = node
+                if nxt == goal:
+                    path = [goal]
+                    while previous[path[-1]] is not None:
+                        path.append(previous[path[-1]])
+                    return path[::-1]
+                queue.append(nxt)
+        return []
+
+    def _nearest(self, sources: Set[str], targets: Set[str]) -> Dict[str, List[str]]:
+        """Multi-source BFS: the targets closest to any source, each with its path from that source."""
+        previous = {label: None for label in sources}
+        frontier = sorted(sources)
+        while frontier:
+            found = [label for label in frontier if label in targets]
+            if found:
+                paths = {}
+                for label in found:
+                    path = [label]
+                    while previous[path[-1]] is not None:
+                        path.append(previous[path[-1]])
+                    paths[label] = path[::-1]
+                return paths
+            next_frontier = []
+            for label in frontier:
+                for nxt in sorted(self.adjacency.get(label, ())):
+                    if nxt not in previous:
+                        previous[nxt] = label
+                        next_frontier.append(nxt)
+            frontier = next_frontier
+        return {}
+
+    def match_entities(self, tokens: List[str]) -> Set[str]:
+        matched, used = set(), [False] * len(tokens)
+        for phrase, label in self.phrases:
+            size = len(phrase)
+            for i in range(len(tokens) - size + 1):
+                if any(used[i:i + size]) or tuple(tokens[i:i + size]) != phrase:
+                    continue
+                matched.add(label)
+                for j in range(i, i + size):
+                    used[j] = True
+        return matched
+
+    def match_properties(self, tokens: List[str]) -> Dict[str, Set[str]]:
+        """Label -> properties named in the question (property tokens appear consecutively)."""
+        text = " " + " ".join(tokens) + " "
+        matched: Dict[str, Set[str]] = {}
+        for prop, labels in self.property_labels.items():
+            if prop in self.generic_properties:
+                continue
+            if f" {' '.join(_tokens(prop.replace('_', ' ')))} " in text:
+                for label in labels:
+                    matched.setdefault(label, set()).add(prop)
+        return matched
+
+    def prune(self, question: str) -> PrunedSchema:
+        tokens = _tokens(question)
+        token_set = set(tokens)
+        entities = self.match_entities(tokens)
+        property_hits = self.match_properties(tokens)
+
+        metric_labels = set(property_hits) - entities
+        performance = bool(token_set & _PERFORMANCE_WORDS) and not property_hits
+        if performance:
+            metric_labels = self.insight_labels - entities
+        # Prefer the granularity the question names, e.g. weekly over monthly insights; words
+        # shared with entity labels ("campaign") or by every insight label do not name one
+        entity_words = {t for label in entities for t in self.label_tokens.get(label, ())} | {"insight"}
+        named = {label for label in metric_labels if token_set & (set(self.label_tokens.get(label, ())) - entity_words)}
+        if named:
+            metric_labels = named
+        metric_paths: Dict[str, List[str]] = {}
+        if entities and metric_labels:
+            metric_paths = self._nearest(entities, metric_labels)
+            metric_labels = set(metric_paths)
+
+        if performance and not metric_labels & self.insight_labels:
+            return PrunedSchema(self.full_markdown, self.schema.labels, False, "no insight labels matched a performance question")
+
+        selected = entities | metric_labels
+        if not selected:
+            return PrunedSchema(self.full_markdown, self.schema.labels, False, "no schema elements matched the question")
+
+        included = set(selected)
+        for path in metric_paths.values():
+            included.update(path)
+        if self.anchor:
+            for label in (entities or metric_labels):
+                included.update(self._shortest_path(self.anchor, label))
+        if len(included) >= len(self.schema.labels):
+            return PrunedSchema(self.full_markdown, self.schema.labels, False, "question touches the whole schema")
+
+        node_properties = {}
+        for label in included:
+            props = self.schema.node_properties.get(label, {})
+            if label in selected:
+                node_properties[label] = dict(props)
+            else:
+                keep = property_hits.get(label, set())
+                node_properties[label] = {
+                    p: t for p, t in props.items()
+                    if _ESSENTIAL_PROPERTY.match(p) or is_identifier_property(label, p) or p in keep
+                }
+        relationships = [
+            (rel.start, rel.type, rel.end) for rel in self.schema.relationships
+            if rel.start in included and rel.end in included
+        ]
+        relationship_properties = {}
+        for rel in self.schema.relationships:
+            if rel.start in included and rel.end in included and rel.properties:
+                relationship_properties.setdefault(rel.type, {}).update(rel.properties)
+        markdown = render_schema_markdown(
+            {label: count for label, count in self.schema.node_counts.items() if label in included},
+            node_properties,
+            relationships,
+            relationship_properties,
+        )
+        labels = [label for label in self.schema.labels if label in included]
+        return PrunedSchema(markdown, labels, True, f"kept {len(labels)} of {len(self.schema.labels)} labels")
+
+
+class _PrunerCache:
+    """Pruners keyed by schema version, so the label graph is built once per snapshot."""
+    def __init__(self, max_entries: int = 4):
+        self._entries: "OrderedDict[str, SchemaPruner]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+
+    def get(self, markdown: str, version: str) -> SchemaPruner:
+        with self._lock:
+            pruner = self._entries.get(version)
+            if pruner is not None:
+                self._entries.move_to_end(version)
+                return pruner
+        pruner = SchemaPruner(parse_schema_cached(markdown, version), markdown)
+        with self._lock:
+            self._entries[version] = pruner
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return pruner
+
+
+_pruner_cache = _PrunerCache()
+
+
+def prune_schema(markdown: str, version: str, question: str) -> PrunedSchema:
+    """
+    Returns the schema to put in a generator prompt for this question.
+    Disabled (full schema) when SCHEMA_PRUNING is false; any pruning failure
+    also falls back to the full schema.
+    """
+    if os.getenv("SCHEMA_PRUNING", "true").lower() not in ("1", "true", "yes"):
+        return PrunedSchema(markdown, [], False, "schema pruning disabled")
+    try:
+        return _pruner_cache.get(markdown, version).prune(question)
+    except Exception as e:
+        print(f"Schema pruning failed, using full schema: {e}")
+        return PrunedSchema(markdown, [], False, f"pruning failed: {e}")
@@ -0,0 +1,405 @@
+import os
+import sys
+import time
+import asyncio
+import hashlib
+from datetime import date, datetime, time as dt_time
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from neo4j.time import Date, DateTime, Time, Duration
+
+from .neo4j_utils import AsyncNeo4jDatabase, load_schema_markdown
+
+# Load environment variables from .env file
+load_dotenv()
+
+_NO_PROPERTIES = "*(No properties)*"
+
+
+class SchemaSnapshot:
+    """Rendered schema markdown plus where it came from and a content-derived version stamp."""
+    __slots__ = ("markdown", "version", "source", "generated_at")
+
+    def __init__(self, markdown: str, source: str, generated_at: Optional[float] = None):
+        self.markdown = markdown
+        self.version = hashlib.sha256(markdown.encode("utf-8")).hexdigest()[:12]
+        self.source = source
+        self.generated_at = generated_at or time.time()
+
+    def __repr__(self) -> str:
+        return f"SchemaSnapshot(version={self.version!r}, source={self.source!r})"
+
+
+def _neo4j_type(value: Any) -> Optional[str]:
+    """Maps a sampled property value to the type names used in neo4j_schema.md."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "Boolean"
+    if isinstance(value, int):
+        return "Long"
+    if isinstance(value, float):
+        return "Double"
+    if isinstance(value, str):
+        return "String"
+    if isinstance(value, (DateTime, datetime)):
+        return "DateTime"
+    if isinstance(value, (Date, date)):
+        return "Date"
+    if isinstance(value, (Time, dt_time)):
+        return "Time"
+    if isinstance(value, Duration):
+        return "Duration"
+    if isinstance(value, list):
+        inner = next((_neo4j_type(v) for v in value if v is not None), None)
+        return f"List[{inner}]" if inner else "List"
+    return type(value).__name__
+
+
+def _procedure_type(name: str) -> str:
+    """Maps a db.schema.*TypeProperties() type name ("String", "LongArray") to the neo4j_schema.md one."""
+    if name.endswith("Array"):
+        return f"List[{name[:-len('Array')]}]"
+    return name
+
+
+def _merge_types(types: List[str]) -> str:
+    distinct = sorted(set(t for t in types if t))
+    return "|".join(distinct) if distinct else "Null"
+
+
+def _merge_owner_types(owners: Dict[str, Dict[str, List[str]]]) -> Dict[str, Dict[str, str]]:
+    return {owner: {key: _merge_types(t) for key, t in props.items()} for owner, props in owners.items()}
+
+
+def render_schema_markdown(
+    node_counts: Dict[str, int],
+    node_properties: Dict[str, Dict[str, str]],
+    relationships: List[Tuple[str, str, str]],
+    relationship_properties: Dict[str, Dict[str, str]],
+) -> str:
+    """
+    Renders introspected schema data in the layout of the hand-written neo4j_schema.md,
+    so prompts and parse_schema_markdown() see the same format whichever source is used.
+    """
+    lines = ["# 🧠 Neo4j Graph Schema", "", "## 📊 Node Counts", ""]
+    lines += [f"- `{label}`: {count}" for label, count in sorted(node_counts.items())]
+    lines += ["", "## 🟢 Node Types & Properties", ""]
+    for label in sorted(node_properties):
+        lines.append(f"### `:`{label}``")
+        lines += [f"- {prop} : {prop_type}" for prop, prop_type in sorted(node_properties[label].items())]
+        lines.append("")
+    lines += ["## 🔗 Relationship Types, Structures & Properties", ""]
+    by_type: Dict[str, List[Tuple[str, str]]] = {}
+    for start, rel_type, end in relationships:
+        by_type.setdefault(rel_type, []).append((start, end))
+    for rel_type in sorted(by_type):
+        # Patterns of one type share a property list, as in the hand-written file
+        for start, end in sorted(by_type[rel_type]):
+            lines.append(f"### `(`{start}`)-[:{rel_type}]->(`{end}`)`")
+        props = relationship_properties.get(rel_type) or {}
+        if props:
+            lines += [f"- {prop} : {prop_type}" for prop, prop_type in sorted(props.items())]
+        else:
+            lines.append(_NO_PROPERTIES)
+        lines.append("")
+    return "\n".join(lines)
+
+
+class SchemaService:
+    """
+    Serves the graph schema markdown to the workflows from memory.
+
+    The schema is introspected from the live database: label counts come
+    from the count store, property names and types from
+    db.schema.nodeTypeProperties() and db.schema.relTypeProperties(), and
+    relationship patterns from the count store's start and end labels per
+    type, so a pattern or property is listed however rare it is. The count
+    store does not pair the two sides; with exact_patterns every relationship
+    is read instead to list only the pairs that occur. Where the
+    procedures are unavailable, properties are sampled from up to
+    sample_size nodes per label and relationships per type instead. The
+    rendered markdown is cached as a versioned SchemaSnapshot and refreshed
+    in the background every refresh_seconds, on request_refresh(), or when
+    the ingestion stamp file changes. Until the first introspection succeeds
+    (or if it fails) the schema
+    file is served instead.
+    """
+    def __init__(
+        self,
+        sample_size: int = 100,
+        refresh_seconds: float = 3600,
+        poll_seconds: float = 30,
+        stamp_file: Optional[str] = None,
+        live: bool = True,
+        exact_patterns: bool = False,
+    ):
+        self.sample_size = sample_size
+        self.refresh_seconds = refresh_seconds
+        self.poll_seconds = poll_seconds
+        self.stamp_file = stamp_file
+        self.live = live
+        self.exact_patterns = exact_patterns
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._file_snapshots: Dict[str, Tuple[float, SchemaSnapshot]] = {}
+        self._refresh_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self.last_error: Optional[str] = None
+
+    # --- Reading ---
+
+    def get_snapshot(self, schema_file: str = "neo4j_schema.md") -> Optional[SchemaSnapshot]:
+        """Returns the live snapshot if there is one, otherwise the (mtime-cached) schema file."""
+        if self._snapshot is not None:
+            return self._snapshot
+        return self._file_snapshot(schema_file)
+
+    def get_markdown(self, schema_file: str = "neo4j_schema.md") -> Optional[str]:
+        snapshot = self.get_snapshot(schema_file)
+        return snapshot.markdown if snapshot else None
+
+    def _file_snapshot(self, schema_file: str) -> Optional[SchemaSnapshot]:
+        try:
+            mtime = os.stat(schema_file).st_mtime
+        except OSError:
+            mtime = 0.0 # Resolved relative to the package by load_schema_markdown
+        cached = self._file_snapshots.get(schema_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        content = load_schema_markdown(schema_file)
+        if content is None:
+            return None
+        snapshot = SchemaSnapshot(content, source="file")
+        self._file_snapshots[schema_file] = (mtime, snapshot)
+        return snapshot
+
+    # --- Introspection ---
+
+    async def _rows(self, db: AsyncNeo4jDatabase, cypher_query: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return [record async for record in db.stream(cypher_query, params, raise_errors=True)]
+
+    async def _type_properties(self, db: AsyncNeo4jDatabase) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+        """Property names and types of every label and relationship type, from the db.schema procedures."""
+        node_types: Dict[str, Dict[str, List[str]]] = {}
+        rows = await self._rows(db, "CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName, propertyTypes RETURN nodeLabels, propertyName, propertyTypes")
+        for row in rows:
+            if not row.get("propertyName"):
+                continue # Labels whose nodes have no properties
+            for label in row.get("nodeLabels") or []:
+                node_types.setdefault(label, {}).setdefault(row["propertyName"], []).extend(map(_procedure_type, row.get("propertyTypes") or []))
+        rel_types: Dict[str, Dict[str, List[str]]] = {}
+        rows = await self._rows(db, "CALL db.schema.relTypeProperties() YIELD relType, propertyName, propertyTypes RETURN relType, propertyName, propertyTypes")
+        for row in rows:
+            if not row.get("propertyName"):
+                continue
+            # relType is rendered as :`TYPE`
+            rel_type = row["relType"].lstrip(":").strip("`")
+            rel_types.setdefault(rel_type, {}).setdefault(row["propertyName"], []).extend(map(_procedure_type, row.get("propertyTypes") or []))
+        return _merge_owner_types(node_types), _merge_owner_types(rel_types)
+
+    async def _label_info(self, db: AsyncNeo4jDatabase, label: str, sample: bool) -> Tuple[str, int, Dict[str, str]]:
+        # count(n) on a single label is answered from the count store
+        count_rows = await self._rows(db, f"MATCH (n:`{label}`) RETURN count(n) AS count")
+        types: Dict[str, List[str]] = {}
+        if sample:
+            sample_rows = await self._rows(
+                db,
+                f"MATCH (n:`{label}`) WITH n LIMIT $sample RETURN properties(n) AS props",
+                {"sample": self.sample_size},
+            )
+            for row in sample_rows:
+                for key, value in (row.get("props") or {}).items():
+                    types.setdefault(key, []).append(_neo4j_type(value))
+        return label, count_rows[0]["count"] if count_rows else 0, {key: _merge_types(t) for key, t in types.items()}
+
+    async def _count(self, db: AsyncNeo4jDatabase, cypher_query: str) -> int:
+        rows = await self._rows(db, cypher_query)
+        return rows[0]["count"] if rows else 0
+
+    async def _patterns_from_counts(self, db: AsyncNeo4jDatabase, rel_type: str, labels: List[str]) -> List[Tuple[str, str]]:
+        """
+        Endpoint label pairs from the count store, which keeps relationship
+        counts per type and start label and per type and end label, but not per
+        pair. Every start label is paired with every end label, so a type with
+        several labels on both sides may list a pair that has no relationships.
+        """
+        starts = await asyncio.gather(*[self._count(db, f"MATCH (:`{label}`)-[:`{rel_type}`]->() RETURN count(*) AS count") for label in labels])
+        ends = await asyncio.gather(*[self._count(db, f"MATCH ()-[:`{rel_type}`]->(:`{label}`) RETURN count(*) AS count") for label in labels])
+        return [(start, end) for start, s_count in zip(labels, starts) if s_count for end, e_count in zip(labels, ends) if e_count]
+
+    async def _patterns_from_scan(self, db: AsyncNeo4jDatabase, rel_type: str) -> List[Tuple[str, str]]:
+        """Exact endpoint label pairs; reads every relationship of the type."""
+        rows = await self._rows(
+            db,
+            f"MATCH (a)-[r:`{rel_type}`]->(b) RETURN DISTINCT labels(a) AS start_labels, labels(b) AS end_labels",
+        )
+        patterns = set()
+        for row in rows:
+            for start in row.get("start_labels") or []:
+                for end in row.get("end_labels") or []:
+                    patterns.add((start, end))
+        return sorted(patterns)
+
+    async def _relationship_info(self, db: AsyncNeo4jDatabase, rel_type: str, labels: List[str], sample: bool) -> Tuple[str, List[Tuple[str, str]], Dict[str, str]]:
+        # Every endpoint pair, not a sample: a type such as HAS_WEEKLY_INSIGHT hangs off several labels
+        if self.exact_patterns:
+            patterns = await self._patterns_from_scan(db, rel_type)
+        else:
+            patterns = await self._patterns_from_counts(db, rel_type, labels)
+        types: Dict[str, List[str]] = {}
+        if sample:
+            sample_rows = await self._rows(
+                db,
+                f"MATCH ()-[r:`{rel_type}`]->() WITH r LIMIT $sample RETURN properties(r) AS props",
+                {"sample": self.sample_size},
+            )
+            for row in sample_rows:
+                for key, value in (row.get("props") or {}).items():
+                    types.setdefault(key, []).append(_neo4j_type(value))
+        return rel_type, sorted(patterns), {key: _merge_types(t) for key, t in types.items()}
+
+    async def introspect(self, db: Optional[AsyncNeo4jDatabase] = None) -> SchemaSnapshot:
+        """Introspects the live database and renders a new snapshot. Errors are raised."""
+        db = db or AsyncNeo4jDatabase()
+        labels = [row["label"] for row in await self._rows(db, "CALL db.labels() YIELD label RETURN label")]
+        rel_types = [row["relationshipType"] for row in await self._rows(db, "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")]
+        try:
+            type_properties = await self._type_properties(db)
+        except Exception as e:
+            print(f"db.schema type property procedures unavailable ({e}); sampling properties instead.")
+            type_properties = None
+        sample = type_properties is None
+
+        label_infos = await asyncio.gather(*[self._label_info(db, label, sample) for label in labels])
+        rel_infos = await asyncio.gather(*[self._relationship_info(db, rel_type, labels, sample) for rel_type in rel_types])
+
+        node_counts = {label: count for label, count, _ in label_infos}
+        relationships = [(start, rel_type, end) for rel_type, patterns, _ in rel_infos for start, end in patterns]
+        if sample:
+            node_properties = {label: props for label, count, props in label_infos if count}
+            relationship_properties = {rel_type: props for rel_type, _, props in rel_infos}
+        else:
+            node_props, rel_props = type_properties
+            node_properties = {label: node_props.get(label, {}) for label, count, _ in label_infos if count}
+            relationship_properties = {rel_type: rel_props.get(rel_type, {}) for rel_type in rel_types}
+        markdown = render_schema_markdown(node_counts, node_properties, relationships, relationship_properties)
+        return SchemaSnapshot(markdown, source="live")
+
+    async def refresh(self) -> Optional[SchemaSnapshot]:
+        """Introspects now and swaps in the new snapshot; keeps the previous one on failure."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            started = time.perf_counter()
+            try:
+                snapshot = await self.introspect()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Schema introspection failed, keeping {self.get_snapshot() or 'schema file'}: {e}")
+                return None
+            self.last_error = None
+            if self._snapshot is None or snapshot.version != self._snapshot.version:
+                print(f"Schema snapshot {snapshot.version} introspected in {(time.perf_counter() - started) * 1000:.0f} ms.")
+                self._snapshot = snapshot
+            return self._snapshot
+
+    # --- Background refresh ---
+
+    def request_refresh(self) -> None:
+        """Asks the background task to refresh soon, e.g. from an ingestion hook."""
+        if self._refresh_requested is not None:
+            self._refresh_requested.set()
+
+    def _read_stamp(self) -> Optional[float]:
+        if not self.stamp_file:
+            return None
+        try:
+            return os.stat(self.stamp_file).st_mtime
+        except OSError:
+            return None
+
+    async def _refresh_loop(self) -> None:
+        stamp = self._read_stamp()
+        last_refresh = time.monotonic()
+        await self.refresh()
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), timeout=min(self.poll_seconds, self.refresh_seconds))
+            except asyncio.TimeoutError:
+                pass
+            requested = self._refresh_requested.is_set()
+            self._refresh_requested.clear()
+            current_stamp = self._read_stamp()
+            due = time.monotonic() - last_refresh >= self.refresh_seconds
+            if requested or due or current_stamp != stamp:
+                stamp = current_stamp
+                last_refresh = time.monotonic()
+                await self.refresh()
+
+    async def start(self) -> None:
+        """Starts the background refresher (first introspection runs immediately). Startup hook."""
+        if not self.live or self._task is not None:
+            return
+        self._refresh_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Stops the background refresher. Shutdown hook."""
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_requested = None
+
+
+_schema_service: Optional[SchemaService] = None
+
+
+def get_schema_service() -> SchemaService:
+    """
+    Returns the process-wide schema service, configured from:
+    SCHEMA_SOURCE ("live" (default) or "file"), SCHEMA_SAMPLE_SIZE (default 100),
+    SCHEMA_EXACT_PATTERNS (default false; true scans every relationship for its endpoint labels),
+    SCHEMA_REFRESH_SECONDS (default 3600), SCHEMA_STAMP_POLL_SECONDS (default 30) and
+    QUERY_CACHE_STAMP_FILE (the ingestion stamp also used by the query cache).
+    """
+    global _schema_service
+    if _schema_service is None:
+        _schema_service = SchemaService(
+            sample_size=int(os.getenv("SCHEMA_SAMPLE_SIZE", "100")),
+            refresh_seconds=float(os.getenv("SCHEMA_REFRESH_SECONDS", "3600")),
+            poll_seconds=float(os.getenv("SCHEMA_STAMP_POLL_SECONDS", "30")),
+            stamp_file=os.getenv("QUERY_CACHE_STAMP_FILE") or None,
+            live=os.getenv("SCHEMA_SOURCE", "live").lower() == "live",
+            exact_patterns=os.getenv("SCHEMA_EXACT_PATTERNS", "false").lower() in ("1", "true", "yes"),
+        )
+    return _schema_service
+
+
+# Regenerate the schema file from the live database:
+#   python -m langchain_arch.utils.schema_service dump [neo4j_schema.md]
+if __name__ == '__main__':
+    from .neo4j_pool import close_async_driver
+
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "dump":
+        print("Usage: python -m langchain_arch.utils.schema_service dump [output_file]")
+        sys.exit(1)
+
+    async def _dump(output_file: Optional[str]) -> None:
+        try:
+            snapshot = await get_schema_service().introspect()
+        finally:
+            await close_async_driver()
+        if output_file:
+            with open(output_file, "w", encoding="utf-8") as f:
+                f.write(snapshot.markdown)
+            print(f"Schema snapshot {snapshot.version} written to {output_file}.")
+        else:
+            print(snapshot.markdown)
+
+    asyncio.run(_dump(sys.argv[2] if len(sys.argv) == 3 else None))
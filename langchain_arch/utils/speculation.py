@@ -0,0 +1,167 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from .llm_scheduler import with_priority
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Which workflows' query generators are started alongside the LLM classifier
+_MODES = {
+    "off": (),
+    "insight": ("insight",),
+    "both": ("insight", "optimization"),
+}
+
+
+class SpeculativeTask:
+    """A query generation started before classification resolved, and when it ran."""
+    __slots__ = ("name", "workflow", "task", "started", "finished")
+
+    def __init__(self, name: str, workflow: Any, task: "asyncio.Task", started: float):
+        self.name = name
+        self.workflow = workflow
+        self.task = task
+        self.started = started
+        self.finished: Optional[float] = None
+
+    def _on_done(self, task: "asyncio.Task") -> None:
+        self.finished = time.perf_counter()
+        # Retrieve the outcome so a failed or abandoned generation is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+
+class SpeculativeRouting:
+    """
+    Starts query generation while the LLM classifier is still running.
+
+    The generators named by the mode are started next to the classifier; when
+    the classification arrives, the matching task is handed to its workflow
+    and the others are cancelled. A cancelled request may still be billed for
+    the tokens processed before the cancel, so speculative generator calls are
+    capped per rolling minute; over the cap the Router just runs in sequence.
+
+    Tracks how often speculation paid off (the classified workflow had a task
+    running), the latency taken off the critical path and the generator time
+    spent on cancelled branches.
+    """
+    def __init__(self, mode: str = "off", max_calls_per_minute: int = 30):
+        if mode not in _MODES:
+            raise ValueError(f"Unknown speculative routing mode '{mode}', expected one of {', '.join(_MODES)}.")
+        self.mode = mode
+        self.workflow_names = _MODES[mode]
+        self.max_calls_per_minute = max_calls_per_minute
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped_budget = 0
+        self.saved_ms = 0.0
+        self.wasted_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.workflow_names)
+
+    def _acquire(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and now - self._calls[0] > 60:
+                self._calls.popleft()
+            if self.max_calls_per_minute and len(self._calls) >= self.max_calls_per_minute:
+                self.skipped_budget += 1
+                return False
+            self._calls.append(now)
+            self.started += 1
+            return True
+
+    def start(self, user_query: str, make_workflow: Callable[[str], Any]) -> Dict[str, SpeculativeTask]:
+        """
+        Starts `workflow.generate_queries(user_query)` for each workflow the mode
+        and the budget allow. Must be called from the running event loop.
+        """
+        speculation: Dict[str, SpeculativeTask] = {}
+        for name in self.workflow_names:
+            if not self._acquire():
+                break
+            workflow = make_workflow(name)
+            # Queued behind interactive LLM calls when the LLM scheduler is limiting
+            task = asyncio.create_task(with_priority("speculative", workflow.generate_queries(user_query)))
+            entry = SpeculativeTask(name, workflow, task, time.perf_counter())
+            task.add_done_callback(entry._on_done)
+            speculation[name] = entry
+        return speculation
+
+    def resolve(self, speculation: Dict[str, SpeculativeTask], winner: Optional[str]) -> Optional[SpeculativeTask]:
+        """
+        Cancels every task except the classified workflow's and records the outcome.
+        `winner` is None when classification failed, which cancels everything.
+
+        Returns:
+            The winning SpeculativeTask, or None if its generator was not started.
+        """
+        if not speculation:
+            return None
+        now = time.perf_counter()
+        kept = None
+        with self._lock:
+            for name, entry in speculation.items():
+                ran_ms = ((entry.finished or now) - entry.started) * 1000
+                if name == winner:
+                    kept = entry
+                    self.saved_ms += ran_ms
+                else:
+                    entry.task.cancel()
+                    self.wasted_ms += ran_ms
+            if kept is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / resolved, 3) if resolved else 0.0,
+                "skipped_budget": self.skipped_budget,
+                "saved_ms": round(self.saved_ms, 1),
+                "avg_saved_ms": round(self.saved_ms / self.hits, 1) if self.hits else 0.0,
+                "wasted_ms": round(self.wasted_ms, 1),
+            }
+
+
+_speculative_routing: Optional[SpeculativeRouting] = None
+
+
+def get_speculative_routing() -> SpeculativeRouting:
+    """
+    Returns the process-wide speculative routing policy, configured from the environment:
+    SPECULATIVE_ROUTING (off, insight or both; default off) and
+    SPECULATIVE_MAX_CALLS_PER_MINUTE (default 30, 0 for no cap).
+    """
+    global _speculative_routing
+    if _speculative_routing is None:
+        load_dotenv()
+        mode = os.getenv("SPECULATIVE_ROUTING", "off").strip().lower()
+        try:
+            _speculative_routing = SpeculativeRouting(
+                mode=mode,
+                max_calls_per_minute=int(os.getenv("SPECULATIVE_MAX_CALLS_PER_MINUTE", "30")),
+            )
+        except ValueError as e:
+            print(f"{e} Speculative routing disabled.")
+            _speculative_routing = SpeculativeRouting(mode="off")
+    return _speculative_routing